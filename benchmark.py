@@ -0,0 +1,251 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from common.protocol import Protocol
+from common.headings import *
+from drone.window_manager import LocationWindowManager, TimeWindowManager
+from drone.waypoint_manager import WaypointManager
+from drone.event_manager import EventManager
+import numpy as np
+import argparse
+import json
+import platform
+import re
+import statistics
+import sys
+import timeit
+
+"""
+hot path 마이크로 벤치마크
+
+python benchmark.py                              결과 JSON을 stdout으로
+python benchmark.py -o result.json               파일로 저장
+python benchmark.py --baseline base.json         기준 결과보다 tolerance 이상 느려지면 exit 1
+python benchmark.py -k protocol                  이름이 정규식과 맞는 것만 실행
+
+결과는 op 당 ns, 반복 측정의 중앙값
+"""
+
+Benchmark = Tuple[str, Callable[[], object]]
+
+WAYPOINT_SIZES = [10, 100, 1000, 10000]
+SUBSCRIBER_COUNTS = [1, 10, 100]
+
+
+def protocol_benchmarks() -> List[Benchmark]:
+    rng = np.random.default_rng(0)
+    benchmarks: List[Benchmark] = []
+
+    for codec in (Protocol.TEXT, Protocol.BINARY):
+        protocol = Protocol(codec)
+        params = [
+            (10., DESIRED_VELOCITY),
+            (10., WINDOW_SIZE),
+            (5., LOW_OFFSET),
+            (5., HIGH_OFFSET),
+            (1., COMMON_ERROR),
+            (1., CHECK_PERIOD),
+            (5., WAYPOINT_RANGE),
+            (0, RUNNING_STATE),
+        ]
+        encoded_params = protocol.encode_multiple(params)
+        encoded_scalar = protocol.encode(0, RUNNING_STATE)
+
+        benchmarks += [
+            (f"protocol.{codec}.encode",
+             lambda p=protocol: p.encode(0, RUNNING_STATE)),
+            (f"protocol.{codec}.decode",
+             lambda p=protocol, x=encoded_scalar: p.decode(x)),
+            (f"protocol.{codec}.encode_multiple",
+             lambda p=protocol, xs=params: p.encode_multiple(xs)),
+            (f"protocol.{codec}.decode_multiple",
+             lambda p=protocol, x=encoded_params: p.decode(x)),
+        ]
+
+        point = rng.normal(size=3)
+        encoded_point = protocol.decode(
+            protocol.encode(protocol.encode_point(point), GPS_POSITION))[0][1]
+        benchmarks.append((
+            f"protocol.{codec}.decode_point",
+            lambda p=protocol, x=encoded_point: p.decode_point(x)))
+
+        for n in WAYPOINT_SIZES:
+            waypoints = rng.normal(size=(n, 3)) * 100
+            encoded = protocol.encode(
+                protocol.encode_waypoints(waypoints), WAYPOINTS)
+            benchmarks += [
+                (f"protocol.{codec}.encode_waypoints[{n}]",
+                 lambda p=protocol, w=waypoints: p.encode(p.encode_waypoints(w), WAYPOINTS)),
+                (f"protocol.{codec}.decode_waypoints[{n}]",
+                 lambda p=protocol, x=encoded: p.decode_waypoints(p.decode(x)[0][1])),
+            ]
+
+    # cm 단위 차분 미션
+    protocol = Protocol(Protocol.BINARY, waypoint_resolution=.01)
+    for n in WAYPOINT_SIZES:
+        waypoints = np.cumsum(rng.normal(size=(n, 3)) * 100, axis=0)
+        encoded = protocol.encode(protocol.encode_waypoints(waypoints), WAYPOINTS)
+        benchmarks += [
+            (f"protocol.quantized.encode_waypoints[{n}]",
+             lambda p=protocol, w=waypoints: p.encode(p.encode_waypoints(w), WAYPOINTS)),
+            (f"protocol.quantized.decode_waypoints[{n}]",
+             lambda p=protocol, x=encoded: p.decode_waypoints(p.decode(x)[0][1])),
+        ]
+
+    return benchmarks
+
+
+def window_benchmarks() -> List[Benchmark]:
+    location_manager = LocationWindowManager(10., 10., 1.)
+    time_manager = TimeWindowManager(10., .5, 1.5, 1.)
+
+    position = np.array([5., 1., 10.])
+    start = np.array([0., 0., 10.])
+    direction = np.array([1., 0., 0.])
+
+    return [
+        ("window.location.in_range",
+         lambda: location_manager.in_range(.5, position, start, direction)),
+        ("window.time.in_range",
+         lambda: time_manager.in_range(position, start)),
+        ("window.time.in_range_elapsed",
+         lambda: time_manager.in_range(position, start, .5)),
+    ]
+
+
+def waypoint_benchmarks() -> List[Benchmark]:
+    rng = np.random.default_rng(0)
+    benchmarks: List[Benchmark] = []
+
+    for n in WAYPOINT_SIZES:
+        waypoint_manager = WaypointManager(5.)
+        waypoint_manager.desired_velocity = 10.
+        waypoint_manager.set_mission(rng.normal(size=(n, 3)) * 100)
+        waypoint_manager.start_mission()
+        position = rng.normal(size=3)
+        target = waypoint_manager.current_waypoint()
+
+        benchmarks += [
+            (f"waypoint.waypoint_reached[{n}]",
+             lambda w=waypoint_manager, x=position: w.waypoint_reached(x)),
+            (f"waypoint.waypoint2vector[{n}]",
+             lambda w=waypoint_manager, t=target, x=position: w.waypoint2vector(t, x)),
+            (f"waypoint.current_direction[{n}]",
+             lambda w=waypoint_manager: w.current_direction()),
+        ]
+
+    return benchmarks
+
+
+def event_benchmarks() -> List[Benchmark]:
+    benchmarks: List[Benchmark] = []
+
+    for n in SUBSCRIBER_COUNTS:
+        event_manager = EventManager()
+        event_manager.register("event")
+        for _ in range(n):
+            event_manager.subscribe("event", lambda name, value: None)
+
+        benchmarks.append((
+            f"event.publish[{n}]",
+            lambda e=event_manager: e.publish("event", DESIRED_VELOCITY, 1.)))
+
+    return benchmarks
+
+
+def all_benchmarks() -> List[Benchmark]:
+    return protocol_benchmarks() + window_benchmarks() + \
+        waypoint_benchmarks() + event_benchmarks()
+
+
+def measure(function: Callable[[], object], repeat: int, min_time: float) -> Dict[str, float]:
+    """
+    한 번 측정이 min_time 초 이상 되도록 반복 횟수를 정하고 repeat번 측정
+    """
+    timer = timeit.Timer(function)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(int(number * min_time / max(elapsed, 1e-9)), 1)
+
+    times = [t / number * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "ns_per_op": round(statistics.median(times), 1),
+        "min_ns_per_op": round(min(times), 1),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run(pattern: Optional[str], repeat: int, min_time: float) -> Dict[str, object]:
+    results = {}
+    for name, function in all_benchmarks():
+        if pattern and not re.search(pattern, name):
+            continue
+        results[name] = measure(function, repeat, min_time)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, object],
+    baseline: Dict[str, object],
+    tolerance: float
+) -> List[str]:
+    """
+    기준보다 tolerance 비율 이상 느려진 벤치마크 목록
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["ns_per_op"]
+        after = result["ns_per_op"]
+        if after > before * (1 + tolerance):
+            regressions.append(
+                f"{name}: {before:.1f} -> {after:.1f} ns/op ({after / before - 1:+.0%})")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-k", "--filter", default=None,
+                        help="regex for benchmark names to run")
+    parser.add_argument("-o", "--output", default=None,
+                        help="write results to this JSON file")
+    parser.add_argument("--baseline", default=None,
+                        help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=.1,
+                        help="allowed slowdown ratio against the baseline")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=.05,
+                        help="minimum seconds per measurement")
+    args = parser.parse_args(argv)
+
+    current = run(args.filter, args.repeat, args.min_time)
+    output = json.dumps(current, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+from typing import List, Optional, Tuple, Union
+import heapq
+import math
+import selectors
+import threading
+import time
+
+"""
+시계
+
+시간이 필요한 곳(System, TimeWindowManager, Connection, 테스트 서버, 시뮬레이터)은
+datetime.now() / time.sleep 대신 주입받은 clock을 사용한다.
+
+- MonotonicClock (기본값): time.perf_counter 기반, NTP 등으로 시간이 튀지 않음
+- VirtualClock: sleep 하면 기다리지 않고 시간만 앞으로 감
+  테스트/시뮬레이션에서 20분짜리 미션을 몇 초 안에 돌릴 수 있다
+  같은 VirtualClock을 여러 스레드(System, 시뮬레이터, 테스트 서버)가 쓰면
+  participants에 스레드 수를 넘기고, 각 루프는 끝날 때 leave를 호출한다
+
+시각은 모두 초 단위 float (now_ns는 ns 단위 int)이고 기준점은 의미 없음, 차이만 사용한다.
+"""
+
+
+class MonotonicClock:
+
+    def now(self) -> float:
+        return time.perf_counter()
+
+    def now_ns(self) -> int:
+        return time.perf_counter_ns()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        """
+        event가 set 되거나 timeout이 지날 때까지 대기, event가 set 되었으면 True
+        """
+        return event.wait(timeout)
+
+    def select(
+        self,
+        selector: selectors.BaseSelector,
+        timeout: Optional[float] = None
+    ) -> List[Tuple[selectors.SelectorKey, int]]:
+        """
+        selector.select와 같음 (VirtualClock과 같은 방식으로 부르기 위함)
+        """
+        return selector.select(timeout)
+
+    def leave(self):
+        pass
+
+
+class VirtualClock:
+    """
+    sleep으로만 흐르는 시계
+
+    참여 스레드(participants)가 모두 sleep 중일 때 가장 먼저 깨어날 시각으로 시간을 옮긴다.
+    실제로는 기다리지 않으므로 순서는 실제 시간과 같고 속도만 빠르다.
+    참여 스레드는 끝날 때 leave를 호출해야 함 (남은 스레드들이 기다리지 않도록)
+    """
+
+    def __init__(self, start: Optional[float] = 0., participants: Optional[int] = 1) -> None:
+        # 부동소수점 오차로 아주 짧은 sleep이 시간을 못 미는 일이 없도록 ns 정수로 보관
+        self.time_ns = round(start * 1e9)
+        self.participants = participants
+        self.sleeping = 0
+        self.wakeups: List[int] = []
+        # select로 sleep 중인 스레드들의 selector
+        self.selecting: List[selectors.BaseSelector] = []
+        self.condition = threading.Condition()
+
+    def now(self) -> float:
+        return self.time_ns / 1e9
+
+    def now_ns(self) -> int:
+        return self.time_ns
+
+    def advance(self, seconds: float):
+        """
+        참여 스레드와 관계없이 시간을 바로 앞으로 민다
+        """
+        with self.condition:
+            self.time_ns += math.ceil(seconds * 1e9)
+            self.condition.notify_all()
+
+    def set(self, t: float):
+        """
+        t가 현재보다 뒤면 t로 이동 (시간은 되돌아가지 않음)
+        """
+        with self.condition:
+            t_ns = round(t * 1e9)
+            if t_ns > self.time_ns:
+                self.time_ns = t_ns
+                self.condition.notify_all()
+
+    def sleep(self, seconds: float):
+        self.sleep_until(self.time_ns + max(math.ceil(seconds * 1e9), 0))
+
+    def sleep_until(
+        self,
+        wake: int,
+        selector: Optional[selectors.BaseSelector] = None
+    ) -> List[Tuple[selectors.SelectorKey, int]]:
+        """
+        시각 wake (ns)까지 sleep
+        selector가 있으면 그 소켓이 준비되는 즉시 (시간을 더 밀지 않고) 깨어나서 이벤트 반환
+        """
+        events = []
+        with self.condition:
+            heapq.heappush(self.wakeups, wake)
+            self.sleeping += 1
+            if selector is not None:
+                self.selecting.append(selector)
+            try:
+                while self.time_ns < wake:
+                    if selector is not None:
+                        events = selector.select(0)
+                        if events:
+                            break
+                    self.advance_if_idle()
+                    if self.time_ns >= wake:
+                        break
+                    self.condition.wait()
+            finally:
+                if selector is not None:
+                    self.selecting.remove(selector)
+                self.sleeping -= 1
+                self.wakeups.remove(wake)
+                heapq.heapify(self.wakeups)
+        return events
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        """
+        event가 이미 set 되어 있지 않으면 timeout 만큼 sleep
+        """
+        if not event.is_set():
+            self.sleep(timeout)
+        return event.is_set()
+
+    def advance_if_idle(self):
+        # condition을 잡은 상태에서 호출
+        if self.sleeping >= self.participants and self.wakeups[0] > self.time_ns:
+            # 다른 스레드가 보낸 데이터를 아직 받지 않은 스레드가 있으면 시간을 밀지 않고 그 스레드를 깨움
+            if not any(selector.select(0) for selector in self.selecting):
+                self.time_ns = self.wakeups[0]
+            self.condition.notify_all()
+
+    def leave(self):
+        """
+        참여 스레드 하나가 끝남
+        """
+        with self.condition:
+            self.participants -= 1
+            self.condition.notify_all()
+
+    def select(
+        self,
+        selector: selectors.BaseSelector,
+        timeout: Optional[float] = None
+    ) -> List[Tuple[selectors.SelectorKey, int]]:
+        """
+        준비된 소켓이 없으면 실제로 기다리지 않고 timeout 만큼 sleep
+        - sleep 중 다른 참여 스레드가 보낸 데이터로 소켓이 준비되면 그 시각에 깨어남
+        - timeout이 0이나 None이어도 최소 1ns sleep 해서 다른 참여 스레드에 양보
+          (sleep 없이 돌면 시간이 흐르지 않아 서로 기다리는 루프가 멈춤)
+        """
+        events = selector.select(0)
+        if events:
+            return events
+        timeout_ns = max(math.ceil((timeout or 0.) * 1e9), 1)
+        return self.sleep_until(self.time_ns + timeout_ns, selector)
+
+
+Clock = Union[MonotonicClock, VirtualClock]
@@ -24,3 +24,33 @@ EMERGENCY_LANDING = "EMERGENCY_LANDING"
 WAYPOINT_REACHED = "WAYPOINT_REACHED"
 RUNNING_STATE = "RUNNING_STATE"
 # 0: Normal, 1: Time Out, 2: Location Out
+
+# 여러 파라미터/미션을 한 번에 보내는 bundle
+# [BUNDLE id][값들...][BUNDLE_END id], 드론은 다 적용한 뒤 BUNDLE_ACK id로 응답
+BUNDLE = "BUNDLE"
+BUNDLE_END = "BUNDLE_END"
+BUNDLE_ACK = "BUNDLE_ACK"
+
+# 바이너리 프로토콜의 메시지 id (목록 순서가 곧 id이므로 뒤에만 추가할 것)
+MESSAGE_NAMES = [
+    DESIRED_VELOCITY,
+    WINDOW_SIZE,
+    LOW_OFFSET,
+    HIGH_OFFSET,
+    COMMON_ERROR,
+    CHECK_PERIOD,
+    WAYPOINT_RANGE,
+    WAYPOINTS,
+    GPS_POSITION,
+    TAKEOFF,
+    LAND,
+    VECTOR,
+    MISSION_START,
+    EMERGENCY_LANDING,
+    WAYPOINT_REACHED,
+    RUNNING_STATE,
+    BUNDLE,
+    BUNDLE_END,
+    BUNDLE_ACK,
+]
+MESSAGE_IDS = {name: i for i, name in enumerate(MESSAGE_NAMES)}
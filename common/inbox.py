@@ -0,0 +1,81 @@
+from typing import Optional, Dict, Deque, Tuple
+from collections import deque
+from .protocol import Protocol, Name
+from .headings import GPS_POSITION
+import threading
+
+"""
+수신한 메시지를 보관하는 크기 제한 큐
+
+메시지 이름별로 정책을 정한다
+- LATEST: 가장 최근 메시지 하나만 보관 (예: GPS_POSITION)
+- FIFO: 순서대로 보관, 가득 차면 가장 오래된 메시지를 버림 (기본값)
+
+이름을 알 수 없는 메시지(값이 여러 개인 text 메시지 등)는 FIFO로 처리한다.
+"""
+
+
+class Inbox:
+
+    LATEST = "latest"
+    FIFO = "fifo"
+
+    def __init__(
+        self,
+        protocol: Protocol,
+        capacity: Optional[int] = 1024,
+        policies: Optional[Dict[Name, str]] = None
+    ) -> None:
+        self.protocol = protocol
+        self.capacity = capacity
+        self.policies = dict(policies) if policies is not None else {
+            GPS_POSITION: Inbox.LATEST
+        }
+
+        # (순번, 메시지), 순번으로 전체 수신 순서를 유지
+        self.queue: Deque[Tuple[int, bytes]] = deque()
+        self.latest: Dict[Name, Tuple[int, bytes]] = {}
+        self.sequence = 0
+
+        self.dropped = 0  # 큐가 가득 차서 버린 메시지 수
+        self.coalesced = 0  # 새 메시지로 덮어쓴 LATEST 메시지 수
+
+        self.lock = threading.Lock()
+
+    def put(self, message: bytes):
+        name = self.protocol.peek_name(message)
+        latest = self.policies.get(name, Inbox.FIFO) == Inbox.LATEST
+
+        with self.lock:
+            self.sequence += 1
+            if latest:
+                if name in self.latest:
+                    self.coalesced += 1
+                self.latest[name] = (self.sequence, message)
+                return
+
+            if len(self.queue) >= self.capacity:
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append((self.sequence, message))
+
+    def get(self) -> Optional[bytes]:
+        """
+        가장 먼저 들어온 메시지를 꺼낸다
+        """
+        with self.lock:
+            oldest_name = None
+            oldest = self.queue[0][0] if self.queue else None
+            for name, (sequence, _) in self.latest.items():
+                if oldest is None or sequence < oldest:
+                    oldest_name, oldest = name, sequence
+
+            if oldest_name is not None:
+                return self.latest.pop(oldest_name)[1]
+            if self.queue:
+                return self.queue.popleft()[1]
+        return None
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.queue) + len(self.latest)
@@ -0,0 +1,122 @@
+from typing import Dict, Optional, TextIO, Tuple
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+"""
+로그 설정
+
+각 모듈은 logging.getLogger(__name__)으로 logger를 만들고
+log.debug("Current gps: %s", position) 처럼 %-포맷 인자로 남긴다.
+레벨이 꺼져 있으면 logger가 캐시된 레벨만 보고 바로 반환하므로 포맷 비용이 없다.
+
+setup_logging을 호출하면
+- 호출한 스레드는 record를 큐에 넣기만 하고 (포맷하지 않음)
+- 백그라운드 스레드(QueueListener)가 포맷해서 stream에 쓴다
+- RateLimitFilter가 호출 위치(logger 이름 + 메시지 포맷)별로 interval 초에 한 번,
+  sample 개 중 하나만 통과시키고 나머지는 세어두었다가 다음 로그에 suppressed로 붙인다
+"""
+
+
+class RateLimitFilter(logging.Filter):
+
+    def __init__(self, interval: Optional[float] = 0., sample: Optional[int] = 1) -> None:
+        super().__init__()
+        self.interval = interval
+        self.sample = sample
+        self.last: Dict[Tuple[str, str], float] = {}
+        self.counts: Dict[Tuple[str, str], int] = {}
+        self.suppressed: Dict[Tuple[str, str], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # 경고 이상은 항상 남김
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, str(record.msg))
+        count = self.counts.get(key, 0) + 1
+        self.counts[key] = count
+
+        now = time.monotonic()
+        if count % self.sample or now - self.last.get(key, -self.interval) < self.interval:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return False
+
+        self.last[key] = now
+        record.suppressed = self.suppressed.pop(key, 0)
+        return True
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    한 줄에 JSON 하나
+    event는 메시지 포맷 (호출 위치별로 같음), message는 포맷된 메시지
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "event": str(record.msg),
+            "message": record.getMessage(),
+        }
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    포맷은 백그라운드 스레드에서 하도록 record를 그대로 큐에 넣는다
+    (같은 프로세스 안의 큐이므로 pickle할 필요 없음)
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(
+    level: Optional[int] = logging.INFO,
+    stream: Optional[TextIO] = None,
+    interval: Optional[float] = 0.,
+    sample: Optional[int] = 1,
+    structured: Optional[bool] = False,
+) -> logging.handlers.QueueListener:
+    """
+    root logger에 큐 기반 handler를 설치하고 백그라운드 writer를 시작
+    반환된 listener는 종료 시 stop_logging으로 멈춘다
+    """
+    handler = logging.StreamHandler(stream if stream else sys.stdout)
+    if structured:
+        handler.setFormatter(StructuredFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(records)
+    queue_handler.addFilter(RateLimitFilter(interval, sample))
+
+    root = logging.getLogger()
+    for old in [h for h in root.handlers if isinstance(h, DeferredQueueHandler)]:
+        root.removeHandler(old)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    return listener
+
+
+def stop_logging(listener: logging.handlers.QueueListener):
+    """
+    남은 로그를 모두 쓰고 백그라운드 writer를 멈춘다
+    """
+    listener.stop()
@@ -1,29 +1,87 @@
-from typing import Optional, Tuple, Any, List
+from typing import Optional, Tuple, Any, List, Union
+from .headings import MESSAGE_NAMES, MESSAGE_IDS
 import numpy as np
+import struct
+import sys
 
 """
 역할
 1. bytes 값을 받아서 파싱
-2. 해당 값을 
+2. 해당 값을
 
 Protocol
 #이름-값[-타입]
 
 타입은 선택적으로 보내며, default: float로 파싱이 된다.
+메시지 끝에는 줄바꿈(END_TOKEN)을 붙여 스트림에서 메시지를 구분한다 (값에 줄바꿈이 들어가면 안 됨).
 
 예시
 #desired_speed-12#low_offset-32#high_offset-123#some_string-hi-string
+
+Binary Protocol (codec="binary")
+[길이 uint32][메시지 id uint8][타입 uint8][값]
+
+길이는 길이 필드 뒤의 바이트 수, 메시지 id는 headings.MESSAGE_NAMES의 index.
+int/float는 little endian int64/float64, str은 utf-8, bytes는 그대로,
+array는 float64/float32 raw 값으로 보내며 np.frombuffer로 복사 없이 읽는다.
+
+waypoint_resolution을 주면 encode_waypoints는 quantized 값(타입 'q')을 만든다
+[resolution float64][점 수 uint32][차분 크기 uint8 (2 또는 4)][첫 점 int64 x3][차분 int16/int32 x3 ...]
+좌표를 resolution (m) 단위 정수로 반올림한 뒤 이웃한 점끼리의 차이만 보낸다.
+정수로 차분하므로 누적 오차 없이 점마다 최대 resolution / 2의 오차만 생긴다.
+차분이 모두 int16에 들어가면 좌표 하나에 2바이트, 아니면 int32 (4바이트)
+받는 쪽은 설정 없이 헤더의 resolution으로 복원한다.
+
+Datagram (UDP GPS)
+[순번 uint32][메시지]
+메시지는 위 codec으로 인코딩한 것 그대로, 순번은 2^32에서 한 바퀴 돈다.
 """
 
 Name = str
 
 
+class Quantized:
+    """
+    (n, 3) 배열을 resolution 단위 정수 차분으로 보낼 값 (binary codec)
+    """
+
+    def __init__(self, array: np.ndarray, resolution: float) -> None:
+        self.array = array
+        self.resolution = resolution
+
+
 class Protocol:
 
     VALUE_TOKEN = "#"
     INTER_VALUE_TOKEN = "@"
+    END_TOKEN = "\n"
+
+    TEXT = "text"
+    BINARY = "binary"
+
+    FRAME_HEADER = struct.Struct("<IBB")
+    LENGTH_SIZE = 4
+    INT = struct.Struct("<q")
+    FLOAT = struct.Struct("<d")
+    SEQUENCE = struct.Struct("<I")
+    QUANTIZED = ord("q")
+    QUANTIZED_HEADER = struct.Struct("<dIB")
+    QUANTIZED_ORIGIN = struct.Struct("<3q")
+    DELTA_DTYPES = {2: np.dtype("<i2"), 4: np.dtype("<i4")}
+
+    def __init__(
+        self,
+        codec: Optional[str] = TEXT,
+        waypoint_resolution: Optional[float] = None
+    ) -> None:
+        if codec not in (Protocol.TEXT, Protocol.BINARY):
+            raise ValueError(f"Unknown codec {codec}")
+        if waypoint_resolution is not None and codec != Protocol.BINARY:
+            raise ValueError("waypoint_resolution requires the binary codec")
+        self.codec = codec
+        # 미션을 보낼 때 좌표 단위 (m), None이면 float64 그대로
+        self.waypoint_resolution = waypoint_resolution
 
-    def __init__(self) -> None:
         self.str2type_map = {
             "int": int,
             "float": float,
@@ -32,12 +90,36 @@ class Protocol:
         }
         self.type2str_map = {v: k for k, v in self.str2type_map.items()}
 
+        # 바이너리 타입 코드
+        self.type2code_map = {
+            int: ord("i"),
+            float: ord("f"),
+            str: ord("s"),
+            bytes: ord("b"),
+        }
+        self.dtype2code_map = {
+            np.dtype("<f8"): ord("d"),
+            np.dtype("<f4"): ord("e"),
+        }
+        self.code2dtype_map = {v: k for k, v in self.dtype2code_map.items()}
+
     def decode(self, x: bytes, encoding: Optional[str] = "utf-8") -> List[Tuple[str, Any]]:
+        """
+        형식이 잘못된 메시지는 ValueError
+        """
+        try:
+            if self.codec == Protocol.BINARY:
+                return self.decode_binary(x)
+            return self.decode_text(x, encoding)
+        except (KeyError, IndexError, struct.error) as e:
+            raise ValueError(f"Malformed message ({e!r})") from e
+
+    def decode_text(self, x: bytes, encoding: Optional[str] = "utf-8") -> List[Tuple[str, Any]]:
         values: List[Tuple[Name, Any]] = []
 
         string = x.decode(encoding=encoding)
         for entry in string.split(Protocol.VALUE_TOKEN)[1:]:
-            splitted = entry.split(Protocol.INTER_VALUE_TOKEN)
+            splitted = entry.rstrip(Protocol.END_TOKEN).split(Protocol.INTER_VALUE_TOKEN)
             splitted.append("float")  # 있으면 해당 값으로 타입 사용, 없으면 float
 
             name = splitted[0]  # 이름
@@ -48,31 +130,210 @@ class Protocol:
         return values
 
     def encode(self, x: Any, name: Name) -> bytes:
-        res = f"#{name}{self.INTER_VALUE_TOKEN}{Name(x)}{self.INTER_VALUE_TOKEN}{self.type2str_map[type(x)]}"
+        if self.codec == Protocol.BINARY:
+            return self.encode_binary(x, name)
+
+        res = f"#{name}{self.INTER_VALUE_TOKEN}{Name(x)}{self.INTER_VALUE_TOKEN}{self.type2str_map[type(x)]}{self.END_TOKEN}"
         return res.encode("utf-8")
 
     def encode_multiple(self, xs: List[Tuple[Any, Name]]) -> bytes:
-        return "".join([self.encode(value, name) for value, name in xs])
+        return b"".join([self.encode(value, name) for value, name in xs])
+
+    def split(self, buffer: memoryview) -> Tuple[List[bytes], int]:
+        """
+        수신 버퍼에서 완성된 메시지들을 잘라낸다
+        출력 (메시지 목록, 사용한 바이트 수)
+
+        text codec은 END_TOKEN까지를 하나의 메시지로 본다 (END_TOKEN은 빼고 반환).
+        """
+        if self.codec == Protocol.TEXT:
+            data = bytes(buffer)
+            end = data.rfind(self.END_TOKEN.encode("utf-8"))
+            if end < 0:
+                return [], 0
+            messages = data[:end].split(self.END_TOKEN.encode("utf-8"))
+            return [m for m in messages if m], end + 1
+
+        messages: List[bytes] = []
+        offset = 0
+        while len(buffer) - offset >= self.LENGTH_SIZE:
+            length = int.from_bytes(
+                buffer[offset:offset + self.LENGTH_SIZE], "little")
+            end = offset + self.LENGTH_SIZE + length
+            if end > len(buffer):
+                break
+            messages.append(bytes(buffer[offset:end]))
+            offset = end
+
+        return messages, offset
+
+    def encode_datagram(self, sequence: int, message: bytes) -> bytes:
+        return self.SEQUENCE.pack(sequence & 0xFFFFFFFF) + message
+
+    def decode_datagram(self, datagram: bytes) -> Tuple[int, bytes]:
+        """
+        (순번, 메시지)
+        """
+        return self.SEQUENCE.unpack_from(datagram)[0], datagram[self.SEQUENCE.size:]
+
+    @staticmethod
+    def sequence_newer(sequence: int, last: int) -> bool:
+        """
+        한 바퀴 도는 것을 고려해서 sequence가 last보다 뒤의 순번인지
+        """
+        return 0 < (sequence - last) & 0xFFFFFFFF < 0x80000000
+
+    def peek_name(self, message: bytes) -> Optional[Name]:
+        """
+        메시지가 값 하나만 담고 있으면 그 이름을, 아니면 None을 반환 (값은 디코딩하지 않음)
+        형식이 잘못된 메시지도 None (수신 스레드에서 부르므로 예외를 내지 않음)
+        """
+        if self.codec == Protocol.BINARY:
+            if len(message) < self.FRAME_HEADER.size:
+                return None
+            length, message_id, _ = self.FRAME_HEADER.unpack_from(message)
+            if self.LENGTH_SIZE + length != len(message) or message_id >= len(MESSAGE_NAMES):
+                return None
+            return MESSAGE_NAMES[message_id]
+
+        token = Protocol.VALUE_TOKEN.encode("utf-8")
+        if not message.startswith(token) or message.count(token) != 1:
+            return None
+        end = message.find(Protocol.INTER_VALUE_TOKEN.encode("utf-8"))
+        if end <= 0:
+            return None
+        try:
+            return message[1:end].decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+
+    def decode_binary(self, x: bytes) -> List[Tuple[str, Any]]:
+        values: List[Tuple[Name, Any]] = []
+
+        view = memoryview(x)
+        offset = 0
+        while offset < len(view):
+            length, message_id, type_code = self.FRAME_HEADER.unpack_from(
+                view, offset)
+            start = offset + self.FRAME_HEADER.size
+            end = offset + self.LENGTH_SIZE + length
+
+            name = MESSAGE_NAMES[message_id]
+            value = self.unpack_value(type_code, view[start:end])
+            values.append((name, value))
+            offset = end
+
+        return values
+
+    def encode_binary(self, x: Any, name: Name) -> bytes:
+        type_code, payload = self.pack_value(x)
+        header = self.FRAME_HEADER.pack(
+            self.FRAME_HEADER.size - self.LENGTH_SIZE + len(payload),
+            MESSAGE_IDS[name],
+            type_code
+        )
+        return header + payload
+
+    def pack_value(self, x: Any) -> Tuple[int, bytes]:
+        """
+        값 -> (타입 코드, 바이트)
+        """
+        if isinstance(x, Quantized):
+            return self.QUANTIZED, self.pack_quantized(x.array, x.resolution)
+        if isinstance(x, np.ndarray):
+            dtype = np.dtype("<f4") if x.dtype == np.float32 else np.dtype("<f8")
+            x = np.ascontiguousarray(x, dtype=dtype)
+            return self.dtype2code_map[dtype], x.tobytes()
+
+        type_code = self.type2code_map[type(x)]
+        if type(x) is int:
+            return type_code, self.INT.pack(x)
+        if type(x) is float:
+            return type_code, self.FLOAT.pack(x)
+        if type(x) is str:
+            return type_code, x.encode("utf-8")
+        return type_code, bytes(x)
+
+    def unpack_value(self, type_code: int, data: memoryview) -> Any:
+        """
+        (타입 코드, 바이트) -> 값
+        """
+        if type_code in self.code2dtype_map:
+            return np.frombuffer(data, dtype=self.code2dtype_map[type_code])
+        if type_code == self.QUANTIZED:
+            return self.unpack_quantized(data)
+        if type_code == self.type2code_map[int]:
+            return self.INT.unpack(data)[0]
+        if type_code == self.type2code_map[float]:
+            return self.FLOAT.unpack(data)[0]
+        if type_code == self.type2code_map[str]:
+            return str(data, "utf-8")
+        if type_code == self.type2code_map[bytes]:
+            return bytes(data)
+        raise ValueError(f"Unknown type code {type_code}")
+
+    def pack_quantized(self, array: np.ndarray, resolution: float) -> bytes:
+        """
+        (n, 3) -> [헤더][첫 점][차분]
+        """
+        points = np.rint(np.reshape(array, (-1, 3)) / resolution).astype(np.int64)
+        if not len(points):
+            return self.QUANTIZED_HEADER.pack(resolution, 0, 2)
+
+        deltas = np.diff(points, axis=0)
+        width = 2 if not len(deltas) or np.abs(deltas).max() <= 0x7FFF else 4
+        if width == 4 and np.abs(deltas).max() > 0x7FFFFFFF:
+            raise ValueError("Waypoints too far apart for the resolution")
+
+        return self.QUANTIZED_HEADER.pack(resolution, len(points), width) + \
+            self.QUANTIZED_ORIGIN.pack(*points[0]) + \
+            deltas.astype(self.DELTA_DTYPES[width]).tobytes()
+
+    def unpack_quantized(self, data: memoryview) -> np.ndarray:
+        """
+        [헤더][첫 점][차분] -> (n, 3) float64
+        """
+        resolution, n, width = self.QUANTIZED_HEADER.unpack_from(data)
+        if n == 0:
+            return np.zeros((0, 3))
+
+        offset = self.QUANTIZED_HEADER.size
+        points = np.empty((n, 3), dtype=np.int64)
+        points[0] = self.QUANTIZED_ORIGIN.unpack_from(data, offset)
+        points[1:] = np.frombuffer(
+            data, dtype=self.DELTA_DTYPES[width], count=(n - 1) * 3,
+            offset=offset + self.QUANTIZED_ORIGIN.size).reshape(-1, 3)
+        np.cumsum(points, axis=0, out=points)
+        return points * resolution
 
-    def encode_point(self, array: np.ndarray) -> str:
+    def encode_point(self, array: np.ndarray) -> Union[str, np.ndarray]:
         """
         입력 (3,)
-        출력 str
+        출력 str, binary codec이면 array를 그대로 반환
         """
-        return np.array2string(array)
+        if self.codec == Protocol.BINARY:
+            return array
+        # threshold를 넘으면 '...'로 생략되므로 항상 전체를 출력
+        # 줄바꿈은 메시지 끝이므로 한 줄로 (2차원이면 펼쳐서, decode_waypoints가 다시 (n, 3)으로)
+        return np.array2string(
+            np.ravel(array), threshold=sys.maxsize, max_line_width=sys.maxsize)
 
-    def decode_point(self, data: str) -> np.ndarray:
+    def decode_point(self, data: Union[str, np.ndarray]) -> np.ndarray:
+        if isinstance(data, np.ndarray):
+            return data
         data = data.replace('[', '').replace(']', '')
         array = np.fromstring(data, dtype=float, sep=' ')
         return array
 
-    def encode_waypoints(self, array: np.ndarray) -> str:
+    def encode_waypoints(self, array: np.ndarray) -> Union[str, np.ndarray, Quantized]:
         """
-        입력 (n, 3) 크기의 array 
-        출력 str   
+        입력 (n, 3) 크기의 array
+        출력 str, binary codec이면 array (waypoint_resolution이 있으면 Quantized)
         """
+        if self.waypoint_resolution is not None:
+            return Quantized(array, self.waypoint_resolution)
         return self.encode_point(array)
 
-    def decode_waypoints(self, data: str) -> np.ndarray:
+    def decode_waypoints(self, data: Union[str, np.ndarray]) -> np.ndarray:
         flattened = self.decode_point(data)
         return np.reshape(flattened, (-1, 3))
@@ -0,0 +1,166 @@
+from typing import Optional, Tuple
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import os
+
+"""
+같은 컴퓨터 안에서 GPS를 주고받는 공유 메모리 ring (seqlock)
+
+autopilot 브리지(쓰는 쪽, 한 프로세스)와 System(읽는 쪽)이 같은 보드에서 돌 때
+tcp + 문자열 직렬화 없이 위치를 float64 그대로 주고받는다.
+
+메모리 구조 (모두 little endian 8바이트)
+[slot 수][쓴 횟수 count][순번 x slots][시각 ns x slots][위치 (x, y, z) x slots]
+
+쓰는 쪽은 count+1 번째 위치를 slot (count+1) % slots 에 쓴다
+1. 그 slot의 순번을 홀수(2*count+1)로 바꿈 (쓰는 중)
+2. 시각, 위치를 씀
+3. 순번을 짝수(2*(count+1))로 바꾸고 count를 올림
+
+읽는 쪽은 count가 가리키는 slot을 복사하고, 복사 전후의 순번이 같고 짝수이면 사용한다.
+다르면 쓰는 도중이었으므로 다시 읽는다. slot이 여러 개라 쓰는 쪽이 한 바퀴 돌기 전까지는
+읽는 도중 덮어써지지 않는다.
+순번은 u8이므로 2^64에서 0으로 돌아간다 (비교도 같은 mask로).
+
+close 한 feed를 읽으면 ValueError. 쓰는 쪽이 close (unlink) 해도 이미 연 읽는 쪽은
+마지막 위치를 계속 읽을 수 있고, 새로 열면 FileNotFoundError.
+"""
+
+HEADER_SIZE = 16
+DTYPE = np.dtype("<u8")
+MASK = (1 << 64) - 1
+
+# 이 프로세스의 ShmWriter가 만든 feed 이름
+created = set()
+
+
+def feed_size(slots: int) -> int:
+    # 헤더 + 순번, 시각, 위치(3)
+    return HEADER_SIZE + slots * 8 * 5
+
+
+class ShmFeed:
+    """
+    공유 메모리 위의 numpy view들
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int) -> None:
+        self.shm = shm
+        self.slots = slots
+
+        buf = shm.buf
+        self.header = np.ndarray((2,), dtype=DTYPE, buffer=buf)
+        self.sequences = np.ndarray(
+            (slots,), dtype=DTYPE, buffer=buf, offset=HEADER_SIZE)
+        self.timestamps = np.ndarray(
+            (slots,), dtype="<i8", buffer=buf, offset=HEADER_SIZE + slots * 8)
+        self.positions = np.ndarray(
+            (slots, 3), dtype="<f8", buffer=buf, offset=HEADER_SIZE + slots * 16)
+
+    @property
+    def closed(self) -> bool:
+        return self.header is None
+
+    @property
+    def count(self) -> int:
+        if self.header is None:
+            raise ValueError("shared memory feed is closed")
+        return int(self.header[1])
+
+    def close(self):
+        if self.closed:
+            return
+        # view가 남아 있으면 close에서 BufferError
+        self.header = self.sequences = self.timestamps = self.positions = None
+        self.shm.close()
+
+
+class ShmWriter(ShmFeed):
+    """
+    위치를 쓰는 쪽 (프로세스 하나만), close 시 공유 메모리를 지운다
+    """
+
+    def __init__(self, name: str, slots: Optional[int] = 8) -> None:
+        shm = shared_memory.SharedMemory(name, create=True, size=feed_size(slots))
+        super().__init__(shm, slots)
+        created.add(shm.name)
+        self.header[0] = slots
+        self.header[1] = 0
+        self.sequences[:] = 0
+
+    def write(self, position: np.ndarray, timestamp: int):
+        """
+        position (3,), timestamp는 측정 시각 (ns)
+        """
+        count = self.count
+        slot = (count + 1) % self.slots
+
+        self.sequences[slot] = (2 * count + 1) & MASK
+        self.timestamps[slot] = timestamp
+        self.positions[slot] = position
+        self.sequences[slot] = (2 * (count + 1)) & MASK
+        self.header[1] = count + 1
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        self.shm.unlink()
+        created.discard(self.shm.name)
+
+
+class ShmReader(ShmFeed):
+    """
+    위치를 읽는 쪽, 여러 프로세스가 같은 feed를 읽어도 됨
+    """
+
+    # 쓰는 도중이라 다시 읽는 최대 횟수
+    RETRIES = 100
+
+    def __init__(self, name: str) -> None:
+        shm = shared_memory.SharedMemory(name)
+        if os.name == "posix" and shm.name not in created:
+            # 읽는 쪽이 끝날 때 resource_tracker가 공유 메모리를 지우지 않도록
+            # (같은 프로세스의 ShmWriter가 만든 것은 그쪽에서 지움)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        slots = int(np.ndarray((1,), dtype=DTYPE, buffer=shm.buf)[0])
+        super().__init__(shm, slots)
+
+        self.last_count = 0
+        self.retried = 0
+
+    def read(self) -> Optional[Tuple[int, int, np.ndarray]]:
+        """
+        가장 최근 위치 (count, 시각 ns, 위치 (3,) 복사본)
+        아직 쓴 것이 없거나 계속 쓰는 중이면 None
+        """
+        for _ in range(self.RETRIES):
+            count = self.count
+            if count == 0:
+                return None
+            slot = count % self.slots
+
+            sequence = self.sequences[slot]
+            if sequence != (2 * count) & MASK:
+                # 이미 다음 바퀴가 쓰는 중
+                self.retried += 1
+                continue
+            timestamp = int(self.timestamps[slot])
+            position = self.positions[slot].copy()
+            if self.sequences[slot] == sequence:
+                return count, timestamp, position
+            self.retried += 1
+        return None
+
+    def poll(self) -> Optional[np.ndarray]:
+        """
+        마지막으로 poll한 뒤 새로 쓴 위치가 있으면 그 위치, 없으면 None
+        (그 사이 여러 번 썼으면 가장 최근 것만)
+        """
+        if self.count == self.last_count:
+            return None
+        result = self.read()
+        if result is None:
+            return None
+        self.last_count, _, position = result
+        return position
@@ -1,61 +1,370 @@
+import errno
+import logging
+import os
+import random
 import socket
 import threading
-import time
-from typing import Optional, List
+from typing import List, Optional
+from common.protocol import Protocol
+from common.inbox import Inbox
+from common.clock import Clock, MonotonicClock
+
+log = logging.getLogger(__name__)
+
 
 class Connection:
-    
-    def __init__(self, host:str, port: Optional[int] = 22) -> None:
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        
-        connected = False
-        while not connected:
-            try:
-                self.socket.connect((host, port))
-                connected = True
-            except ConnectionRefusedError:
-                pass
-        
+
+    """
+    threaded=True 이면 생성할 때 연결될 때까지 기다리고 수신 스레드에서 받는다
+    threaded=False 이면 기다리지 않고 연결을 시작만 한다 (start_connect)
+    외부 루프(System.run_event_driven, Fleet.run)가 connecting 소켓이 쓰기 가능해지면 finish_connect
+    """
+
+    # sendmsg 한 번에 넘길 수 있는 버퍼 수 (리눅스 IOV_MAX)
+    MAX_BUFFERS = 1024
+
+    def __init__(
+        self,
+        host: str,
+        port: Optional[int] = 22,
+        protocol: Optional[Protocol] = None,
+        buffer_size: Optional[int] = 65536,
+        threaded: Optional[bool] = True,
+        inbox: Optional[Inbox] = None,
+        clock: Optional[Clock] = None,
+        nodelay: Optional[bool] = True,
+        connect_timeout: Optional[float] = 5.,
+        backoff: Optional[float] = .1,
+        max_backoff: Optional[float] = 5.,
+        auto_reconnect: Optional[bool] = True,
+        max_outgoing: Optional[int] = 256
+    ) -> None:
         self.host = host
         self.port = port
-        self.received_data : List[str] = []
-        
-        self.lock = threading.Lock()
-        
+        self.protocol = protocol if protocol else Protocol()
+        self.received_data = inbox if inbox is not None else Inbox(self.protocol)
+        self.clock = clock if clock else MonotonicClock()
+        # 마지막으로 데이터를 받은 시각 (clock.now)
+        self.last_received: Optional[float] = None
+
+        # 보낼 메시지는 모아서 flush 때 한 번에 쓰므로 Nagle 지연은 기본으로 끔
+        self.nodelay = nodelay
+        # 연결 실패 시 backoff, 2*backoff, ... max_backoff 초 (jitter 포함) 뒤에 다시 시도
+        self.connect_timeout = connect_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_delay = backoff
+        self.failures = 0
+        self.auto_reconnect = auto_reconnect
+        self.reconnects = 0
+        self.closing = threading.Event()
+
+        # send로 쌓아두었다가 flush에서 한 번에 보낼 메시지들과 immediate 여부
+        # 끊겨 있는 동안 max_outgoing을 넘으면 immediate가 아닌 오래된 메시지부터 버림
+        self.outgoing: List[bytes] = []
+        self.urgent: List[bool] = []
+        self.max_outgoing = max_outgoing
+        self.dropped = 0
+        self.sending_lock = threading.Lock()
+
+        # recv_into로 받는 미리 할당된 버퍼, [0, buffered) 까지 유효
+        self.buffer = bytearray(buffer_size)
+        self.buffered = 0
+
+        self.socket: Optional[socket.socket] = None
+        # start_connect로 연결 중인 non-blocking 소켓과 시작 시각 (clock.now)
+        self.connecting: Optional[socket.socket] = None
+        self.connect_started: Optional[float] = None
         self.receiving = True
-        self.receiving_thread = threading.Thread(target=self.receive)
-        self.receiving_thread.start()
-    
+
+        # threaded=False 이면 수신 스레드 없이 외부 루프(selector)에서 receive_once를 호출
+        self.receiving_thread: Optional[threading.Thread] = None
+        if threaded:
+            self.connect()
+            self.receiving_thread = threading.Thread(target=self.receive)
+            self.receiving_thread.start()
+        else:
+            self.start_connect()
+
+    def connect(self) -> bool:
+        """
+        연결될 때까지 backoff 하며 재시도, clean이 호출되면 False
+        """
+        while not self.closing.is_set():
+            if self.try_connect():
+                return True
+            self.clock.wait(self.closing, self.retry_delay)
+        return False
+
+    def try_connect(self) -> bool:
+        """
+        한 번 연결 시도
+        실패하면 다음 재시도까지 기다릴 시간(retry_delay)을 늘린다
+        """
+        try:
+            sock = socket.create_connection(
+                (self.host, self.port), timeout=self.connect_timeout)
+        except OSError as e:
+            self.connect_failed(e)
+            return False
+        return self.use_socket(sock)
+
+    def start_connect(self) -> Optional[socket.socket]:
+        """
+        기다리지 않고 연결을 시작 (event-driven 루프용)
+        연결 중인 소켓을 반환, 쓰기 가능해지면 finish_connect 호출
+        바로 실패하면 None (retry_delay가 늘어남)
+        """
+        self.abort_connect()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            error = sock.connect_ex((self.host, self.port))
+        except OSError as e:
+            # 주소를 찾을 수 없음 등
+            sock.close()
+            self.connect_failed(e)
+            return None
+        if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            sock.close()
+            self.connect_failed(OSError(error, os.strerror(error)))
+            return None
+
+        self.connecting = sock
+        self.connect_started = self.clock.now()
+        return sock
+
+    def finish_connect(self) -> bool:
+        """
+        start_connect로 시작한 연결이 끝났을 때 (소켓이 쓰기 가능) 호출, 연결되었으면 True
+        """
+        sock, self.connecting = self.connecting, None
+        if sock is None:
+            return False
+        error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            sock.close()
+            self.connect_failed(OSError(error, os.strerror(error)))
+            return False
+        return self.use_socket(sock)
+
+    def abort_connect(self):
+        """
+        연결 중인 소켓이 있으면 닫고 실패로 처리 (connect_timeout 초과 등)
+        """
+        sock, self.connecting = self.connecting, None
+        if sock is not None:
+            sock.close()
+            self.connect_failed(TimeoutError("connect timed out"))
+
+    def connect_failed(self, e: OSError):
+        self.failures += 1
+        delay = min(self.backoff * 2 ** min(self.failures - 1, 32), self.max_backoff)
+        self.retry_delay = delay * random.uniform(.5, 1.)
+        log.debug("Connecting to %s:%d failed (%s), retry in %.2fs",
+                  self.host, self.port, e, self.retry_delay)
+
+    def use_socket(self, sock: socket.socket) -> bool:
+        """
+        연결된 소켓으로 교체 (blocking), clean이 호출되었으면 닫고 False
+        """
+        sock.settimeout(None)
+        if self.nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        with self.sending_lock:
+            if self.closing.is_set():
+                sock.close()
+                return False
+            self.socket = sock
+        self.buffered = 0
+        self.failures = 0
+        self.retry_delay = self.backoff
+        return True
+
+    def disconnect(self):
+        """
+        끊어진 소켓을 닫는다 (받다 만 메시지는 버림, 보낼 큐는 유지)
+        """
+        with self.sending_lock:
+            if self.socket is not None:
+                self.socket.close()
+        self.buffered = 0
+
+    def reconnect(self) -> bool:
+        log.warning("Connection to %s:%d lost, reconnecting", self.host, self.port)
+        self.disconnect()
+        if not self.connect():
+            return False
+        self.reconnects += 1
+        log.warning("Reconnected to %s:%d", self.host, self.port)
+        return True
+
     def receive(self):
         while self.receiving:
             try:
-                data = self.socket.recv(1024)
-            except ConnectionResetError:
-                self.receiving = False
-                
-            if data:
-                with self.lock:
-                    self.received_data.append(data)
-            time.sleep(.5)
-    
+                received = self.receive_once()
+            except (ConnectionResetError, ConnectionAbortedError, OSError):
+                received = False
+
+            if not received:
+                if not (self.receiving and self.auto_reconnect and self.reconnect()):
+                    self.receiving = False
+
+    def receive_once(self) -> bool:
+        """
+        한 번 recv_into 하고 완성된 메시지들을 received_data에 넣는다
+        연결이 끊겼으면 False
+        """
+        if self.buffered == len(self.buffer):
+            # 버퍼보다 큰 메시지
+            self.buffer.extend(bytes(len(self.buffer)))
+
+        with memoryview(self.buffer) as view:
+            n = self.socket.recv_into(view[self.buffered:])
+            if n == 0:
+                return False
+            self.buffered += n
+            self.last_received = self.clock.now()
+
+            messages, consumed = self.protocol.split(view[:self.buffered])
+
+        if consumed:
+            remaining = self.buffered - consumed
+            self.buffer[:remaining] = self.buffer[consumed:self.buffered]
+            self.buffered = remaining
+
+        for message in messages:
+            self.received_data.put(message)
+        return True
+
+    def fileno(self) -> int:
+        return self.socket.fileno()
+
     def get(self) -> Optional[bytes]:
-        data = None
-        with self.lock:
-            if self.received_data:
-                data = self.received_data.pop(0)
-        return data
-    
-    def send(self, x: bytes):
-        self.socket.sendall(x)
-    
+        return self.received_data.get()
+
+    def send(
+        self,
+        x: bytes,
+        immediate: Optional[bool] = False,
+        coalesce: Optional[bool] = False
+    ):
+        """
+        x를 보낼 큐에 넣는다 (실제 전송은 flush)
+        immediate=True 이면 (비상 착륙 등) 쌓인 메시지와 함께 바로 전송
+        coalesce=True 이면 (주기적인 RUNNING_STATE 등) 아직 못 보낸 같은 이름의 메시지를 버리고 최신 것만
+        """
+        with self.sending_lock:
+            if coalesce and self.outgoing:
+                name = self.protocol.peek_name(x)
+                for i in reversed(range(len(self.outgoing))):
+                    if not self.urgent[i] and self.protocol.peek_name(self.outgoing[i]) == name:
+                        del self.outgoing[i]
+                        del self.urgent[i]
+            self.outgoing.append(x)
+            self.urgent.append(bool(immediate))
+            if immediate:
+                self.flush_locked()
+            elif len(self.outgoing) > self.max_outgoing:
+                self.drop_oldest()
+
+    def drop_oldest(self):
+        # sending_lock을 잡은 상태에서 호출
+        for i, urgent in enumerate(self.urgent):
+            if not urgent:
+                del self.outgoing[i]
+                del self.urgent[i]
+                self.dropped += 1
+                if self.dropped == 1 or self.dropped % 100 == 0:
+                    log.warning("Outgoing queue to %s:%d is full, dropped %d messages",
+                                self.host, self.port, self.dropped)
+                return
+
+    def flush(self):
+        """
+        쌓인 메시지를 한 번의 scatter-gather write로 전송
+        연결이 끊겨 있으면 (auto_reconnect) 못 보낸 메시지는 큐에 남겨 재연결 후 전송
+        """
+        with self.sending_lock:
+            if self.outgoing:
+                self.flush_locked()
+
+    def flush_locked(self):
+        if self.socket is None:
+            # 아직 처음 연결 중 (threaded=False), 연결되면 flush에서 보냄
+            if self.urgent[-1]:
+                log.error("Immediate send to %s:%d before connecting, queued",
+                          self.host, self.port)
+            return
+        buffers, self.outgoing = self.outgoing, []
+        urgent, self.urgent = self.urgent, []
+        try:
+            sent = self.write(buffers)
+        except OSError as e:
+            if not self.auto_reconnect:
+                raise
+            sent = getattr(e, "sent", 0)
+            if any(urgent[sent:]):
+                log.error("Immediate send to %s:%d failed (%s), queued until reconnect",
+                          self.host, self.port, e)
+            else:
+                log.debug("Sending to %s:%d failed (%s)", self.host, self.port, e)
+        if sent < len(buffers):
+            self.outgoing = buffers[sent:] + self.outgoing
+            self.urgent = urgent[sent:] + self.urgent
+
+    def write(self, buffers: List[bytes]) -> int:
+        """
+        보낸 버퍼 수 반환
+        실패하면 OSError의 sent 속성에 그때까지 다 보낸 버퍼 수
+        """
+        if not hasattr(self.socket, "sendmsg"):
+            # sendmsg가 없는 플랫폼 (Windows)
+            self.socket.sendall(b"".join(buffers))
+            return len(buffers)
+
+        views = [memoryview(b) for b in buffers]
+        i = 0
+        try:
+            while i < len(views):
+                n = self.socket.sendmsg(views[i:i + self.MAX_BUFFERS])
+                # 다 보낸 버퍼는 건너뛰고 일부만 보낸 버퍼는 남은 부분부터
+                while i < len(views) and n >= len(views[i]):
+                    n -= len(views[i])
+                    i += 1
+                if n:
+                    views[i] = views[i][n:]
+        except OSError as e:
+            e.sent = i
+            raise
+        return i
+
     def clean(self):
         self.receiving = False
-        self.receiving_thread.join()
-        self.socket.close()
-    
+        self.closing.set()
+        if self.connecting is not None:
+            self.connecting.close()
+            self.connecting = None
+        try:
+            self.flush()
+        except OSError:
+            pass
+        if self.socket is not None:
+            try:
+                # 블로킹 중인 recv_into를 깨운다
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.receiving_thread:
+            self.receiving_thread.join()
+        if self.socket is not None:
+            self.socket.close()
+
 if __name__ == "__main__":
-    
+
     connection = Connection('127.0.0.1', 2222)
     connection.send(b"Hi")
+    connection.flush()
     print(connection.get())
     connection.clean()
@@ -0,0 +1,100 @@
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from .event_manager import EventManager
+import time
+
+"""
+메시지 이름 -> 이벤트 구독 함수 매핑
+
+route로 (메시지 이름, 이벤트, 인자 형태)를 등록해두면
+EventManager의 구독 함수들까지 풀어서 이름 하나당 dict 한 번 조회로 실행할 수 있게 컴파일한다.
+구독이 바뀌면 (EventManager.version) 다음 dispatch 때 다시 컴파일한다.
+
+인자 형태
+- NAME_VALUE: f(name, value)  (파라미터)
+- VALUE: f(value)
+- NONE: f()
+"""
+
+Name = str
+# (이벤트 metric 이름, 구독 함수들, background 구독 함수들, 인자 형태)
+Entry = Tuple[str, Tuple[Callable, ...], Tuple[Callable, ...], int]
+
+
+class DispatchTable:
+
+    NONE = 0
+    VALUE = 1
+    NAME_VALUE = 2
+
+    def __init__(self, event_manager: EventManager) -> None:
+        self.event_manager = event_manager
+        self.routes: Dict[Name, List[Tuple[Any, int]]] = {}
+        self.table: Dict[Name, Tuple[Entry, ...]] = {}
+        self.version = -1
+
+    def route(self, names: Iterable[Name], event_name: Any, args: int = VALUE):
+        """
+        names 메시지를 받으면 event_name 이벤트를 발생시키도록 등록
+        """
+        if isinstance(names, str):
+            names = [names]
+        for name in names:
+            self.routes.setdefault(name, []).append((event_name, args))
+        self.version = -1
+
+    def compile(self):
+        self.table = {
+            name: tuple(
+                (
+                    self.event_manager.metric_names[event_name],
+                    self.event_manager.subscribers(event_name),
+                    self.event_manager.background_subscribers(event_name),
+                    args
+                )
+                for event_name, args in routes
+            )
+            for name, routes in self.routes.items()
+        }
+        self.version = self.event_manager.version
+
+    def __contains__(self, name: Name) -> bool:
+        return name in self.routes
+
+    def dispatch(self, name: Name, value: Any) -> bool:
+        """
+        등록된 메시지면 구독 함수들을 실행하고 True
+        """
+        if self.version != self.event_manager.version:
+            self.compile()
+
+        entries = self.table.get(name)
+        if entries is None:
+            return False
+
+        metrics = self.event_manager.metrics
+        for metric_name, functions, background, args in entries:
+            if metrics.enabled:
+                start = time.perf_counter_ns()
+
+            if args == DispatchTable.NAME_VALUE:
+                for f in functions:
+                    f(name, value)
+            elif args == DispatchTable.VALUE:
+                for f in functions:
+                    f(value)
+            else:
+                for f in functions:
+                    f()
+
+            if metrics.enabled:
+                metrics.record(metric_name, time.perf_counter_ns() - start)
+
+            if background:
+                if args == DispatchTable.NAME_VALUE:
+                    data = (name, value)
+                elif args == DispatchTable.VALUE:
+                    data = (value,)
+                else:
+                    data = ()
+                self.event_manager.run_background(background, data)
+        return True
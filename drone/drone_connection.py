@@ -1,14 +1,172 @@
+import logging
 import socket
 import threading
 import time
 from typing import Optional, List
+from common.protocol import Protocol
+from common.inbox import Inbox
+from common.shm_feed import ShmReader
+from common.clock import Clock, MonotonicClock
+import numpy as np
 from .connection import Connection
 
 """
 드론 관련해서 송수힌 하는 클래스
-현재는 파라미터값과 드론 상태를 모두 tcp를 통해서 받아오기 때문에
+명령(RUNNING_STATE, EMERGENCY_LANDING)과 GPS는 기본으로 tcp를 통해서 주고받기 때문에
 connection의 코드를 재사용 함
+
+gps_port를 주면 GPS는 그 포트로 오는 UDP datagram으로 받는다 (명령은 계속 tcp)
+tcp는 segment 하나가 늦으면 뒤의 최신 위치까지 같이 늦어지므로 (head-of-line blocking)
+순번이 붙은 datagram으로 받고 마지막으로 받은 것보다 오래된 것은 버린다.
+보내는 쪽이 다시 시작해서 순번이 처음부터 오면 (또는 누가 큰 순번을 보내서 막히면)
+reorder_window보다 크게 뒤로 간 순번이나 stale_timeout 동안 받은 것이 없었던 뒤의 순번은 받아들이고 다시 센다.
+UDP는 기본으로 127.0.0.1에서만 받는다 (다른 컴퓨터의 브리지면 gps_host를 그 인터페이스 주소로).
+
+gps_shm을 주면 같은 컴퓨터의 브리지 프로세스가 공유 메모리(common.shm_feed)에 쓴 위치를
+poll_position으로 읽는다 (직렬화, 소켓 없음)
 """
 
+log = logging.getLogger(__name__)
+
+
+class DatagramChannel:
+    """
+    순번이 붙은 datagram을 받아 inbox에 넣는다
+    마지막으로 받은 순번보다 앞선(늦게 도착했거나 중복된) datagram은 버림
+    reorder_window보다 더 뒤의 순번이거나 stale_timeout 초 동안 받은 것이 없었으면
+    보내는 쪽이 다시 시작한 것으로 보고 그 순번부터 다시 센다
+    """
+
+    # 이 채널은 재연결하지 않음 (System.run_event_driven에서 확인)
+    auto_reconnect = False
+
+    def __init__(
+        self,
+        port: int,
+        protocol: Protocol,
+        inbox: Inbox,
+        host: Optional[str] = "127.0.0.1",
+        buffer_size: Optional[int] = 65536,
+        reorder_window: Optional[int] = 64,
+        stale_timeout: Optional[float] = 1.,
+        clock: Optional[Clock] = None
+    ) -> None:
+        self.protocol = protocol
+        self.received_data = inbox
+        self.reorder_window = reorder_window
+        self.stale_timeout = stale_timeout
+        self.clock = clock if clock else MonotonicClock()
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.buffer = bytearray(buffer_size)
+
+        self.last_sequence: Optional[int] = None
+        # 마지막으로 받아들인 시각 (clock.now)
+        self.last_received: Optional[float] = None
+        self.received = 0
+        self.dropped = 0
+        self.restarts = 0
+
+        self.receiving = True
+        self.receiving_thread: Optional[threading.Thread] = None
+
+    def start_receiving(self):
+        self.receiving_thread = threading.Thread(target=self.receive)
+        self.receiving_thread.start()
+
+    def receive(self):
+        while self.receiving:
+            try:
+                received = self.receive_once()
+            except OSError:
+                received = False
+
+            if not received:
+                self.receiving = False
+
+    def receive_once(self) -> bool:
+        """
+        datagram 하나를 받는다, 닫혔으면 False
+        """
+        n = self.socket.recv_into(self.buffer)
+        if not self.receiving:
+            return False
+        if n < self.protocol.SEQUENCE.size:
+            return True
+
+        with memoryview(self.buffer) as view:
+            sequence, message = self.protocol.decode_datagram(bytes(view[:n]))
+        now = self.clock.now()
+        if self.last_sequence is not None and \
+                not Protocol.sequence_newer(sequence, self.last_sequence):
+            behind = (self.last_sequence - sequence) & 0xFFFFFFFF
+            if behind <= self.reorder_window and now - self.last_received < self.stale_timeout:
+                self.dropped += 1
+                return True
+            log.warning("GPS sequence restarted at %d (last %d)", sequence, self.last_sequence)
+            self.restarts += 1
+
+        self.last_sequence = sequence
+        self.last_received = now
+        self.received += 1
+        self.received_data.put(message)
+        return True
+
+    def fileno(self) -> int:
+        return self.socket.fileno()
+
+    def get(self) -> Optional[bytes]:
+        return self.received_data.get()
+
+    def clean(self):
+        self.receiving = False
+        try:
+            # 블로킹 중인 recv_into를 깨운다
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self.receiving_thread:
+            self.receiving_thread.join()
+        self.socket.close()
+
+
 class DroneConnection(Connection):
-    pass
+
+    def __init__(
+        self,
+        host: str,
+        port: Optional[int] = 22,
+        gps_port: Optional[int] = None,
+        gps_host: Optional[str] = "127.0.0.1",
+        gps_shm: Optional[str] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(host, port, **kwargs)
+
+        # GPS를 받을 UDP 채널 (tcp와 같은 inbox를 사용)
+        self.datagram: Optional[DatagramChannel] = None
+        if gps_port is not None:
+            self.datagram = DatagramChannel(
+                gps_port, self.protocol, self.received_data, gps_host, clock=self.clock)
+            if self.receiving_thread:
+                self.datagram.start_receiving()
+
+        # 공유 메모리로 GPS를 받는 경우
+        self.feed: Optional[ShmReader] = ShmReader(gps_shm) if gps_shm else None
+
+    def poll_position(self) -> Optional[np.ndarray]:
+        """
+        공유 메모리에 새로 들어온 가장 최근 위치, 없으면 None
+        """
+        if self.feed is None:
+            return None
+        return self.feed.poll()
+
+    def clean(self):
+        super().clean()
+        if self.datagram:
+            self.datagram.clean()
+        if self.feed:
+            self.feed.close()
+            self.feed = None
@@ -1,32 +1,175 @@
-from typing import Callable, Dict, List, Any
+from typing import Callable, Deque, Dict, List, Any, Optional, Tuple
+from collections import deque
+from .metrics import Metrics, NULL_METRICS
+import logging
+import queue
+import threading
+import time
+
+"""
+이벤트 구독 / 발생
+
+- publish: 호출한 스레드에서 바로 구독 함수들을 실행
+- post / process: 우선순위 lane에 넣어두고 process를 호출한 스레드에서 높은 우선순위부터 실행
+  (다른 스레드에서 post 해도 됨, 이벤트 하나를 처리할 때마다 더 높은 lane을 다시 확인)
+- subscribe(..., background=True): 로그 같은 중요하지 않은 구독 함수는 worker pool에서 실행
+  큐가 가득 차면 버리고 dropped를 센다. workers=0 이면 호출한 스레드에서 실행
+"""
+
+log = logging.getLogger(__name__)
 
 
 class EventManager:
 
-    def __init__(self):
+    CRITICAL = 0
+    NORMAL = 1
+    LOW = 2
+
+    def __init__(
+        self,
+        metrics: Optional[Metrics] = None,
+        workers: Optional[int] = 0,
+        queue_size: Optional[int] = 1024
+    ):
         self.subsciptions: Dict[Any, List[Callable]] = {}
+        self.background: Dict[Any, List[Callable]] = {}
+        self.priorities: Dict[Any, int] = {}
+        self.metrics = metrics if metrics else NULL_METRICS
+        self.metric_names: Dict[Any, str] = {}
+        # 등록/구독이 바뀔 때마다 증가 (DispatchTable 재컴파일용)
+        self.version = 0
 
-    def register(self, event_name: Any):
+        self.lanes: List[Deque[Tuple[Any, tuple]]] = [
+            deque() for _ in range(EventManager.LOW + 1)]
+        self.lanes_lock = threading.Lock()
+
+        self.dropped = 0
+        self.queue: Optional[queue.Queue] = None
+        self.workers: List[threading.Thread] = []
+        if workers:
+            self.queue = queue.Queue(maxsize=queue_size)
+            for _ in range(workers):
+                worker = threading.Thread(target=self.work, daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def register(self, event_name: Any, priority: Optional[int] = NORMAL):
         """새로운 event를 추가"""
         if event_name in self.subsciptions:
             raise ValueError(f"{event_name} is already registered")
         self.subsciptions[event_name] = []
+        self.background[event_name] = []
+        self.priorities[event_name] = priority
+        self.metric_names[event_name] = \
+            f"event.{getattr(event_name, 'name', event_name)}"
+        self.version += 1
 
-    def subscribe(self, event_name: Any, function: Callable):
+    def subscribe(self, event_name: Any, function: Callable, background: Optional[bool] = False):
         """
         이벤트 event_name이 발생했을 때 function이 실행되도록 추가
+        background=True 이면 worker pool에서 실행
         """
         if event_name not in self.subsciptions:
             raise KeyError(f"{event_name} is not registered")
-        self.subsciptions[event_name].append(function)
+        if background:
+            self.background[event_name].append(function)
+        else:
+            self.subsciptions[event_name].append(function)
+        self.version += 1
+
+    def subscribers(self, event_name: Any) -> Tuple[Callable, ...]:
+        if event_name not in self.subsciptions:
+            raise KeyError(f"{event_name} is not registered")
+        return tuple(self.subsciptions[event_name])
+
+    def background_subscribers(self, event_name: Any) -> Tuple[Callable, ...]:
+        if event_name not in self.background:
+            raise KeyError(f"{event_name} is not registered")
+        return tuple(self.background[event_name])
 
     def publish(self, event_name: Any, *data):
         """
         이벤트 event_name이 발생했을 때
         구독 함수들을 data 값을 인자로 실행
         """
-        if event_name not in self.subsciptions:
+        try:
+            subscriptions = self.subsciptions[event_name]
+        except KeyError:
+            raise KeyError(f"{event_name} is not registered") from None
+
+        if not self.metrics.enabled:
+            for f in subscriptions:
+                f(*data)
+        else:
+            start = time.perf_counter_ns()
+            for f in subscriptions:
+                f(*data)
+            self.metrics.record(
+                self.metric_names[event_name], time.perf_counter_ns() - start)
+
+        background = self.background[event_name]
+        if background:
+            self.run_background(background, data)
+
+    def run_background(self, functions: List[Callable], data: tuple):
+        if self.queue is None:
+            for f in functions:
+                f(*data)
+            return
+
+        for f in functions:
+            try:
+                self.queue.put_nowait((f, data))
+            except queue.Full:
+                self.dropped += 1
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            f, data = item
+            try:
+                f(*data)
+            except Exception:
+                log.exception("Background subscriber %s failed", f)
+
+    def post(self, event_name: Any, *data):
+        """
+        우선순위 lane에 이벤트를 넣는다 (실행은 process에서)
+        """
+        if event_name not in self.priorities:
             raise KeyError(f"{event_name} is not registered")
+        with self.lanes_lock:
+            self.lanes[self.priorities[event_name]].append((event_name, data))
+
+    def process(self, limit: Optional[int] = None) -> int:
+        """
+        lane에 쌓인 이벤트를 높은 우선순위부터 실행, 실행한 이벤트 수 반환
+        """
+        n = 0
+        while limit is None or n < limit:
+            with self.lanes_lock:
+                for lane in self.lanes:
+                    if lane:
+                        event_name, data = lane.popleft()
+                        break
+                else:
+                    return n
+            self.publish(event_name, *data)
+            n += 1
+        return n
 
-        for f in self.subsciptions[event_name]:
-            f(*data)
+    def shutdown(self):
+        """
+        worker pool 종료 (이미 큐에 들어간 작업은 실행 후 종료)
+        post 된 뒤 아직 처리하지 않은 이벤트는 버림
+        """
+        with self.lanes_lock:
+            for lane in self.lanes:
+                lane.clear()
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
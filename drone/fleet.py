@@ -0,0 +1,380 @@
+from typing import Deque, Tuple, List, Any, Optional
+from collections import deque
+from .connection import Connection
+from .drone_connection import DroneConnection
+from .window_manager import (
+    LocationWindowManager, TimeWindowManager,
+    batch_location_in_range, batch_time_in_range)
+from common.protocol import Protocol
+from common.clock import Clock, MonotonicClock
+from common.headings import *
+import numpy as np
+import logging
+import selectors
+
+"""
+여러 드론을 한 프로세스에서 감시
+
+드론별 상태(위치, 현재 구간, 윈도우 파라미터)를 드론 수 N 크기의 배열로 쌓아두고
+LocationWindowManager / TimeWindowManager 검사를 매 tick 한 번에 벡터 연산으로 수행한다.
+윈도우 매니저는 파라미터 (N,) 배열을 담아두기만 하고
+검사는 batch_location_in_range / batch_time_in_range에 검사할 드론의 값만 골라 넘긴다.
+
+미션은 모든 드론의 waypoint를 하나의 (M, 3) 배열로 이어 붙이고
+드론별 시작 위치(offset)와 길이(length)로 구분한다.
+"""
+
+log = logging.getLogger(__name__)
+
+
+class Fleet:
+
+    def __init__(
+        self,
+        desired_cps: Optional[float] = 20,
+        protocol: Optional[Protocol] = None,
+        clock: Optional[Clock] = None,
+    ) -> None:
+        self.protocol = protocol if protocol else Protocol()
+        self.clock = clock if clock else MonotonicClock()
+
+        self.desired_cps = desired_cps
+        self.desired_time_per_cycle = 1/self.desired_cps
+
+        self.connections: List[Connection] = []
+        self.drone_connections: List[DroneConnection] = []
+
+        self.location_manager = LocationWindowManager(
+            np.empty(0), np.empty(0), np.empty(0))
+        self.time_manager = TimeWindowManager(
+            np.empty(0), np.empty(0), np.empty(0), np.empty(0), self.clock)
+        self.waypoint_range = np.empty(0)
+
+        self.positions = np.empty((0, 3))
+        self.mission_started = np.empty(0, dtype=bool)
+        self.reached = np.empty(0, dtype=bool)  # WAYPOINT_REACHED 수신
+        # 현재 구간의 목표 waypoint index (각 드론 미션 내 index)
+        self.waypoint_index = np.empty(0, dtype=np.int64)
+        # 현재 구간 시작 시각 / 마지막 위치 검사 시각 (clock.now)
+        self.segment_start_time = np.empty(0)
+        self.last_location_check = np.empty(0)
+
+        # 드론별 bundle 상태 (System과 같음)
+        # 적용한 bundle id, 시작을 받은 bundle id, 이미 적용해서 건너뛰는 bundle id
+        self.applied_bundles: List[Deque[int]] = []
+        self.current_bundle: List[Optional[int]] = []
+        self.skipped_bundle: List[Optional[int]] = []
+
+        self.missions: List[np.ndarray] = []
+        self.mission_points = np.empty((0, 3))
+        self.mission_directions = np.empty((0, 3))
+        self.mission_offsets = np.empty(0, dtype=np.int64)
+        self.mission_lengths = np.empty(0, dtype=np.int64)
+
+        # 처음 연결에 실패해서 다시 시작할 (시각, 연결, selector data)
+        self.retries: List[Tuple[float, Connection, Any]] = []
+
+        self.running = True
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def add_drone(
+        self,
+        connection: Connection,
+        drone_connection: DroneConnection
+    ) -> int:
+        """
+        드론 추가, 드론 index 반환
+        connection, drone_connection은 threaded=False로 만들어야 함
+        """
+        self.connections.append(connection)
+        self.drone_connections.append(drone_connection)
+
+        for manager, names in (
+            (self.location_manager, L_WIN_PARAM_NAMES),
+            (self.time_manager, T_WIN_PARAM_NAMES),
+        ):
+            for name in names:
+                setattr(manager, name, np.append(getattr(manager, name), np.nan))
+        self.waypoint_range = np.append(self.waypoint_range, np.nan)
+
+        self.positions = np.vstack([self.positions, np.full((1, 3), np.nan)])
+        self.mission_started = np.append(self.mission_started, False)
+        self.reached = np.append(self.reached, False)
+        self.waypoint_index = np.append(self.waypoint_index, 0)
+        self.segment_start_time = np.append(self.segment_start_time, 0.)
+        self.last_location_check = np.append(self.last_location_check, 0.)
+
+        self.applied_bundles.append(deque(maxlen=256))
+        self.current_bundle.append(None)
+        self.skipped_bundle.append(None)
+
+        self.missions.append(np.empty((0, 3)))
+        self.build_missions()
+
+        return len(self) - 1
+
+    def build_missions(self):
+        """
+        드론별 미션을 하나의 배열로 이어 붙이고 구간 방향 벡터를 미리 계산
+        """
+        self.mission_lengths = np.array(
+            [len(m) for m in self.missions], dtype=np.int64)
+        self.mission_offsets = np.concatenate(
+            [[0], np.cumsum(self.mission_lengths)[:-1]]).astype(np.int64)
+        self.mission_points = np.concatenate(self.missions + [np.empty((0, 3))])
+
+        # i번째 점의 방향 = i -> i+1 구간의 단위 벡터 (미션 마지막 점은 0)
+        directions = np.zeros_like(self.mission_points)
+        if len(self.mission_points) > 1:
+            diff = np.diff(self.mission_points, axis=0)
+            norm = np.linalg.norm(diff, axis=-1, keepdims=True)
+            directions[:-1] = np.divide(
+                diff, norm, out=np.zeros_like(diff), where=norm > 0)
+        last = self.mission_offsets + self.mission_lengths - 1
+        directions[last[self.mission_lengths > 0]] = 0.
+        self.mission_directions = directions
+
+    def set_mission(self, index: int, waypoints: np.ndarray):
+        """
+        0번째 waypoint는 항상 시작 지점으로 세팅해야 함
+        """
+        self.missions[index] = np.asarray(waypoints, dtype=float)
+        self.build_missions()
+
+    def start_mission(self, index: int, now: float):
+        self.mission_started[index] = True
+        self.waypoint_index[index] = 1
+        self.segment_start_time[index] = now
+        self.last_location_check[index] = now
+
+    """수신 부분"""
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        for i, (connection, drone_connection) in enumerate(
+            zip(self.connections, self.drone_connections)
+        ):
+            self.register(selector, connection, (i, self.receive_from_connection))
+            self.register(selector, drone_connection, (i, self.receive_from_drone))
+
+        clock = self.clock
+        last_update = clock.now()
+        try:
+            while self.running:
+                timeout = max(
+                    self.desired_time_per_cycle - (clock.now() - last_update), 0)
+
+                for key, mask in clock.select(selector, timeout):
+                    if mask & selectors.EVENT_WRITE:
+                        self.connected(selector, *key.data)
+                        continue
+
+                    connection = key.fileobj
+                    index, handler = key.data
+                    try:
+                        received = connection.receive_once()
+                    except OSError:
+                        received = False
+
+                    if not received:
+                        connection.receiving = False
+                        selector.unregister(connection)
+
+                    while (encoded := connection.get()):
+                        try:
+                            data_list = self.protocol.decode(encoded)
+                        except ValueError as e:
+                            log.warning("Dropping malformed message for drone %d: %s", index, e)
+                            continue
+                        handler(index, data_list)
+
+                now = clock.now()
+                if self.retries:
+                    self.retry_connect(selector, now)
+                if now - last_update >= self.desired_time_per_cycle:
+                    self.update(now)
+                    self.flush()
+                    last_update = now
+        finally:
+            selector.close()
+            clock.leave()
+
+    def register(self, selector: selectors.BaseSelector, connection: Connection, data: Any):
+        """
+        연결되어 있으면 수신 등록
+        생성할 때 시작한 연결이 아직 끝나지 않았으면 쓰기 가능해질 때까지 기다림 (루프를 막지 않음)
+        """
+        if connection.socket is not None:
+            selector.register(connection, selectors.EVENT_READ, data)
+        elif connection.connecting is not None:
+            selector.register(
+                connection.connecting, selectors.EVENT_WRITE, (connection, data))
+        else:
+            self.retries.append((self.clock.now() + connection.retry_delay, connection, data))
+
+    def connected(self, selector: selectors.BaseSelector, connection: Connection, data: Any):
+        selector.unregister(connection.connecting)
+        if connection.finish_connect():
+            selector.register(connection, selectors.EVENT_READ, data)
+        else:
+            self.retries.append((self.clock.now() + connection.retry_delay, connection, data))
+
+    def retry_connect(self, selector: selectors.BaseSelector, now: float):
+        due = [r for r in self.retries if r[0] <= now]
+        self.retries = [r for r in self.retries if r[0] > now]
+        for _, connection, data in due:
+            connection.start_connect()
+            self.register(selector, connection, data)
+
+    def receive_from_connection(self, index: int, data_list: List[Tuple[str, Any]]):
+        for name, value in data_list:
+            if name == BUNDLE:
+                self.on_bundle_start(index, value)
+                continue
+            if name == BUNDLE_END:
+                self.on_bundle_end(index, value)
+                continue
+            if self.skipped_bundle[index] is not None:
+                continue
+
+            if name in L_WIN_PARAM_NAMES:
+                getattr(self.location_manager, name)[index] = value
+
+            if name in T_WIN_PARAM_NAMES:
+                getattr(self.time_manager, name)[index] = value
+
+            if name == WAYPOINT_RANGE:
+                self.waypoint_range[index] = value
+
+            if name == WAYPOINTS:
+                self.set_mission(index, self.protocol.decode_waypoints(value))
+
+            if name == MISSION_START:
+                self.start_mission(index, self.clock.now())
+                self.send(index, self.protocol.encode(1, MISSION_START), immediate=True)
+
+            if name == WAYPOINT_REACHED:
+                self.reached[index] = True
+
+    def on_bundle_start(self, index: int, bundle_id: int):
+        if self.current_bundle[index] is not None:
+            log.warning("Drone %d: bundle %d did not end before bundle %d",
+                        index, self.current_bundle[index], bundle_id)
+        self.current_bundle[index] = bundle_id
+        self.skipped_bundle[index] = bundle_id if bundle_id in self.applied_bundles[index] else None
+
+    def on_bundle_end(self, index: int, bundle_id: int):
+        """
+        System.on_bundle_end와 같음, 시작을 받은 bundle만 서버에 ack (재전송된 bundle은 적용하지 않고 ack)
+        """
+        started, self.current_bundle[index] = self.current_bundle[index], None
+        skipped, self.skipped_bundle[index] = self.skipped_bundle[index], None
+        if started != bundle_id:
+            log.warning("Drone %d: bundle %d ended without its start", index, bundle_id)
+            return
+        if skipped is None:
+            self.applied_bundles[index].append(bundle_id)
+        try:
+            self.connections[index].send(self.protocol.encode(bundle_id, BUNDLE_ACK))
+        except OSError:
+            pass
+
+    def receive_from_drone(self, index: int, data_list: List[Tuple[str, Any]]):
+        for name, value in data_list:
+            if name == GPS_POSITION:
+                self.positions[index] = self.protocol.decode_point(value)
+
+    """검사 부분"""
+
+    def update(self, now: float):
+        """
+        모든 드론을 한 번에 검사
+        """
+        active = self.mission_started & \
+            (self.waypoint_index < self.mission_lengths) & \
+            ~np.isnan(self.positions).any(axis=-1)
+        if not active.any():
+            return
+
+        ids = np.flatnonzero(active)
+        positions = self.positions[ids]
+        start = self.mission_offsets[ids] + self.waypoint_index[ids]
+        last_waypoints = self.mission_points[start - 1]
+        next_waypoints = self.mission_points[start]
+        segment_elapsed = now - self.segment_start_time[ids]
+
+        # waypoint 도달 -> 시간 윈도우 검사
+        d = np.linalg.norm(next_waypoints - positions, axis=-1)
+        reached = (d <= self.waypoint_range[ids]) | self.reached[ids]
+        time_manager = self.time_manager
+        time_out = reached & ~batch_time_in_range(
+            positions,
+            last_waypoints,
+            segment_elapsed,
+            time_manager.desired_velocity[ids],
+            time_manager.low_offset[ids],
+            time_manager.high_offset[ids],
+            time_manager.common_error[ids]
+        )
+
+        # 주기마다 위치 윈도우 검사
+        location_manager = self.location_manager
+        due = (now - self.last_location_check[ids]) >= location_manager.check_period[ids]
+        location_out = due & ~batch_location_in_range(
+            segment_elapsed,
+            positions,
+            last_waypoints,
+            self.mission_directions[start - 1],
+            location_manager.desired_velocity[ids],
+            location_manager.window_size[ids]
+        )
+        self.last_location_check[ids[due]] = now
+
+        reached_ids = ids[reached]
+        self.reached[reached_ids] = False
+        self.waypoint_index[reached_ids] += 1
+        self.segment_start_time[reached_ids] = now
+
+        for i in ids[time_out]:
+            self.emergency_landing(i, 2)
+        for i in ids[location_out & ~time_out]:
+            self.emergency_landing(i, 1)
+
+        finished = self.waypoint_index >= self.mission_lengths
+        self.mission_started[finished] = False
+
+        for i in np.flatnonzero(self.mission_started):
+            self.send(i, self.protocol.encode(0, RUNNING_STATE), coalesce=True)
+
+    def emergency_landing(self, index: int, state: int):
+        log.warning("Drone %d emergency landing", index)
+        self.send(index, self.protocol.encode_multiple(
+            [(state, RUNNING_STATE), (1, EMERGENCY_LANDING)]), immediate=True)
+        self.mission_started[index] = False
+
+    def send(
+        self,
+        index: int,
+        data: bytes,
+        immediate: Optional[bool] = False,
+        coalesce: Optional[bool] = False
+    ):
+        try:
+            self.drone_connections[index].send(data, immediate, coalesce)
+        except OSError:
+            pass
+
+    def flush(self):
+        # 서버로 보내는 것은 bundle ack 뿐
+        for connection in self.connections + self.drone_connections:
+            try:
+                connection.flush()
+            except OSError:
+                pass
+
+    def stop(self):
+        self.running = False
+        for connection in self.connections + self.drone_connections:
+            connection.clean()
@@ -0,0 +1,193 @@
+from typing import Any, Dict, Optional
+import json
+import socket
+import threading
+import time
+
+"""
+구간별 지연 시간 히스토그램과 카운터
+
+System, EventManager가 기록하는 이름
+- receive_wait: 데이터를 기다린 시간 (event driven 모드의 select)
+- idle: 주기를 맞추기 위해 잠든 시간 (run)
+- decode: 메시지 하나 디코딩
+- event.<Events 이름>: 이벤트 하나의 구독 함수 전체 실행
+- check.location / check.time: 윈도우 검사
+- send: 드론으로 전송
+- gps_age: 위치 검사 시점에 사용한 GPS를 받은 지 지난 시간
+- cycle_overrun (카운터): 주기를 넘긴 cycle 수 (run)
+- schedule.<작업>.drift / schedule.<작업>.missed: 주기 작업 지연, 놓친 주기 수 (Scheduler)
+
+Metrics를 넘기지 않으면 NULL_METRICS를 사용하며 기록하지 않는다.
+"""
+
+
+class Histogram:
+    """
+    ns 단위 값의 log2 버킷 히스토그램
+    버킷 i에는 [2^(i-1), 2^i) 범위 값이 들어감
+    """
+
+    def __init__(self) -> None:
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int):
+        self.buckets[min(ns.bit_length(), 63)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q: float) -> int:
+        """
+        q (0~1) 분위수가 들어있는 버킷의 상한
+        """
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= target:
+                return min(1 << i, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ns": self.total / self.count if self.count else 0.,
+            "max_ns": self.max,
+            "p50_ns": self.percentile(.5),
+            "p90_ns": self.percentile(.9),
+            "p99_ns": self.percentile(.99),
+            "buckets": {str(1 << i): n for i, n in enumerate(self.buckets) if n},
+        }
+
+
+class Timer:
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.perf_counter_ns() - self.start)
+
+
+class NullTimer:
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+class Metrics:
+
+    enabled = True
+
+    def __init__(self) -> None:
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def record(self, name: str, ns: int):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(ns)
+
+    def increment(self, name: str, n: Optional[int] = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def time(self, name: str) -> Timer:
+        """
+        with metrics.time("decode"): ...
+        """
+        return Timer(self, name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "histograms": {k: v.snapshot() for k, v in self.histograms.items()},
+                "counters": dict(self.counters),
+            }
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+
+class NullMetrics:
+    """
+    기록하지 않는 Metrics
+    """
+
+    enabled = False
+    timer = NullTimer()
+
+    def record(self, name: str, ns: int):
+        pass
+
+    def increment(self, name: str, n: Optional[int] = 1):
+        pass
+
+    def time(self, name: str) -> NullTimer:
+        return self.timer
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"histograms": {}, "counters": {}}
+
+    def reset(self):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class MetricsServer:
+    """
+    연결하면 현재 snapshot을 JSON으로 보내고 연결을 닫는 로컬 서버
+    예) nc 127.0.0.1 9900
+    """
+
+    def __init__(self, metrics: Metrics, host: Optional[str] = "127.0.0.1", port: Optional[int] = 9900) -> None:
+        self.metrics = metrics
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(5)
+
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while self.running:
+            try:
+                conn, _ = self.socket.accept()
+            except OSError:
+                break
+            with conn:
+                data = json.dumps(self.metrics.snapshot(), sort_keys=True)
+                try:
+                    conn.sendall(data.encode("utf-8"))
+                except OSError:
+                    pass
+
+    def clean(self):
+        self.running = False
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        self.thread.join()
@@ -0,0 +1,194 @@
+from typing import Iterator, List, Optional, Tuple
+from collections import deque
+from common.clock import Clock, MonotonicClock, VirtualClock
+import mmap
+import struct
+import time
+
+"""
+텔레메트리 기록 / 재생
+
+기록 파일은 레코드를 뒤에 이어 붙이기만 한다 (append only)
+[시각 int64 (clock.now_ns)][종류 uint8][길이 uint32][메시지]
+
+종류
+- SERVER: 서버에서 받은 메시지
+- DRONE: 드론에서 받은 메시지
+- OUTBOUND: 드론으로 보낸 메시지 (RUNNING_STATE, EMERGENCY_LANDING)
+- UPDATE: System.update 호출, 메시지는 now (float64)
+
+재생 시에는 SERVER/DRONE/UPDATE 레코드를 기록된 순서대로 System에 넣고
+System이 보낸 메시지를 OUTBOUND 레코드와 비교한다.
+재생하는 System의 clock은 VirtualClock이어야 하며 각 레코드를 넣기 전에 기록된 시각으로 맞춘다.
+그래서 주기 작업의 마감 시각, TimeWindowManager의 경과 시간까지 기록과 같게 재생된다
+(Recorder에 System과 같은 clock을 넘길 것).
+"""
+
+
+class Recorder:
+
+    SERVER = 0
+    DRONE = 1
+    OUTBOUND = 2
+    UPDATE = 3
+
+    RECORD_HEADER = struct.Struct("<qBI")
+    TIME = struct.Struct("<d")
+
+    def __init__(self, path: str, clock: Optional[Clock] = None) -> None:
+        self.path = path
+        self.clock = clock if clock else MonotonicClock()
+        self.file = open(path, "ab")
+
+    def record(self, kind: int, message: bytes):
+        header = self.RECORD_HEADER.pack(self.clock.now_ns(), kind, len(message))
+        self.file.write(header + message)
+
+    def record_update(self, now: float):
+        self.record(Recorder.UPDATE, self.TIME.pack(now))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class LogReader:
+
+    def __init__(self, path: str) -> None:
+        self.file = open(path, "rb")
+        self.map: Optional[mmap.mmap] = None
+        size = self.file.seek(0, 2)
+        if size:
+            self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, memoryview]]:
+        """
+        (시각 ns, 종류, 메시지) 순서대로
+        메시지는 파일을 그대로 가리키는 memoryview
+        """
+        if self.map is None:
+            return
+
+        header = Recorder.RECORD_HEADER
+        view = memoryview(self.map)
+        offset = 0
+        while offset + header.size <= len(view):
+            timestamp, kind, length = header.unpack_from(view, offset)
+            start = offset + header.size
+            end = start + length
+            if end > len(view):
+                break  # 기록 중 잘린 마지막 레코드
+            yield timestamp, kind, view[start:end]
+            offset = end
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+class ReplayConnection:
+    """
+    재생용으로 Connection 대신 사용하는 가짜 연결
+    """
+
+    def __init__(self) -> None:
+        self.received_data: deque = deque()
+        self.sent: List[bytes] = []
+        self.receiving = True
+        self.receiving_thread = None
+
+    def put(self, message: bytes):
+        self.received_data.append(message)
+
+    def get(self) -> Optional[bytes]:
+        if self.received_data:
+            return self.received_data.popleft()
+        return None
+
+    def send(
+        self,
+        x: bytes,
+        immediate: Optional[bool] = False,
+        coalesce: Optional[bool] = False
+    ):
+        self.sent.append(x)
+
+    def flush(self):
+        pass
+
+    def poll_position(self):
+        # 공유 메모리로 받은 GPS도 DRONE 레코드로 기록되어 있음
+        return None
+
+    def clean(self):
+        self.receiving = False
+
+
+class Replay:
+    """
+    기록 파일을 소켓 없이 System에 다시 넣는다
+    system은 connection, drone_connection 모두 ReplayConnection으로,
+    clock은 VirtualClock으로 만들어야 함
+
+    speed가 None이면 기다리지 않고 최대한 빠르게, 아니면 기록 시간의 speed배 속도로 재생
+    """
+
+    def __init__(self, path: str, system, speed: Optional[float] = None) -> None:
+        if not isinstance(system.clock, VirtualClock):
+            raise ValueError("Replay requires a System with a VirtualClock")
+        self.path = path
+        self.system = system
+        self.speed = speed
+        self.recorded: List[bytes] = []
+
+    def run(self) -> List[bytes]:
+        """
+        재생 후 System이 드론으로 보낸 메시지 목록을 반환
+        """
+        system = self.system
+        reader = LogReader(self.path)
+        self.recorded = []
+
+        clock = system.clock
+        first: Optional[int] = None
+        wall_start = time.monotonic()
+        records = iter(reader)
+        try:
+            for timestamp, kind, message in records:
+                if first is None:
+                    first = timestamp
+                clock.set(timestamp / 1e9)
+                if self.speed:
+                    delay = (timestamp - first) / 1e9 / self.speed - \
+                        (time.monotonic() - wall_start)
+                    if delay > 0:
+                        time.sleep(delay)
+
+                if kind == Recorder.OUTBOUND:
+                    self.recorded.append(bytes(message))
+                elif not system.running:
+                    continue
+                elif kind == Recorder.UPDATE:
+                    system.update(Recorder.TIME.unpack(message)[0])
+                elif kind == Recorder.SERVER:
+                    system.connection.put(bytes(message))
+                    system.poll()
+                elif kind == Recorder.DRONE:
+                    system.drone_connection.put(bytes(message))
+                    system.poll()
+        finally:
+            # mmap을 닫기 전에 memoryview 참조를 모두 놓아야 함
+            records.close()
+            message = None
+            reader.close()
+
+        return system.drone_connection.sent
+
+    def matches(self) -> bool:
+        """
+        재생 중 보낸 메시지가 기록된 메시지와 같은지
+        """
+        return self.system.drone_connection.sent == self.recorded
@@ -0,0 +1,343 @@
+from typing import Any, List, Optional
+from .recorder import Recorder, ReplayConnection
+from .window_manager import LocationWindowManager, TimeWindowManager
+from .waypoint_manager import WaypointManager
+from common.protocol import Protocol
+from common.clock import MonotonicClock
+import numpy as np
+import logging
+import multiprocessing
+import socket
+
+"""
+안전 판단 (위치/시간 윈도우 검사, 비상 착륙, RUNNING_STATE 전송)을 별도 프로세스에서 실행
+
+System(safety_process=True)로 만들면
+- 부모 프로세스의 System은 받은 메시지(서버, 드론, 공유 메모리 GPS)를 디코딩하지 않고 pipe로 넘기기만 한다
+- 자식 프로세스는 윈도우/waypoint 매니저를 가진 별도의 System을 돌리고
+  드론 소켓의 복제본으로 RUNNING_STATE, EMERGENCY_LANDING을 직접 보낸다
+  (부모의 GIL, 수신 스레드, 로그 처리와 무관하게 자기 마감 시각에 깨어남)
+
+watchdog
+- 부모는 watchdog_timeout / 4 마다 PING을 보낸다
+- 자식은 미션 중 watchdog_timeout 동안 부모에게서 아무것도 못 받거나 pipe가 끊기면 비상 착륙
+- 부모는 자식이 판단 없이 죽으면 (pipe가 끊기면) 직접 EMERGENCY_LANDING을 보내고 멈춘다
+
+자식은 spawn으로 시작하므로 (부모의 스레드, lock을 물려받지 않음)
+System을 만드는 스크립트는 if __name__ == "__main__": 안에서 실행해야 한다.
+"""
+
+log = logging.getLogger(__name__)
+
+
+class SafetyLink(ReplayConnection):
+    """
+    자식 프로세스에서 드론 연결 역할
+    받는 메시지는 부모가 넘겨준 것, 보내는 메시지는 드론 소켓 복제본에 직접 쓴다
+    """
+
+    def __init__(self, sock: Optional[socket.socket], report: Optional[Any] = None) -> None:
+        super().__init__()
+        self.socket = sock
+        # 보낸 메시지를 부모에게 알릴 pipe (기록용)
+        self.report = report
+        self.outgoing: List[bytes] = []
+        # 부모가 넘겨준 공유 메모리 GPS (System.poll_position이 가져감)
+        self.position: Optional[np.ndarray] = None
+
+    def send(
+        self,
+        x: bytes,
+        immediate: Optional[bool] = False,
+        coalesce: Optional[bool] = False
+    ):
+        self.outgoing.append(x)
+        if immediate:
+            self.flush()
+
+    def flush(self):
+        if not self.outgoing or self.socket is None:
+            # 부모의 연결이 아직 끝나지 않음 (set_socket에서 보냄)
+            return
+        buffers, self.outgoing = self.outgoing, []
+        try:
+            self.socket.sendall(b"".join(buffers))
+        except OSError as e:
+            # 부모가 재연결하면 새 소켓을 넘겨주므로 그때 다시 보낸다
+            log.warning("Safety core could not send to drone (%s)", e)
+            self.outgoing = buffers + self.outgoing
+            return
+        if self.report:
+            for x in buffers:
+                self.report.send((SafetyProcess.OUTBOUND, x))
+
+    def poll_position(self) -> Optional[np.ndarray]:
+        position, self.position = self.position, None
+        return position
+
+    def set_socket(self, sock: socket.socket):
+        if self.socket is not None:
+            self.socket.close()
+        self.socket = sock
+        self.flush()
+
+    def clean(self):
+        super().clean()
+        if self.socket is not None:
+            self.socket.close()
+
+
+class SafetyUplink(ReplayConnection):
+    """
+    자식 프로세스에서 서버 연결 역할
+    서버로 보낼 메시지(bundle ack)는 부모에게 넘겨서 부모의 connection으로 보낸다
+    """
+
+    def __init__(self, report) -> None:
+        super().__init__()
+        self.report = report
+
+    def send(
+        self,
+        x: bytes,
+        immediate: Optional[bool] = False,
+        coalesce: Optional[bool] = False
+    ):
+        self.report.send((SafetyProcess.UPLINK, x))
+
+
+class SafetyCore:
+    """
+    자식 프로세스의 루프
+    System.run과 같지만 cycle 사이에 sleep 대신 pipe를 기다린다
+    """
+
+    def __init__(self, pipe, system, watchdog_timeout: float) -> None:
+        self.pipe = pipe
+        self.system = system
+        self.watchdog_timeout = watchdog_timeout
+        self.last_input = system.clock.now()
+        # 부모에게 알릴 멈춘 이유
+        self.reason = "emergency landing"
+
+    def run(self):
+        system = self.system
+        clock = system.clock
+        try:
+            while system.running:
+                now = clock.now()
+                timeout = system.scheduler.timeout(now)
+                if timeout is None:
+                    timeout = system.desired_time_per_cycle
+                timeout = min(timeout, max(self.last_input + self.watchdog_timeout - now, 0.))
+
+                if self.pipe.poll(timeout):
+                    self.receive()
+
+                system.poll()
+                system.update(clock.now())
+                system.flush()
+
+                if system.running and system.mission_started and \
+                        clock.now() - self.last_input > self.watchdog_timeout:
+                    log.warning("No input from System for %.2fs", clock.now() - self.last_input)
+                    self.emergency("watchdog")
+        finally:
+            if system.running:
+                system.stop()
+            try:
+                self.pipe.send((SafetyProcess.STOPPED, self.reason))
+            except OSError:
+                pass
+            self.pipe.close()
+
+    def receive(self):
+        """
+        pipe에 쌓인 메시지를 모두 받아서 넘긴다
+        """
+        system = self.system
+        while True:
+            try:
+                kind, payload = self.pipe.recv()
+            except EOFError:
+                # 부모 프로세스가 죽음
+                if system.mission_started:
+                    self.emergency("parent lost")
+                elif system.running:
+                    system.stop()
+                return
+            self.last_input = system.clock.now()
+
+            if kind == SafetyProcess.SERVER:
+                system.connection.put(payload)
+            elif kind == SafetyProcess.DRONE:
+                system.drone_connection.put(payload)
+            elif kind == SafetyProcess.POSITION:
+                system.drone_connection.position = payload
+            elif kind == SafetyProcess.SOCKET:
+                system.drone_connection.set_socket(payload)
+            elif kind == SafetyProcess.STOP:
+                self.reason = "stopped"
+                system.stop()
+                return
+
+            if not self.pipe.poll():
+                return
+
+    def emergency(self, reason: str):
+        from .system import Events
+
+        self.reason = reason
+        self.system.event_manager.publish(Events.EmergencyLanding)
+        self.system.event_manager.process()
+
+
+def run_safety_core(
+    pipe,
+    sock: Optional[socket.socket],
+    location_manager: LocationWindowManager,
+    time_manager: TimeWindowManager,
+    waypoint_manager: WaypointManager,
+    protocol: Protocol,
+    desired_cps: float,
+    heartbeat_period: float,
+    watchdog_timeout: float,
+    log_level: int
+):
+    """
+    자식 프로세스 진입점
+    """
+    # system이 이 모듈을 import 하므로 여기서 import
+    from .system import System
+
+    logging.basicConfig(level=log_level)
+    system = System(
+        SafetyUplink(pipe),
+        SafetyLink(sock, pipe),
+        location_manager,
+        time_manager,
+        waypoint_manager,
+        desired_cps=desired_cps,
+        protocol=protocol,
+        heartbeat_period=heartbeat_period,
+    )
+    SafetyCore(pipe, system, watchdog_timeout).run()
+
+
+class SafetyProcess:
+    """
+    부모 프로세스 쪽, System이 만든다
+    selector에 등록할 수 있음 (자식이 보낸 메시지가 오면 깨어남)
+    """
+
+    # pipe 메시지 종류
+    SERVER = 0
+    DRONE = 1
+    POSITION = 2
+    SOCKET = 3
+    PING = 4
+    STOP = 5
+    OUTBOUND = 6
+    STOPPED = 7
+    UPLINK = 8
+
+    # 자식에서 다시 연결하지 않음 (System.run_event_driven에서 확인)
+    auto_reconnect = False
+
+    def __init__(
+        self,
+        system,
+        watchdog_timeout: Optional[float] = .5,
+        start_method: Optional[str] = "spawn"
+    ) -> None:
+        if not isinstance(system.clock, MonotonicClock):
+            raise ValueError("Safety process requires a System with a MonotonicClock")
+        self.system = system
+        self.drone_connection = system.drone_connection
+        self.watchdog_timeout = watchdog_timeout
+
+        context = multiprocessing.get_context(start_method)
+        self.pipe, child = context.Pipe()
+        self.process = context.Process(
+            target=run_safety_core,
+            args=(
+                child,
+                self.drone_connection.socket,
+                system.location_manager,
+                system.time_manager,
+                system.waypoint_manager,
+                system.protocol,
+                system.desired_cps,
+                system.heartbeat_period,
+                watchdog_timeout,
+                logging.getLogger().getEffectiveLevel(),
+            ),
+            name="safety",
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+
+        # 자식에게 넘긴 드론 소켓 (연결 중이었으면 None, 재연결하면 바뀜)
+        self.socket = self.drone_connection.socket
+        self.receiving = True
+        # 자식이 멈춘 이유, 판단 없이 죽었으면 None
+        self.reason: Optional[str] = None
+
+    def send(self, kind: int, payload: Optional[Any] = None):
+        if not self.receiving:
+            return
+        try:
+            self.pipe.send((kind, payload))
+        except OSError:
+            # 자식이 죽음, receive_once에서 처리
+            pass
+
+    def ping(self):
+        """
+        부모가 살아 있음을 알리고 드론 소켓이 바뀌었으면 새 소켓을 넘긴다
+        """
+        sock = self.drone_connection.socket
+        if sock is not None and sock is not self.socket:
+            self.socket = sock
+            self.send(SafetyProcess.SOCKET, sock)
+        self.send(SafetyProcess.PING)
+
+    def receive_once(self) -> bool:
+        """
+        자식이 보낸 메시지를 모두 처리, 자식이 멈췄으면 False
+        """
+        while self.receiving and self.pipe.poll():
+            try:
+                kind, payload = self.pipe.recv()
+            except (EOFError, OSError):
+                log.error("Safety process died")
+                self.receiving = False
+                return False
+
+            if kind == SafetyProcess.OUTBOUND:
+                if self.system.recorder:
+                    self.system.recorder.record(Recorder.OUTBOUND, payload)
+            elif kind == SafetyProcess.UPLINK:
+                self.system.connection.send(payload)
+            elif kind == SafetyProcess.STOPPED:
+                log.warning("Safety process stopped: %s", payload)
+                self.reason = payload
+                self.receiving = False
+                return False
+        return self.receiving
+
+    def fileno(self) -> int:
+        return self.pipe.fileno()
+
+    def get(self) -> Optional[bytes]:
+        return None
+
+    def stop(self):
+        self.send(SafetyProcess.STOP)
+        self.receiving = False
+        self.process.join(self.watchdog_timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.pipe.close()
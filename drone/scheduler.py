@@ -0,0 +1,128 @@
+from typing import Callable, List, Optional, Tuple, Union
+from .metrics import Metrics, NULL_METRICS
+from common.clock import Clock, MonotonicClock
+import heapq
+import logging
+
+"""
+주기 작업 스케줄러
+
+작업마다 절대 마감 시각(deadline)을 heap에 넣어두고 지난 작업만 실행한다.
+다음 마감은 이전 마감 + 주기이므로 실행이 늦어져도 주기가 밀리지 않는다 (drift 누적 없음).
+한 주기 이상 늦으면 놓친 횟수(missed)를 세고 밀린 실행을 몰아서 하지 않는다.
+
+주기는 숫자 또는 주기를 반환하는 함수 (파라미터가 실행 중 바뀌는 경우)
+
+기록하는 metric
+- schedule.<이름>.drift: 마감보다 늦게 실행된 시간 (ns)
+- schedule.<이름>.missed (카운터): 놓친 주기 수
+"""
+
+log = logging.getLogger(__name__)
+
+Period = Union[float, Callable[[], float]]
+
+
+class Task:
+
+    def __init__(self, name: str, period: Period, function: Callable[[float], None]) -> None:
+        self.name = name
+        self.period = period
+        self.function = function
+        self.cancelled = False
+
+        self.runs = 0
+        self.missed = 0
+        self.drift = 0.
+        self.max_drift = 0.
+
+        self.drift_metric = f"schedule.{name}.drift"
+        self.missed_metric = f"schedule.{name}.missed"
+
+    def current_period(self) -> float:
+        return self.period() if callable(self.period) else self.period
+
+
+class Scheduler:
+
+    def __init__(self, clock: Optional[Clock] = None, metrics: Optional[Metrics] = None) -> None:
+        self.clock = clock if clock else MonotonicClock()
+        self.metrics = metrics if metrics else NULL_METRICS
+        # (마감 시각, 순번, 작업)
+        self.deadlines: List[Tuple[float, int, Task]] = []
+        self.sequence = 0
+
+    def add(
+        self,
+        name: str,
+        period: Period,
+        function: Callable[[float], None],
+        start: Optional[float] = None
+    ) -> Task:
+        """
+        function(now)를 period 초마다 실행
+        첫 실행은 start (기본값: 지금부터 한 주기 뒤)
+        """
+        task = Task(name, period, function)
+        if start is None:
+            start = self.clock.now() + task.current_period()
+        self.push(start, task)
+        return task
+
+    def remove(self, task: Task):
+        # heap에서는 꺼낼 때 버림
+        task.cancelled = True
+
+    def clear(self):
+        for _, _, task in self.deadlines:
+            task.cancelled = True
+        self.deadlines = []
+
+    def push(self, deadline: float, task: Task):
+        self.sequence += 1
+        heapq.heappush(self.deadlines, (deadline, self.sequence, task))
+
+    def next_deadline(self) -> Optional[float]:
+        while self.deadlines and self.deadlines[0][2].cancelled:
+            heapq.heappop(self.deadlines)
+        return self.deadlines[0][0] if self.deadlines else None
+
+    def timeout(self, now: float) -> Optional[float]:
+        """
+        다음 마감까지 남은 시간, 작업이 없으면 None
+        """
+        deadline = self.next_deadline()
+        if deadline is None:
+            return None
+        return max(deadline - now, 0.)
+
+    def run_due(self, now: float) -> int:
+        """
+        마감이 지난 작업들을 마감 순서대로 실행, 실행한 작업 수 반환
+        """
+        n = 0
+        while self.deadlines and self.deadlines[0][0] <= now:
+            deadline, _, task = heapq.heappop(self.deadlines)
+            if task.cancelled:
+                continue
+
+            period = task.current_period()
+            drift = now - deadline
+            missed = int(drift // period) if period > 0 else 0
+
+            task.runs += 1
+            task.drift = drift
+            if drift > task.max_drift:
+                task.max_drift = drift
+            self.metrics.record(task.drift_metric, int(drift * 1e9))
+            if missed:
+                task.missed += missed
+                self.metrics.increment(task.missed_metric, missed)
+                log.debug("Task %s missed %d deadlines", task.name, missed)
+
+            task.function(now)
+            n += 1
+
+            if not task.cancelled:
+                self.push(deadline + (missed + 1) * period, task)
+        return n
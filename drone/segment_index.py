@@ -0,0 +1,112 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+"""
+미션 구간들에 대한 공간 인덱스
+
+구간 i는 waypoints[i] -> waypoints[i+1]
+xy 평면을 cell_size 크기의 격자로 나누고 각 구간의 bounding box가 걸치는 칸에 구간을 등록한다.
+가까운 칸부터 고리 모양으로 넓혀가며 찾고, 남은 칸들이 지금까지 찾은 거리보다 멀면 멈춘다.
+거리는 z를 포함한 3차원 거리
+"""
+
+Cell = Tuple[int, int]
+
+
+class SegmentIndex:
+
+    def __init__(self, waypoints: np.ndarray, cell_size: Optional[float] = None) -> None:
+        self.starts = waypoints[:-1]
+        self.vectors = np.diff(waypoints, axis=0)
+        self.lengths_sq = np.sum(self.vectors ** 2, axis=-1)
+
+        if cell_size is None:
+            # 구간 하나가 대략 한두 칸에 들어가도록
+            lengths = np.sqrt(self.lengths_sq)
+            cell_size = float(np.median(lengths)) if len(lengths) else 1.
+            if cell_size <= 0:
+                cell_size = 1.
+        self.cell_size = cell_size
+
+        low = np.minimum(waypoints[:-1], waypoints[1:])[:, :2]
+        high = np.maximum(waypoints[:-1], waypoints[1:])[:, :2]
+        self.origin = waypoints[:, :2].min(axis=0)
+        low_cells = self.to_cells(low)
+        high_cells = self.to_cells(high)
+        self.shape = high_cells.max(axis=0) + 1 if len(high_cells) else np.ones(2, dtype=np.int64)
+
+        cells: Dict[Cell, List[int]] = {}
+        for i, (lo, hi) in enumerate(zip(low_cells, high_cells)):
+            for x in range(lo[0], hi[0] + 1):
+                for y in range(lo[1], hi[1] + 1):
+                    cells.setdefault((x, y), []).append(i)
+        self.cells = {k: np.array(v, dtype=np.int64) for k, v in cells.items()}
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def to_cells(self, xy: np.ndarray) -> np.ndarray:
+        return np.floor((xy - self.origin) / self.cell_size).astype(np.int64)
+
+    def distances(self, point: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """
+        point에서 ids 구간들까지의 최단 거리
+        """
+        vectors = self.vectors[ids]
+        w = point - self.starts[ids]
+        lengths_sq = self.lengths_sq[ids]
+        t = np.divide(
+            np.sum(w * vectors, axis=-1), lengths_sq,
+            out=np.zeros_like(lengths_sq), where=lengths_sq > 0)
+        closest = self.starts[ids] + vectors * np.clip(t, 0., 1.)[:, None]
+        return np.linalg.norm(point - closest, axis=-1)
+
+    def ring(self, center: np.ndarray, r: int) -> List[np.ndarray]:
+        """
+        center에서 체비쇼프 거리 r인 칸들에 등록된 구간들
+        """
+        cx, cy = int(center[0]), int(center[1])
+        if r == 0:
+            coords = [(cx, cy)]
+        else:
+            coords = [(cx + d, cy - r) for d in range(-r, r + 1)] + \
+                [(cx + d, cy + r) for d in range(-r, r + 1)] + \
+                [(cx - r, cy + d) for d in range(-r + 1, r)] + \
+                [(cx + r, cy + d) for d in range(-r + 1, r)]
+        return [self.cells[c] for c in coords if c in self.cells]
+
+    def query(self, point: np.ndarray) -> Tuple[int, float]:
+        """
+        point와 가장 가까운 구간과 그 거리 (경로 이탈 거리)
+        거리가 같으면 index가 작은 구간
+        """
+        if not len(self):
+            return -1, np.inf
+
+        center = self.to_cells(point[:2])
+        # 격자와 처음 겹치는 고리부터 마지막 칸까지
+        r = int(max(0, *(-center), *(center - self.shape + 1)))
+        r_max = int(max(*np.abs(center), *np.abs(center - self.shape + 1)))
+
+        best, best_d = -1, np.inf
+        if 8 * r > len(self.cells):
+            # 격자에서 멀리 떨어진 점은 전체 구간을 한 번에 계산하는 것이 빠름
+            d = self.distances(point, np.arange(len(self)))
+            i = int(np.argmin(d))
+            return i, float(d[i])
+
+        while r <= r_max:
+            found = self.ring(center, r)
+            if found:
+                ids = np.unique(np.concatenate(found))
+                d = self.distances(point, ids)
+                i = np.argmin(d)
+                if d[i] < best_d or (d[i] == best_d and ids[i] < best):
+                    best, best_d = int(ids[i]), float(d[i])
+
+            # 아직 안 본 칸들은 최소 r * cell_size 만큼 떨어져 있음
+            if best_d <= r * self.cell_size:
+                break
+            r += 1
+
+        return best, best_d
@@ -1,21 +1,30 @@
-from typing import Tuple, List, Any, Optional
+from typing import Callable, Deque, Tuple, List, Any, Optional
+from collections import deque
 from .connection import Connection
 from .drone_connection import DroneConnection
 from .window_manager import LocationWindowManager, TimeWindowManager
 from .waypoint_manager import WaypointManager
 from .event_manager import EventManager
+from .dispatch import DispatchTable
+from .scheduler import Scheduler, Task
+from .recorder import Recorder
+from .safety_process import SafetyProcess
+from .metrics import Metrics, NULL_METRICS
 from common.protocol import Protocol
+from common.clock import Clock
 from common.headings import *
 from enum import Enum, auto
 import numpy as np
-import datetime
-import time
+import selectors
+import logging
 """
 메인 파일
 
 전체 시스템 합친 부분
 """
 
+log = logging.getLogger(__name__)
+
 
 class Events(Enum):
     MissionStart = auto()
@@ -32,10 +41,29 @@ class Events(Enum):
     GPSReceived = auto()
     EmergencyLanding = auto()
     LocationCheckTime = auto()
+    BundleStart = auto()
+    BundleEnd = auto()
 
 
 class System:
 
+    # 메시지 이름 -> 이벤트 (새 메시지 타입은 여기에 추가)
+    SERVER_ROUTES = [
+        (L_WIN_PARAM_NAMES, Events.LWinParamReceived, DispatchTable.NAME_VALUE),
+        (T_WIN_PARAM_NAMES, Events.TWinParamReceived, DispatchTable.NAME_VALUE),
+        (WAYPOINT_PARAM_NAMES, Events.WMngParamReceived, DispatchTable.NAME_VALUE),
+        ([WAYPOINTS], Events.WaypointsReceived, DispatchTable.VALUE),
+        ([WAYPOINT_REACHED], Events.WaypointReached, DispatchTable.NONE),
+        ([TAKEOFF], Events.TakeOff, DispatchTable.NONE),
+        ([LAND], Events.Landing, DispatchTable.NONE),
+        ([MISSION_START], Events.MissionStart, DispatchTable.NONE),
+        ([BUNDLE], Events.BundleStart, DispatchTable.VALUE),
+        ([BUNDLE_END], Events.BundleEnd, DispatchTable.VALUE),
+    ]
+    DRONE_ROUTES = [
+        ([GPS_POSITION], Events.GPSReceived, DispatchTable.VALUE),
+    ]
+
     def __init__(
         self,
         connection: Connection,
@@ -44,23 +72,52 @@ class System:
         time_manager: TimeWindowManager,
         waypoint_manager: WaypointManager,
         desired_cps: Optional[float] = 20,
+        protocol: Optional[Protocol] = None,
+        recorder: Optional[Recorder] = None,
+        metrics: Optional[Metrics] = None,
+        event_workers: Optional[int] = 1,
+        clock: Optional[Clock] = None,
+        heartbeat_period: Optional[float] = .5,
+        safety_process: Optional[bool] = False,
+        watchdog_timeout: Optional[float] = .5,
     ) -> None:
         self.connection = connection
         self.drone_connection = drone_connection
         self.location_manager = location_manager
         self.time_manager = time_manager
         self.waypoint_manager = waypoint_manager
-        self.event_manager = EventManager()
-        self.protocol = Protocol()
+        self.metrics = metrics if metrics else NULL_METRICS
+        self.event_manager = EventManager(self.metrics, workers=event_workers)
+        self.protocol = protocol if protocol else Protocol()
+        self.recorder = recorder
+
+        # time_manager와 같은 시계를 사용 (clock을 넘기면 time_manager에도 적용)
+        if clock:
+            self.time_manager.clock = clock
+            self.time_manager.update_check_time()
+        self.clock = self.time_manager.clock
 
         # How many cycles of receiving & processing per seconds
         self.desired_cps = desired_cps
         self.desired_time_per_cycle = 1/self.desired_cps
 
+        # 주기 작업 (위치 검사, RUNNING_STATE heartbeat, 미션 종료 확인)은
+        # 미션 시작 시 scheduler에 등록되어 각자의 마감 시각에 실행됨
+        self.heartbeat_period = heartbeat_period
+        self.scheduler = Scheduler(self.clock, self.metrics)
+        self.mission_tasks: List[Task] = []
+
         self.current_position: Optional[np.ndarray] = None
+        self.current_position_time: Optional[int] = None  # clock.now_ns
         self.direction_vector: Optional[np.ndarray] = None
         self.mission_started = False
 
+        # 적용한 bundle id (재전송된 bundle은 다시 적용하지 않고 ack만 보냄)
+        self.applied_bundles: Deque[int] = deque(maxlen=256)
+        # BUNDLE 시작을 받은 bundle id (BUNDLE_END와 id가 같아야 ack)
+        self.current_bundle: Optional[int] = None
+        self.skipped_bundle: Optional[int] = None
+
         events = [
             Events.MissionFinished,
             Events.MissionStart,
@@ -74,13 +131,38 @@ class System:
             Events.GPSReceived,
             Events.EmergencyLanding,
             Events.LocationCheckTime,
+            Events.BundleStart,
+            Events.BundleEnd,
         ]
+        # 비상 착륙 판단은 다른 이벤트보다 먼저 처리
+        # 안에서 발생시키는 이벤트 중 CRITICAL은 publish로 바로, 나머지는 post로 lane에 넣어
+        # 메시지 하나 / 주기 작업 묶음이 끝난 뒤 process에서 우선순위 순으로 처리
+        critical = [Events.EmergencyLanding, Events.LocationCheckTime]
         for e in events:
-            self.event_manager.register(e)
+            self.event_manager.register(
+                e,
+                EventManager.CRITICAL if e in critical else EventManager.NORMAL
+            )
 
         self.setup()
+
+        self.server_dispatch = DispatchTable(self.event_manager)
+        for names, event, args in self.SERVER_ROUTES:
+            self.server_dispatch.route(names, event, args)
+        self.drone_dispatch = DispatchTable(self.event_manager)
+        for names, event, args in self.DRONE_ROUTES:
+            self.drone_dispatch.route(names, event, args)
+        self.server_dispatch.compile()
+        self.drone_dispatch.compile()
+
         self.running = True
 
+        # 안전 판단을 별도 프로세스에서 (이 System은 받은 메시지를 넘기기만 함)
+        self.safety: Optional[SafetyProcess] = None
+        if safety_process:
+            self.safety = SafetyProcess(self, watchdog_timeout)
+            self.scheduler.add("safety_ping", watchdog_timeout / 4, self.ping_safety)
+
     def setup(self):
         """
         이벤트 callback 함수들 등록하기
@@ -106,84 +188,322 @@ class System:
             Events.WaypointsReceived, self.on_waypoints_received)
         self.event_manager.subscribe(
             Events.LocationCheckTime, self.on_location_check_time)
+        self.event_manager.subscribe(
+            Events.EmergencyLanding, self.on_emergency_landing)
+        self.event_manager.subscribe(Events.BundleStart, self.on_bundle_start)
+        self.event_manager.subscribe(Events.BundleEnd, self.on_bundle_end)
 
     """이벤트 발생 부분"""
 
     def run(self):
         """
         프로토콜이 파싱한 데이터의 이름-> 함수로 매핑하고 실행
+        받은 메시지는 desired_time_per_cycle 마다, 주기 작업은 각자의 마감 시각에 처리
+        """
+
+        clock = self.clock
+        try:
+            while self.running:
+                start = clock.now()
+
+                self.poll()
+                self.update(clock.now())
+                self.flush()
+
+                now = clock.now()
+                remaining = self.desired_time_per_cycle - (now - start)
+
+                if remaining < 0:
+                    self.metrics.increment("cycle_overrun")
+                    log.warning("System is running slower than desired cps")
+                    continue
+
+                timeout = self.scheduler.timeout(now)
+                if timeout is not None:
+                    remaining = min(remaining, timeout)
+                with self.metrics.time("idle"):
+                    clock.sleep(remaining)
+        finally:
+            clock.leave()
+
+    def run_event_driven(self):
+        """
+        두 소켓을 하나의 selector로 기다리다가 데이터가 오는 즉시 처리
+        다음 주기 작업의 마감 시각까지만 기다리므로 할 일이 없으면 깨어나지 않는다
+
+        connection, drone_connection 모두 threaded=False 로 만들어야 함
+        생성할 때 시작한 연결이 아직 끝나지 않았으면 이 루프에서 마침 (connect_later)
+        연결이 끊기면 (auto_reconnect) backoff 주기로 재연결을 시도하는 작업을 scheduler에 등록
+        (non-blocking 연결, 연결 중인 소켓도 같은 selector에서 기다리므로 루프를 막지 않음)
         """
+        if self.connection.receiving_thread or self.drone_connection.receiving_thread:
+            raise ValueError(
+                "Event driven mode requires connections with threaded=False")
+
+        selector = selectors.DefaultSelector()
+        for connection, handler in (
+            (self.connection, self.handle_from_connection),
+            (self.drone_connection, self.handle_from_drone),
+        ):
+            if connection.socket is None:
+                self.connect_later(selector, connection, handler)
+            else:
+                selector.register(connection, selectors.EVENT_READ, handler)
+        # UDP로 GPS를 받는 경우
+        datagram = getattr(self.drone_connection, "datagram", None)
+        if datagram:
+            selector.register(datagram, selectors.EVENT_READ, self.handle_from_drone)
+        if self.safety:
+            selector.register(self.safety, selectors.EVENT_READ)
+        # 공유 메모리 feed는 fd가 없으므로 desired_time_per_cycle 마다 확인
+        feed = getattr(self.drone_connection, "feed", None)
+
+        clock = self.clock
+        try:
+            while self.running:
+                timeout = self.scheduler.timeout(clock.now())
+                if timeout is None or (feed and timeout > self.desired_time_per_cycle):
+                    # 주기 작업이 없어도 running은 확인
+                    timeout = self.desired_time_per_cycle
+
+                with self.metrics.time("receive_wait"):
+                    events = clock.select(selector, timeout)
+
+                for key, mask in events:
+                    if mask & selectors.EVENT_WRITE:
+                        # 연결 시도가 끝남 (connect_later)
+                        key.data()
+                        continue
+
+                    connection = key.fileobj
+                    try:
+                        received = connection.receive_once()
+                    except OSError:
+                        received = False
+
+                    if not received:
+                        selector.unregister(connection)
+                        if connection.receiving and connection.auto_reconnect:
+                            self.reconnect_later(selector, connection, key.data)
+                        else:
+                            connection.receiving = False
+
+                    while self.running and (encoded := connection.get()):
+                        key.data(encoded)
+                        self.event_manager.process()
+
+                if feed:
+                    self.poll_position()
+                self.check_safety()
+                if not self.running:
+                    break
+
+                self.update(clock.now())
+                self.flush()
+        finally:
+            selector.close()
+            clock.leave()
+
+    def reconnect_later(
+        self,
+        selector: selectors.BaseSelector,
+        connection: Connection,
+        handler: Callable[[bytes], None]
+    ):
+        log.warning(
+            "Connection to %s:%d lost, reconnecting", connection.host, connection.port)
+        connection.disconnect()
+        self.connect_later(selector, connection, handler, reconnect=True)
+
+    def connect_later(
+        self,
+        selector: selectors.BaseSelector,
+        connection: Connection,
+        handler: Callable[[bytes], None],
+        reconnect: Optional[bool] = False
+    ):
+        """
+        연결 중인 소켓이 쓰기 가능해지면 연결을 마치고 수신 등록
+        실패하거나 connect_timeout이 지나면 retry_delay 뒤에 다시 시작
+        """
+        def attempt(now: float):
+            if connection.connecting is not None:
+                if now - connection.connect_started < connection.connect_timeout:
+                    return
+                selector.unregister(connection.connecting)
+                connection.abort_connect()
+
+            sock = connection.start_connect()
+            if sock is not None:
+                selector.register(sock, selectors.EVENT_WRITE, connected)
+
+        def connected():
+            selector.unregister(connection.connecting)
+            if not connection.finish_connect():
+                # 다음 시도는 scheduler가 retry_delay 뒤에
+                return
+            if reconnect:
+                connection.reconnects += 1
+                log.warning("Reconnected to %s:%d", connection.host, connection.port)
+            selector.register(connection, selectors.EVENT_READ, handler)
+            self.scheduler.remove(task)
+
+        if connection.connecting is not None:
+            # 생성할 때 시작한 연결
+            selector.register(connection.connecting, selectors.EVENT_WRITE, connected)
+        task = self.scheduler.add(
+            f"connect.{connection.port}",
+            lambda: connection.retry_delay,
+            attempt,
+            start=self.clock.now())
+
+    def poll(self):
+        """
+        쌓인 메시지를 모두 처리 (GPS는 inbox에서 최신 값 하나로 합쳐짐)
+        post 된 이벤트는 메시지 하나마다 우선순위 순으로 먼저 처리
+        """
+        self.check_safety()
+        self.event_manager.process()
+
+        while self.running and (encoded := self.connection.get()):
+            self.handle_from_connection(encoded)
+            self.event_manager.process()
+
+        while self.running and (encoded := self.drone_connection.get()):
+            self.handle_from_drone(encoded)
+            self.event_manager.process()
 
-        while self.running:
-            start = datetime.datetime.now()
+        self.poll_position()
 
-            if (encoded := self.connection.get()):
+    def poll_position(self):
+        """
+        공유 메모리 feed에 새 위치가 있으면 디코딩 없이 array 그대로 GPSReceived
+        """
+        position = self.drone_connection.poll_position()
+        if position is None or not self.running:
+            return
+        if self.recorder:
+            self.recorder.record(
+                Recorder.DRONE,
+                self.protocol.encode(self.protocol.encode_point(position), GPS_POSITION))
+        if self.safety:
+            self.safety.send(SafetyProcess.POSITION, position)
+            return
+        self.event_manager.publish(Events.GPSReceived, position)
+        self.event_manager.process()
+
+    def handle_from_connection(self, encoded: bytes):
+        if self.recorder:
+            self.recorder.record(Recorder.SERVER, encoded)
+        if self.safety:
+            self.safety.send(SafetyProcess.SERVER, encoded)
+            return
+        try:
+            with self.metrics.time("decode"):
                 data_list = self.protocol.decode(encoded)
-                self.receive_from_connection(data_list)
+        except ValueError as e:
+            # 메시지 하나만 버리고 계속 (루프를 멈추지 않음)
+            log.warning("Dropping malformed message from server: %s", e)
+            return
+        self.receive_from_connection(data_list)
 
-            if (encoded := self.drone_connection.get()):
+    def handle_from_drone(self, encoded: bytes):
+        if self.recorder:
+            self.recorder.record(Recorder.DRONE, encoded)
+        if self.safety:
+            self.safety.send(SafetyProcess.DRONE, encoded)
+            return
+        try:
+            with self.metrics.time("decode"):
                 data_list = self.protocol.decode(encoded)
-                self.receive_from_drone(data_list)
+        except ValueError as e:
+            log.warning("Dropping malformed message from drone: %s", e)
+            return
+        self.receive_from_drone(data_list)
 
-            elapsed = (datetime.datetime.now() - start).total_seconds()
-            
-            if self.mission_started:
-                if elapsed >= self.location_manager.check_period:
-                    self.event_manager.publish(Events.LocationCheckTime, elapsed)
+    def update(self, now: float):
+        """
+        마감 시각이 지난 주기 작업들을 실행
+        실행할 작업이 있을 때만 기록 (재생 시 같은 now로 다시 실행), 작업이 post 한 이벤트도 처리
+        """
+        deadline = self.scheduler.next_deadline()
+        if deadline is None or deadline > now:
+            return
 
-                if self.waypoint_manager.mission_finished():
-                    self.event_manager.publish(Events.MissionFinished)
-                else:
-                    self.send_running_state()
+        if self.recorder:
+            self.recorder.record_update(now)
+        self.scheduler.run_due(now)
+        self.event_manager.process()
 
-            elapsed = (datetime.datetime.now() - start).total_seconds()
-            remaining = self.desired_time_per_cycle - elapsed
+    def check_safety(self):
+        """
+        안전 프로세스가 멈췄으면 이 System도 멈춤
+        판단 없이 죽었으면 대신 EMERGENCY_LANDING을 보낸다
+        """
+        if not self.safety or not self.running or self.safety.receive_once():
+            return
+        if self.safety.reason is None:
+            data = self.protocol.encode(1, EMERGENCY_LANDING)
+            self.send_to_drone(data, immediate=True)
+        self.stop()
 
-            if remaining < 0:
-                print("Warning: System is running slower than desired cps")
-            else:
-                time.sleep(remaining)
+    def ping_safety(self, now: float):
+        self.safety.ping()
+
+    def start_tasks(self):
+        self.stop_tasks()
+        self.mission_tasks = [
+            self.scheduler.add(
+                "location_check",
+                lambda: self.location_manager.check_period,
+                self.check_location),
+            self.scheduler.add("heartbeat", self.heartbeat_period, self.heartbeat),
+            self.scheduler.add(
+                "mission_finished", self.desired_time_per_cycle, self.check_mission_finished),
+        ]
 
-    def receive_from_connection(self, data_list: List[Tuple[str, Any]]):
-        for name, value in data_list:
-            print(f"RP Received {name} from server")
-            if name in L_WIN_PARAM_NAMES:
-                self.event_manager.publish(
-                    Events.LWinParamReceived, name, value)
+    def stop_tasks(self):
+        for task in self.mission_tasks:
+            self.scheduler.remove(task)
+        self.mission_tasks = []
 
-            if name in T_WIN_PARAM_NAMES:
-                self.event_manager.publish(
-                    Events.TWinParamReceived, name, value)
+    def check_location(self, now: float):
+        # 마지막 waypoint를 떠난 뒤 지난 시간으로 기대 위치를 계산
+        self.event_manager.publish(
+            Events.LocationCheckTime, now - self.time_manager.last_check_time)
 
-            if name in WAYPOINT_PARAM_NAMES:
-                self.event_manager.publish(
-                    Events.WMngParamReceived, name, value)
+    def heartbeat(self, now: float):
+        self.send_running_state()
 
-            if name == WAYPOINTS:
-                self.event_manager.publish(Events.WaypointsReceived, value)
+    def check_mission_finished(self, now: float):
+        if self.waypoint_manager.mission_finished():
+            self.event_manager.post(Events.MissionFinished)
 
-            if name == WAYPOINT_REACHED:
-                self.event_manager.publish(Events.WaypointReached)            
+    def receive_from_connection(self, data_list: List[Tuple[str, Any]]):
+        for name, value in data_list:
+            # 새 BUNDLE은 건너뛰는 중이어도 처리 (이전 bundle의 끝을 못 받았을 수 있음)
+            if self.skipped_bundle is not None and name not in (BUNDLE, BUNDLE_END):
+                continue
+            log.debug("RP Received %s from server", name)
+            self.server_dispatch.dispatch(name, value)
 
     def receive_from_drone(self, data_list: List[Tuple[str, Any]]):
         for name, value in data_list:
-            print(f"RP Received {name} from drone")
-
-            if name == GPS_POSITION:
-                self.event_manager.publish(Events.GPSReceived, value)
+            log.debug("RP Received %s from drone", name)
+            self.drone_dispatch.dispatch(name, value)
 
     """이벤트 처리 부분"""
 
     def on_l_win_param_received(self, name: str, value: Any):
-        print(f"Setting Location Window Parameter: {name} - {value}")
+        log.info("Setting Location Window Parameter: %s - %s", name, value)
         setattr(self.location_manager, name, value)
 
     def on_t_win_param_received(self, name: str, value: Any):
-        print(f"Setting Time Window Parameter: {name} - {value}")
+        log.info("Setting Time Window Parameter: %s - %s", name, value)
         setattr(self.time_manager, name, value)
 
     def on_w_mng_param_received(self, name: str, value: Any):
-        print(f"Setting Waypoint Parameter: {name} - {value}")
+        log.info("Setting Waypoint Parameter: %s - %s", name, value)
         setattr(self.waypoint_manager, name, value)
 
     def on_waypoints_received(self, encoded_waypoints: bytes):
@@ -194,52 +514,170 @@ class System:
     def on_gps_received(self, encoded_gps_position: bytes):
         gps_position = self.protocol.decode_point(encoded_gps_position)
         self.current_position = gps_position
-        print(f"Current gps: {self.current_position}")
+        self.current_position_time = self.clock.now_ns()
+        log.debug("Current gps: %s", self.current_position)
 
-        if not self.mission_started:
+        if not self.mission_started or self.waypoint_manager.mission_finished():
             return
 
-    def on_waypoint_reached(self, gps: np.ndarray):
-        print(f"Waypoint {self.waypoint_manager.current_waypoint()} reached")
-        last_wp = self.waypoint_manager.last_waypoint()
-
-        if not self.time_manager.in_range(gps, last_wp):
+        elapsed = self.clock.now() - self.time_manager.last_check_time
+        start = self.waypoint_manager.current_waypoint_index - 1
+        if self.waypoint_manager.resync(gps_position, elapsed):
+            log.warning(
+                "Skipped to waypoint %d", self.waypoint_manager.current_waypoint_index)
+            # 건너뛴 waypoint들도 시간 윈도우 검사 (경로를 따라 지금 위치까지 걸렸어야 할 시간)
+            with self.metrics.time("check.time"):
+                in_range = self.time_manager.expected_in_range(
+                    self.waypoint_manager.path_time(start, gps_position), elapsed)
+            if not in_range:
+                data = self.protocol.encode(2, RUNNING_STATE)
+                self.send_to_drone(data, immediate=True)
+                self.event_manager.publish(Events.EmergencyLanding)
+                return
+            self.time_manager.update_check_time()
+
+        if self.waypoint_manager.final_reached(gps_position):
+            self.event_manager.post(Events.WaypointReached, gps_position)
+
+    def on_waypoint_reached(self, gps: Optional[np.ndarray] = None):
+        if self.waypoint_manager.mission_finished():
+            # 마지막 waypoint는 GPS로 먼저 끝냈을 수 있음
+            return
+        if gps is None:
+            gps = self.current_position
+            if self.waypoint_manager.already_passed(gps):
+                # 같은 waypoint를 두 번 세지 않음
+                log.info("Waypoint already passed by resync")
+                return
+        log.info("Waypoint %s reached", self.waypoint_manager.current_waypoint())
+
+        # 기대 시간은 미션을 받을 때 계산해 둔 구간 시간 (arrival_times)
+        with self.metrics.time("check.time"):
+            in_range = self.time_manager.expected_in_range(
+                self.waypoint_manager.expected_segment_time())
+
+        if not in_range:
             
             data = self.protocol.encode(2, RUNNING_STATE)
-            self.drone_connection.send(data)
+            self.send_to_drone(data, immediate=True)
             self.event_manager.publish(Events.EmergencyLanding)
         self.time_manager.update_check_time()
 
         self.waypoint_manager.to_next_waypoint()
 
     def on_location_check_time(self, elapsed_time: float):
+        if self.waypoint_manager.mission_finished():
+            return
 
-        if not self.location_manager.in_range(
-            elapsed_time,
-            self.current_position,
-            self.waypoint_manager.last_waypoint(),
-            self.direction_vector
-        ):
+        if self.current_position_time is not None:
+            age = self.clock.now_ns() - self.current_position_time
+            if self.metrics.enabled:
+                self.metrics.record("gps_age", age)
+            # 기대 위치는 GPS를 받은 시각 기준 (GPS 주기만큼 지난 위치를 지금의 기대 위치와 비교하지 않음)
+            # 한 check_period까지만 보정, GPS가 끊기면 기대 위치가 계속 멀어져서 이탈로 판단
+            correction = min(age / 1e9, self.location_manager.check_period)
+            elapsed_time = max(elapsed_time - correction, 0.)
+
+        self.direction_vector = self.waypoint_manager.current_direction()
+        with self.metrics.time("check.location"):
+            in_range = self.location_manager.in_range(
+                elapsed_time,
+                self.current_position,
+                self.waypoint_manager.last_waypoint(),
+                self.direction_vector
+            )
+
+        if not in_range:
             data = self.protocol.encode(1, RUNNING_STATE)
-            self.drone_connection.send(data)
+            self.send_to_drone(data, immediate=True)
             self.event_manager.publish(Events.EmergencyLanding)
 
+    def on_bundle_start(self, bundle_id: int):
+        if self.current_bundle is not None:
+            log.warning("Bundle %d did not end before bundle %d", self.current_bundle, bundle_id)
+        self.current_bundle = bundle_id
+        if bundle_id in self.applied_bundles:
+            log.debug("Bundle %d already applied", bundle_id)
+            self.skipped_bundle = bundle_id
+        else:
+            self.skipped_bundle = None
+
+    def on_bundle_end(self, bundle_id: int):
+        """
+        bundle의 값이 모두 적용됨 (순서대로 처리하므로), 서버에 ack
+        시작을 받지 못한 bundle은 ack 하지 않음 (서버가 다시 보냄)
+        """
+        started, self.current_bundle = self.current_bundle, None
+        skipped, self.skipped_bundle = self.skipped_bundle, None
+        if started != bundle_id:
+            log.warning("Bundle %d ended without its start", bundle_id)
+            return
+        if skipped is None:
+            log.info("Bundle %d applied", bundle_id)
+            self.applied_bundles.append(bundle_id)
+        self.connection.send(self.protocol.encode(bundle_id, BUNDLE_ACK))
+
     def on_mission_start(self):
         self.mission_started = True
         self.waypoint_manager.start_mission()
-        
+        self.time_manager.update_check_time()
+        self.start_tasks()
+        # 드론은 이 명령을 받은 뒤 미션을 따라 움직임 (윈도우 검사와 같은 시각에 시작)
+        self.send_to_drone(self.protocol.encode(1, MISSION_START), immediate=True)
+
+    def on_mission_finished(self):
+        log.info("Mission finished")
+        self.mission_started = False
+        self.stop_tasks()
+
+    def on_takeoff(self):
+        log.info("Take off")
+
+    def on_landing(self):
+        log.info("Landing")
+
     def on_emergency_landing(self):
-        print("Emergency landing")
+        log.warning("Emergency landing")
         data = self.protocol.encode(1, EMERGENCY_LANDING)
-        self.drone_connection.send(data)
+        self.send_to_drone(data, immediate=True)
         self.stop()
 
     def send_running_state(self):
         data = self.protocol.encode(0, RUNNING_STATE)
-        self.drone_connection.send(data)
+        # 끊겨 있는 동안 쌓인 heartbeat는 최신 것 하나만 보냄
+        self.send_to_drone(data, coalesce=True)
+
+    def send_to_drone(
+        self,
+        data: bytes,
+        immediate: Optional[bool] = False,
+        coalesce: Optional[bool] = False
+    ):
+        """
+        보낼 큐에 넣고 cycle 끝의 flush에서 한 번에 전송
+        immediate=True 이면 바로 전송 (비상 착륙, 윈도우 이탈)
+        coalesce=True 이면 아직 못 보낸 같은 이름의 메시지는 버림 (heartbeat)
+        """
+        if self.recorder:
+            self.recorder.record(Recorder.OUTBOUND, data)
+        if immediate:
+            with self.metrics.time("send"):
+                self.drone_connection.send(data, immediate=True)
+        else:
+            self.drone_connection.send(data, coalesce=coalesce)
+
+    def flush(self):
+        with self.metrics.time("send"):
+            self.drone_connection.flush()
+        # 서버로 보내는 것은 bundle ack 뿐
+        self.connection.flush()
 
     def stop(self):
+        self.scheduler.clear()
+        if self.safety:
+            # 드론 소켓을 닫기 전에 (자식이 같은 소켓으로 보냄)
+            self.safety.stop()
         self.drone_connection.clean()
         self.connection.clean()
+        self.event_manager.shutdown()
         self.running = False
-    
\ No newline at end of file
@@ -1,4 +1,5 @@
 from typing import List, Optional, Tuple
+from .segment_index import SegmentIndex
 import numpy as np
 
 """
@@ -9,20 +10,76 @@ import numpy as np
 
 class WaypointManager:
 
+    # resync로 건너뛸 수 있는 최대 구간 수
+    RESYNC_LOOKAHEAD = 2
+    # 경과 시간 * desired_velocity 보다 이 배수까지는 더 간 것으로 허용
+    RESYNC_SPEED_MARGIN = 1.5
+
     def __init__(self, waypoint_range: Optional[float] = None) -> None:
         self.waypoints: Optional[np.ndarray] = None
         self.current_waypoint_index: Optional[int] = None
+
+        # set_mission에서 미리 계산하는 미션 정보
+        self.segment_vectors: Optional[np.ndarray] = None  # (n-1, 3) 구간 단위 벡터
+        self.segment_lengths: Optional[np.ndarray] = None  # (n-1,) 구간 길이
+        self.cumulative_distance: Optional[np.ndarray] = None  # (n,) 시작점부터 경로 거리
+        self.arrival_times: Optional[np.ndarray] = None  # (n,) desired_velocity 기준 도착 시간
+        self.waypoint_range_sq: Optional[float] = None
+        self.spatial_index: Optional[SegmentIndex] = None
+        # resync로 지나갔고 아직 서버의 WAYPOINT_REACHED를 받지 않은 waypoint index
+        self.resynced: List[int] = []
+
+        self._desired_velocity: Optional[float] = None
+        self._waypoint_range: Optional[float] = None
         self.waypoint_range = waypoint_range
-        self.desired_velocity: Optional[float] = None
+
+    @property
+    def desired_velocity(self) -> Optional[float]:
+        return self._desired_velocity
+
+    @desired_velocity.setter
+    def desired_velocity(self, value: Optional[float]):
+        self._desired_velocity = value
+        self.update_arrival_times()
+
+    @property
+    def waypoint_range(self) -> Optional[float]:
+        return self._waypoint_range
+
+    @waypoint_range.setter
+    def waypoint_range(self, value: Optional[float]):
+        self._waypoint_range = value
+        self.waypoint_range_sq = None if value is None else value * value
 
     def set_mission(self, waypoints: np.ndarray):
         """
         0번쨰 waypoint는 항상 시작 지점으로 세팅해야 함
+        구간별 방향, 길이, 누적 거리, 도착 시간을 미리 계산
         """
         self.waypoints = waypoints
 
+        diff = np.diff(waypoints, axis=0)
+        self.segment_lengths = np.linalg.norm(diff, axis=-1)
+        self.segment_vectors = np.divide(
+            diff,
+            self.segment_lengths[:, None],
+            out=np.zeros_like(diff),
+            where=self.segment_lengths[:, None] > 0
+        )
+        self.cumulative_distance = np.concatenate(
+            [[0.], np.cumsum(self.segment_lengths)])
+        self.update_arrival_times()
+        self.spatial_index = SegmentIndex(waypoints)
+
+    def update_arrival_times(self):
+        if self.cumulative_distance is None or self.desired_velocity is None:
+            self.arrival_times = None
+            return
+        self.arrival_times = self.cumulative_distance / self.desired_velocity
+
     def start_mission(self):
         self.current_waypoint_index = 1
+        self.resynced = []
     
     def mission_finished(self) -> bool:
         return self.current_waypoint_index >= self.waypoints.shape[0]
@@ -31,10 +88,114 @@ class WaypointManager:
         """
         현재 위치와 다음 웨이포인트 사이 거리를 계산하여, 범위 내에 있으면 도달한 것으로 판단한다.
         """
-        d = np.linalg.norm(
-            current_pos - self.waypoints[self.current_waypoint_index])
+        diff = current_pos - self.waypoints[self.current_waypoint_index]
+
+        return diff @ diff <= self.waypoint_range_sq
+
+    def reached_indices(
+        self,
+        positions: np.ndarray,
+        chunk_size: Optional[int] = 4096
+    ) -> np.ndarray:
+        """
+        입력 (T, 3) 비행 기록
+        출력 (n,) waypoint별로 처음 도달한 샘플 index, 도달하지 못했으면 -1
+        0번째 waypoint(시작 지점)는 0번 샘플로 본다.
+
+        waypoint_reached와 같은 기준으로 순서대로 찾으며, chunk_size 단위로 잘라서 검사한다.
+        """
+        indices = np.full(self.waypoints.shape[0], -1, dtype=np.int64)
+        indices[0] = 0
+        r2 = self.waypoint_range_sq
+
+        start = 1
+        for i in range(1, self.waypoints.shape[0]):
+            found = -1
+            while start < len(positions):
+                chunk = positions[start:start + chunk_size]
+                d2 = np.sum((chunk - self.waypoints[i]) ** 2, axis=-1)
+                hits = np.flatnonzero(d2 <= r2)
+                if len(hits):
+                    found = start + hits[0]
+                    break
+                start += len(chunk)
+
+            if found < 0:
+                break
+            indices[i] = found
+            start = found + 1
+
+        return indices
+
+    def nearest_segment(self, current_pos: np.ndarray) -> Tuple[int, float]:
+        """
+        현재 위치와 가장 가까운 구간 index(i -> i+1)와 경로에서 벗어난 거리
+        """
+        return self.spatial_index.query(current_pos)
+
+    def resync(self, current_pos: np.ndarray, elapsed: Optional[float] = None) -> bool:
+        """
+        waypoint 도달 이벤트를 놓쳐 다음 RESYNC_LOOKAHEAD 구간 중 하나 위에 있으면 그 구간으로 이동
+        - spatial_index로 전체 미션에서 가장 가까운 구간을 찾고 (거리가 같으면 index가 작은 구간)
+          그 구간이 다음 RESYNC_LOOKAHEAD 구간 중 하나이고 waypoint_range 안일 때만 이동
+        - elapsed (마지막 waypoint를 떠난 뒤 지난 시간)가 있으면
+          그 시간 동안 desired_velocity로 갈 수 있는 구간까지만 이동
+        돌아오는 미션이나 경로가 교차하는 미션에서 멀리 떨어진 구간으로 건너뛰지 않기 위함
+        이동했으면 True
+        """
+        if self.waypoint_range is None:
+            return False
+        current = self.current_waypoint_index - 1
+        segment, distance = self.nearest_segment(current_pos)
+        if not current < segment <= current + self.RESYNC_LOOKAHEAD or \
+                distance > self.waypoint_range:
+            return False
+
+        if elapsed is not None and self.desired_velocity:
+            # 그 구간에 들어가려면 적어도 구간 시작점까지는 와야 함
+            distance = self.cumulative_distance[segment] - self.cumulative_distance[current]
+            reachable = elapsed * self.desired_velocity * self.RESYNC_SPEED_MARGIN
+            if distance - self.waypoint_range > reachable:
+                return False
+
+        self.resynced += range(current + 1, segment + 1)
+        self.current_waypoint_index = segment + 1
+        return True
 
-        return abs(d) <= self.waypoint_range
+    def already_passed(self, current_pos: Optional[np.ndarray]) -> bool:
+        """
+        서버의 WAYPOINT_REACHED가 resync로 이미 지나간 waypoint에 대한 것인지
+        - 현재 목표 waypoint의 waypoint_range 안이면 현재 목표에 대한 것 (그 전 것은 오지 않음)
+        - 아니면 resync로 지나간 waypoint 중 가장 앞의 것에 대한 것으로 보고 목록에서 뺌
+        """
+        if not self.resynced:
+            return False
+        if current_pos is not None and self.waypoint_reached(current_pos):
+            self.resynced = []
+            return False
+        self.resynced.pop(0)
+        return True
+
+    def path_time(self, start_index: int, current_pos: np.ndarray) -> float:
+        """
+        start_index waypoint에서 경로를 따라 현재 구간 위의 current_pos까지
+        desired_velocity로 가는 데 걸리는 시간
+        """
+        segment = self.current_waypoint_index - 1
+        along = (current_pos - self.waypoints[segment]) @ self.segment_vectors[segment]
+        along = min(max(along, 0.), self.segment_lengths[segment])
+        return self.arrival_times[segment] - self.arrival_times[start_index] + \
+            along / self.desired_velocity
+
+    def final_reached(self, current_pos: np.ndarray) -> bool:
+        """
+        마지막 구간을 가는 중이고 마지막 waypoint의 waypoint_range 안에 있는지
+        (서버의 WAYPOINT_REACHED 없이도 미션을 끝내기 위함)
+        """
+        if self.waypoint_range_sq is None or \
+                self.current_waypoint_index != self.waypoints.shape[0] - 1:
+            return False
+        return self.waypoint_reached(current_pos)
 
     def to_next_waypoint(self):
         self.current_waypoint_index += 1
@@ -49,6 +210,22 @@ class WaypointManager:
 
         return direction
 
+    def current_direction(self) -> np.ndarray:
+        """
+        현재 구간(last_waypoint -> current_waypoint)의 단위 벡터
+        """
+        return self.segment_vectors[self.current_waypoint_index-1]
+
+    def current_segment_length(self) -> float:
+        return self.segment_lengths[self.current_waypoint_index-1]
+
+    def expected_segment_time(self) -> float:
+        """
+        desired_velocity로 현재 구간을 지나는 데 걸리는 시간
+        """
+        i = self.current_waypoint_index
+        return self.arrival_times[i] - self.arrival_times[i-1]
+
     def current_waypoint(self) -> np.ndarray:
         return self.waypoints[self.current_waypoint_index]
 
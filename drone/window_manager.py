@@ -1,6 +1,6 @@
 import numpy as np
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Tuple
+from common.clock import Clock, MonotonicClock
 
 class LocationWindowManager:
 
@@ -23,11 +23,44 @@ class LocationWindowManager:
     ) -> bool:
         """
         주기마다 실행
+        여러 드론을 한 번에 검사할 때는 batch_location_in_range
         """
         E_travel_distance = elapsed_time * self.desired_velocity
         E_location = start_waypoint + (direction_vector * E_travel_distance)
         return np.linalg.norm(current_position - E_location) <= self.window_size
 
+    def in_range_trace(
+        self,
+        timestamps: np.ndarray,
+        positions: np.ndarray,
+        waypoints: np.ndarray,
+        reached_indices: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        비행 기록 전체를 한 번에 검사
+        입력 (T,) 시각[s], (T, 3) 위치, (n, 3) 미션,
+             (n,) waypoint별 도달한 샘플 index (WaypointManager.reached_indices)
+        출력 (T,) 범위 안 여부, (T,) 여유 거리 (window_size - 기대 위치와의 거리)
+
+        in_range와 같이 마지막으로 도달한 waypoint에서 그 도달 시각부터
+        desired_velocity로 구간 방향을 따라갔을 때의 기대 위치와 비교한다.
+        마지막 waypoint에 도달한 뒤의 샘플은 마지막 구간으로 계산 (실제로는 검사하지 않음)
+        """
+        reached = reached_indices[reached_indices >= 0]
+        diff = np.diff(waypoints, axis=0)
+        lengths = np.linalg.norm(diff, axis=-1)
+        directions = np.divide(
+            diff, lengths[:, None], out=np.zeros_like(diff), where=lengths[:, None] > 0)
+
+        segment = np.searchsorted(reached, np.arange(len(timestamps)), side="right") - 1
+        segment = np.clip(segment, 0, len(lengths) - 1)
+        elapsed_time = timestamps - timestamps[reached[segment]]
+        E_location = waypoints[segment] + \
+            directions[segment] * (elapsed_time * self.desired_velocity)[:, None]
+
+        margin = self.window_size - np.linalg.norm(positions - E_location, axis=-1)
+        return margin >= 0, margin
+
 
 class TimeWindowManager:
 
@@ -36,33 +69,130 @@ class TimeWindowManager:
         desired_velocity: Optional[float] = None,
         low_offset: Optional[float] = None,
         high_offset: Optional[float] = None,
-        common_error: Optional[float] = None
+        common_error: Optional[float] = None,
+        clock: Optional[Clock] = None
     ):
         self.desired_velocity = desired_velocity
         self.low_offset = low_offset
         self.high_offset = high_offset
         self.common_error = common_error
-        
-        self.last_check_time = datetime.now()
+        self.clock = clock if clock else MonotonicClock()
+
+        self.last_check_time = self.clock.now()
 
     def in_range(
         self,
         current_pos: np.ndarray,
-        last_waypoint: np.ndarray
+        last_waypoint: np.ndarray,
+        elapsed_time: Optional[float] = None
     ) -> bool:
         """
         waypoint 도달마다 실행
         기대 경과 시간
+        elapsed_time을 주지 않으면 마지막 확인 시간부터 계산
+        여러 드론을 한 번에 검사할 때는 batch_time_in_range
         """
-        
-        elapsed_time = (datetime.now() - self.last_check_time).total_seconds()
-        
-        d = abs(np.linalg.norm(last_waypoint - current_pos))
+
+        if elapsed_time is None:
+            elapsed_time = self.clock.now() - self.last_check_time
+
+        d = np.linalg.norm(last_waypoint - current_pos)
         E_time = d/self.desired_velocity
         low = E_time * self.low_offset - self.common_error
         high = E_time * self.high_offset + self.common_error
 
         return low <= elapsed_time <= high
 
+    def expected_in_range(
+        self,
+        E_time: float,
+        elapsed_time: Optional[float] = None
+    ) -> bool:
+        """
+        기대 경과 시간 E_time을 이미 알 때 (경로를 따라 여러 waypoint를 지난 경우 등)
+        elapsed_time을 주지 않으면 마지막 확인 시간부터 계산
+        """
+        if elapsed_time is None:
+            elapsed_time = self.clock.now() - self.last_check_time
+        low = E_time * self.low_offset - self.common_error
+        high = E_time * self.high_offset + self.common_error
+        return low <= elapsed_time <= high
+
+    def in_range_trace(
+        self,
+        timestamps: np.ndarray,
+        positions: np.ndarray,
+        waypoints: np.ndarray,
+        reached_indices: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        비행 기록 전체를 한 번에 검사
+        입력 (T,) 시각[s], (T, 3) 위치, (n, 3) 미션,
+             (n,) waypoint별 도달한 샘플 index (WaypointManager.reached_indices)
+        출력 (T,) 범위 안 여부, (T,) 여유 시간 (시간 윈도우 경계까지 남은 시간)
+
+        각 샘플에서 waypoint에 도달했다고 보고 마지막 도달 시점부터의 경과 시간을 검사한다.
+        실제 판정은 reached_indices의 샘플들에서 일어난다.
+        """
+        reached = reached_indices[reached_indices >= 0]
+        segment = np.maximum(
+            np.searchsorted(reached, np.arange(len(timestamps)), side="left") - 1, 0)
+        elapsed_time = timestamps - timestamps[reached[segment]]
+
+        low, high = self.time_window(waypoints[segment], positions)
+        margin = np.minimum(elapsed_time - low, high - elapsed_time)
+        return margin >= 0, margin
+
+    def time_window(
+        self,
+        last_waypoint: np.ndarray,
+        current_pos: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        기대 경과 시간의 (하한, 상한)
+        """
+        d = np.linalg.norm(last_waypoint - current_pos, axis=-1)
+        E_time = d/self.desired_velocity
+        low = E_time * self.low_offset - self.common_error
+        high = E_time * self.high_offset + self.common_error
+        return low, high
+
     def update_check_time(self):
-        self.last_check_time = datetime.now()
+        self.last_check_time = self.clock.now()
+
+
+def batch_location_in_range(
+    elapsed_time: np.ndarray,
+    current_position: np.ndarray,
+    start_waypoint: np.ndarray,
+    direction_vector: np.ndarray,
+    desired_velocity: np.ndarray,
+    window_size: np.ndarray
+) -> np.ndarray:
+    """
+    LocationWindowManager.in_range를 N개 한 번에 (Fleet)
+    입력 (N,) 시간/파라미터, (N, 3) 위치/방향, 출력 (N,) 범위 안 여부
+    """
+    E_travel_distance = elapsed_time * desired_velocity
+    E_location = start_waypoint + direction_vector * E_travel_distance[:, None]
+    return np.linalg.norm(current_position - E_location, axis=-1) <= window_size
+
+
+def batch_time_in_range(
+    current_pos: np.ndarray,
+    last_waypoint: np.ndarray,
+    elapsed_time: np.ndarray,
+    desired_velocity: np.ndarray,
+    low_offset: np.ndarray,
+    high_offset: np.ndarray,
+    common_error: np.ndarray
+) -> np.ndarray:
+    """
+    TimeWindowManager.in_range를 N개 한 번에 (Fleet)
+    입력 (N, 3) 위치, (N,) 경과 시간/파라미터, 출력 (N,) 범위 안 여부
+    """
+    d = np.linalg.norm(last_waypoint - current_pos, axis=-1)
+    E_time = d/desired_velocity
+    low = E_time * low_offset - common_error
+    high = E_time * high_offset + common_error
+    return (low <= elapsed_time) & (elapsed_time <= high)
@@ -3,8 +3,13 @@ from drone.system import System
 from drone.connection import Connection
 from drone.drone_connection import DroneConnection
 from drone.window_manager import LocationWindowManager, TimeWindowManager
+from common.log import setup_logging
+import logging
 
 
+# 같은 로그는 0.5초에 한 번만 출력
+setup_logging(logging.DEBUG, interval=.5)
+
 IP = "127.0.0.1"
 SERVER_PORT = 9876
 DRONE_PORT = 9875
@@ -1,65 +1,373 @@
 from common.protocol import Protocol
-from typing import Optional
+from common.inbox import Inbox
+from common.clock import Clock, MonotonicClock
+from common.headings import BUNDLE, BUNDLE_END, BUNDLE_ACK
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import random
+import selectors
 import socket
-import threading
-import time
+
+"""
+지상국 서버
+
+하나의 selector 루프에서 여러 드론(클라이언트)의 연결을 받고 처리한다 (수신 스레드 없음)
+- 클라이언트마다 id를 붙이고 받은 메시지는 클라이언트별 inbox에 넣는다 (get(client_id))
+- send는 보낼 버퍼에 붙이고 non-blocking으로 쓸 수 있는 만큼만 쓴다
+  남은 것은 소켓이 쓰기 가능해지면 (EVENT_WRITE) 이어서 쓴다
+- 할 일이 없으면 timeout 까지 selector에서 기다린다 (CPU를 쓰지 않음)
+
+하위 클래스는 start에서 serve_once를 반복 호출하고 on_connect / on_disconnect를 필요하면 재정의한다.
+
+bundle (publish)
+- 여러 파라미터/미션 값을 [BUNDLE id][값들][BUNDLE_END id]로 한 번만 인코딩해서 여러 클라이언트에 보낸다
+- 드론(System)은 다 적용한 뒤 BUNDLE_ACK id를 보냄, 받은 클라이언트는 acked
+- ack_timeout 안에 ack가 없는 클라이언트에만 다시 보냄 (매번 timeout 두 배, max_attempts 번까지)
+- 다 보내지 못했거나 연결이 끊긴 클라이언트는 failed
+"""
+
+log = logging.getLogger(__name__)
+
+
+class Client:
+
+    def __init__(
+        self,
+        client_id: int,
+        sock: socket.socket,
+        address: Tuple[str, int],
+        protocol: Protocol
+    ) -> None:
+        self.id = client_id
+        self.socket = sock
+        self.address = address
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+        self.inbox = Inbox(protocol)
+        # EVENT_WRITE로 등록되어 있는지
+        self.writing = False
+
+
+class Bundle:
+
+    def __init__(self, bundle_id: int, payload: bytes) -> None:
+        self.id = bundle_id
+        self.payload = payload
+
+        # 클라이언트 id -> 다시 보낼 시각
+        self.pending: Dict[int, float] = {}
+        self.attempts: Dict[int, int] = {}
+        self.acked: Set[int] = set()
+        self.failed: Set[int] = set()
+
+    @property
+    def done(self) -> bool:
+        return not self.pending
 
 
 class Server:
 
-    def __init__(self, name:str, host: str, port: Optional[int] = 22) -> None:
+    def __init__(
+        self,
+        name: str,
+        host: str,
+        port: Optional[int] = 22,
+        protocol: Optional[Protocol] = None,
+        clock: Optional[Clock] = None,
+        backlog: Optional[int] = 16,
+        buffer_size: Optional[int] = 65536,
+        ack_timeout: Optional[float] = .5,
+        max_attempts: Optional[int] = 5
+    ) -> None:
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
         self.name = name
         self.host = host
         self.port = port
+        self.backlog = backlog
+        self.buffer_size = buffer_size
 
-        self.protocol = Protocol()
+        self.protocol = protocol if protocol else Protocol()
+        self.clock = clock if clock else MonotonicClock()
         self.running = False
 
-        self.received_data = []
+        self.selector = selectors.DefaultSelector()
+        self.clients: Dict[int, Client] = {}
+        self.next_id = 0
 
-        self.lock = threading.Lock()
+        self.ack_timeout = ack_timeout
+        self.max_attempts = max_attempts
+        # ack를 기다리는 bundle
+        self.bundles: Dict[int, Bundle] = {}
+        # 서버를 다시 시작해도 드론이 기억하는 id와 겹치지 않도록 임의의 값에서 시작
+        self.next_bundle_id = random.getrandbits(31)
 
-        self.receiving = False
+    def start(self):
+        self.socket.bind((self.host, self.port))
+        self.socket.listen(self.backlog)
+        self.socket.setblocking(False)
+        self.selector.register(self.socket, selectors.EVENT_READ)
+        self.running = True
+        log.info("%s listening on %s:%d", self.name, self.host, self.port)
+
+    def serve_once(self, timeout: float) -> int:
+        """
+        준비된 소켓을 처리, 없으면 timeout 초 동안 기다린다
+        처리한 이벤트 수 반환
+        """
+        retry = self.retry_timeout()
+        if retry is not None:
+            timeout = min(timeout, retry)
+
+        events = self.clock.select(self.selector, timeout)
+        for key, mask in events:
+            client = key.data
+            if client is None:
+                self.accept()
+                continue
+            if mask & selectors.EVENT_READ:
+                self.receive(client)
+            if mask & selectors.EVENT_WRITE and client.id in self.clients:
+                self.flush(client)
+
+        if self.bundles:
+            self.retry_bundles()
+        return len(events)
 
-    def start_receiving(self, connection):
-        self.receiving = True
-        self.receiving_thread = threading.Thread(
-            target=self.receive, args=(connection,))
-        self.receiving_thread.start()
+    def accept(self):
+        # 한 번 깨어났을 때 대기 중인 연결을 모두 받음
+        while True:
+            try:
+                sock, address = self.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
-    def receive(self, connection):
-        print(f"{self.name} started receiving")
+            client = Client(self.next_id, sock, address, self.protocol)
+            self.next_id += 1
+            self.clients[client.id] = client
+            self.selector.register(sock, selectors.EVENT_READ, client)
+            log.info("%s: client %d connected from %s", self.name, client.id, address)
+            self.on_connect(client)
+
+    def receive(self, client: Client):
         try:
-            while self.receiving:
-                try:
-                    data = connection.recv(1024)
-                except ConnectionResetError:
-                    self.receiving = False
-                    
-                if data:
-                    with self.lock:
-                        self.received_data.append(data)
-        except ConnectionAbortedError:
-            pass
-        print(f"{self.name} stopped receiving")
-
-    def get(self) -> Optional[bytes]:
-        data = None
-        with self.lock:
-            if self.received_data:
-                data = self.received_data.pop(0)
-        return data
+            data = client.socket.recv(self.buffer_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
 
-    def start(self):
-        self.socket.bind((self.host, self.port))
-        self.socket.listen(5)
-        self.running = True
+        if not data:
+            self.disconnect(client)
+            return
+
+        client.incoming += data
+        with memoryview(client.incoming) as view:
+            messages, consumed = self.protocol.split(view)
+        del client.incoming[:consumed]
+
+        for message in messages:
+            try:
+                acked = self.receive_ack(client, message)
+            except ValueError as e:
+                log.warning("%s: dropping malformed message from client %d: %s",
+                            self.name, client.id, e)
+                continue
+            if not acked:
+                client.inbox.put(message)
+
+    def receive_ack(self, client: Client, message: bytes) -> bool:
+        """
+        BUNDLE_ACK 메시지면 처리하고 True (inbox에 넣지 않음)
+        """
+        name = self.protocol.peek_name(message)
+        if name == BUNDLE_ACK:
+            for _, bundle_id in self.protocol.decode(message):
+                self.acknowledge(client.id, bundle_id)
+            return True
+
+        if name is None and self.bundles:
+            # 여러 값이 붙어 있는 text 메시지
+            for name, value in self.protocol.decode(message):
+                if name == BUNDLE_ACK:
+                    self.acknowledge(client.id, value)
+        return False
+
+    def send(self, client_id: int, data: bytes) -> bool:
+        """
+        보낼 버퍼에 붙이고 바로 쓸 수 있는 만큼 씀, 없는 클라이언트면 False
+        """
+        client = self.clients.get(client_id)
+        if client is None:
+            return False
+        client.outgoing += data
+        self.flush(client)
+        return True
+
+    def broadcast(self, data: bytes):
+        for client_id in list(self.clients):
+            self.send(client_id, data)
+
+    def flush(self, client: Client):
+        if client.outgoing:
+            try:
+                n = client.socket.send(client.outgoing)
+            except (BlockingIOError, InterruptedError):
+                n = 0
+            except OSError:
+                self.disconnect(client)
+                return
+            del client.outgoing[:n]
+
+        # 다 못 쓴 경우에만 쓰기 가능 이벤트를 기다림
+        writing = bool(client.outgoing)
+        if writing != client.writing:
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self.selector.modify(client.socket, events, client)
+            client.writing = writing
+
+    def disconnect(self, client: Client):
+        if self.clients.get(client.id) is not client:
+            return
+        del self.clients[client.id]
+        self.selector.unregister(client.socket)
+        client.socket.close()
+        log.info("%s: client %d disconnected", self.name, client.id)
+        for bundle in list(self.bundles.values()):
+            if bundle.pending.pop(client.id, None) is not None:
+                bundle.failed.add(client.id)
+                self.finish_bundle(bundle)
+        self.on_disconnect(client)
+
+    def publish(
+        self,
+        fields: List[Tuple[str, Any]],
+        client_ids: Optional[Iterable[int]] = None
+    ) -> Bundle:
+        """
+        (이름, 값) 목록을 하나의 bundle로 인코딩해서 client_ids (기본값: 모든 클라이언트)에 보냄
+        """
+        bundle_id = self.next_bundle_id
+        self.next_bundle_id = (self.next_bundle_id + 1) & 0x7FFFFFFF
+
+        payload = self.protocol.encode_multiple(
+            [(bundle_id, BUNDLE)] + [(value, name) for name, value in fields] + [(bundle_id, BUNDLE_END)])
+        bundle = Bundle(bundle_id, payload)
+
+        deadline = self.clock.now() + self.ack_timeout
+        targets = list(self.clients) if client_ids is None else list(client_ids)
+        for client_id in targets:
+            bundle.attempts[client_id] = 1
+            if self.send(client_id, payload):
+                bundle.pending[client_id] = deadline
+            else:
+                bundle.failed.add(client_id)
+
+        self.bundles[bundle_id] = bundle
+        log.info("%s: bundle %d (%d values) sent to %d clients",
+                 self.name, bundle_id, len(fields), len(bundle.pending))
+        self.finish_bundle(bundle)
+        return bundle
+
+    def acknowledge(self, client_id: int, bundle_id: int):
+        bundle = self.bundles.get(bundle_id)
+        if bundle is None or bundle.pending.pop(client_id, None) is None:
+            return
+        bundle.acked.add(client_id)
+        self.finish_bundle(bundle)
+
+    def finish_bundle(self, bundle: Bundle):
+        if not bundle.done or bundle.id not in self.bundles:
+            return
+        del self.bundles[bundle.id]
+        if bundle.failed:
+            log.warning("%s: bundle %d not acknowledged by clients %s",
+                        self.name, bundle.id, sorted(bundle.failed))
+        else:
+            log.info("%s: bundle %d acknowledged by all %d clients",
+                     self.name, bundle.id, len(bundle.acked))
+
+    def retry_timeout(self) -> Optional[float]:
+        """
+        다음 재전송까지 남은 시간, 기다리는 bundle이 없으면 None
+        """
+        deadlines = [t for bundle in self.bundles.values() for t in bundle.pending.values()]
+        if not deadlines:
+            return None
+        return max(min(deadlines) - self.clock.now(), 0.)
+
+    def retry_bundles(self):
+        """
+        ack_timeout이 지나도록 ack가 없는 클라이언트에만 다시 보냄
+        """
+        now = self.clock.now()
+        for bundle in list(self.bundles.values()):
+            for client_id, deadline in list(bundle.pending.items()):
+                if deadline > now:
+                    continue
+
+                attempts = bundle.attempts[client_id]
+                if attempts >= self.max_attempts or not self.send(client_id, bundle.payload):
+                    del bundle.pending[client_id]
+                    bundle.failed.add(client_id)
+                    continue
+
+                bundle.attempts[client_id] = attempts + 1
+                bundle.pending[client_id] = now + self.ack_timeout * 2 ** attempts
+                log.debug("%s: resending bundle %d to client %d (attempt %d)",
+                          self.name, bundle.id, client_id, attempts + 1)
+            self.finish_bundle(bundle)
+
+    def wait_bundle(self, bundle: Bundle, timeout: Optional[float] = None) -> bool:
+        """
+        bundle이 끝날 때까지 (또는 timeout 초 동안) serve_once를 반복
+        모든 클라이언트가 ack 했으면 True
+        """
+        deadline = None if timeout is None else self.clock.now() + timeout
+        while self.running and not bundle.done:
+            remaining = self.ack_timeout
+            if deadline is not None:
+                remaining = min(remaining, deadline - self.clock.now())
+                if remaining <= 0:
+                    break
+            self.serve_once(remaining)
+        return bundle.done and not bundle.failed
+
+    def on_connect(self, client: Client):
+        pass
+
+    def on_disconnect(self, client: Client):
+        pass
+
+    def get(self, client_id: Optional[int] = None) -> Optional[bytes]:
+        """
+        client_id의 inbox에서 하나, client_id가 None이면 아무 클라이언트에서나 하나
+        """
+        if client_id is not None:
+            client = self.clients.get(client_id)
+            return client.inbox.get() if client else None
+
+        for client in self.clients.values():
+            data = client.inbox.get()
+            if data is not None:
+                return data
+        return None
 
     def clean(self):
-        print(f"{self.name} cleaning")
-        self.receiving = False
+        log.info("%s cleaning", self.name)
         self.running = False
-        print(f"{self.name} closing socket")
+        for client in list(self.clients.values()):
+            if client.outgoing:
+                # 남은 데이터는 잠깐 blocking으로 보내고 닫는다
+                try:
+                    client.socket.settimeout(1.)
+                    client.socket.sendall(client.outgoing)
+                except OSError:
+                    pass
+            self.disconnect(client)
+        log.info("%s closing socket", self.name)
+        self.selector.close()
         self.socket.close()
@@ -0,0 +1,321 @@
+from typing import Optional, List, Tuple, Dict
+from common.protocol import Protocol
+from common.clock import Clock, MonotonicClock
+from common.shm_feed import ShmWriter
+from common.headings import *
+import numpy as np
+import heapq
+import logging
+import selectors
+import socket
+
+"""
+여러 대의 가상 드론 시뮬레이터 (DroneServer 대체)
+
+- N대 드론의 위치를 (N, 3) 배열로 두고 미션을 따라 한 번에 움직인다
+- GPS 잡음(sigma), 누락(dropout 확률), 지연(latency 초)은 seed로 재현 가능
+- 드론 i는 base_port + i 포트에서 System의 DroneConnection 연결을 받는다
+- 드론은 System이 보낸 MISSION_START를 받으면 움직이기 시작한다
+  (start_time을 주면 명령 없이 clock 시각 start_time에 모든 드론이 출발)
+- 하나의 selector 루프에서 모든 소켓을 처리한다
+- gps_base_port를 주면 드론 i의 GPS는 host:gps_base_port + i 로 순번 붙은 UDP datagram으로 보낸다
+- gps_shm_prefix를 주면 드론 i의 GPS는 공유 메모리 feed "<prefix><i>"에 쓴다 (같은 컴퓨터)
+- clock으로 VirtualClock을 넘기면 기다리지 않고 시간을 앞으로 밀며 진행한다
+"""
+
+log = logging.getLogger(__name__)
+
+
+class Client:
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.socket = sock
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+
+
+class Simulator:
+
+    def __init__(
+        self,
+        missions: List[np.ndarray],
+        host: str,
+        base_port: int,
+        velocity: Optional[float] = 10.,
+        gps_period: Optional[float] = .1,
+        sigma: Optional[float] = 0.,
+        dropout: Optional[float] = 0.,
+        latency: Optional[float] = 0.,
+        seed: Optional[int] = None,
+        protocol: Optional[Protocol] = None,
+        clock: Optional[Clock] = None,
+        gps_base_port: Optional[int] = None,
+        gps_shm_prefix: Optional[str] = None,
+        start_time: Optional[float] = None,
+    ) -> None:
+        self.host = host
+        self.base_port = base_port
+        self.protocol = protocol if protocol else Protocol()
+        self.clock = clock if clock else MonotonicClock()
+
+        self.gps_period = gps_period
+        self.sigma = sigma
+        self.dropout = dropout
+        self.latency = latency
+        self.rng = np.random.default_rng(seed)
+
+        n = len(missions)
+        self.velocity = np.broadcast_to(
+            np.asarray(velocity, dtype=float), (n,)).copy()
+
+        # 미션을 이어 붙이고 드론별 offset / 길이로 구분
+        self.mission_lengths = np.array([len(m) for m in missions], dtype=np.int64)
+        self.mission_offsets = np.concatenate(
+            [[0], np.cumsum(self.mission_lengths)[:-1]]).astype(np.int64)
+        self.mission_points = np.concatenate(
+            [np.asarray(m, dtype=float) for m in missions])
+
+        self.positions = self.mission_points[self.mission_offsets].copy()
+        self.waypoint_index = np.ones(n, dtype=np.int64)
+        self.flying = np.zeros(n, dtype=bool)
+        self.landed = np.zeros(n, dtype=bool)
+
+        self.clients: Dict[int, Client] = {}
+        self.listeners: List[socket.socket] = []
+        # (전송 시각 ns, 순번, 드론, 위치)
+        self.pending: List[Tuple[int, int, int, np.ndarray]] = []
+        # 드론별 GPS 순번 (받는 쪽 DatagramChannel은 드론마다 따로 순서를 봄)
+        self.sequences = np.zeros(n, dtype=np.int64)
+
+        self.gps_base_port = gps_base_port
+        self.gps_socket: Optional[socket.socket] = None
+        if gps_base_port is not None:
+            self.gps_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # System의 DroneConnection이 붙기 전에 만들어 둔다
+        self.feeds: List[ShmWriter] = []
+        if gps_shm_prefix is not None:
+            self.feeds = [ShmWriter(f"{gps_shm_prefix}{i}") for i in range(n)]
+
+        self.start_time = start_time
+        # 마지막으로 step 한 시각 (ns)
+        self.last_step = 0
+
+        self.sent = 0
+        self.dropped = 0
+        self.running = False
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def step(self, dt: float):
+        """
+        비행 중인 드론들을 dt초 만큼 미션을 따라 이동
+        """
+        remaining = np.where(self.flying, dt * self.velocity, 0.)
+        active = (remaining > 0) & (self.waypoint_index < self.mission_lengths)
+
+        while active.any():
+            ids = np.flatnonzero(active)
+            target = self.mission_points[self.mission_offsets[ids] + self.waypoint_index[ids]]
+            diff = target - self.positions[ids]
+            d = np.linalg.norm(diff, axis=-1)
+            move = np.minimum(d, remaining[ids])
+            direction = np.divide(
+                diff, d[:, None], out=np.zeros_like(diff), where=d[:, None] > 0)
+            self.positions[ids] += direction * move[:, None]
+            remaining[ids] -= move
+
+            arrived = ids[move >= d]
+            self.waypoint_index[arrived] += 1
+            active = (remaining > 0) & (self.waypoint_index < self.mission_lengths)
+
+        finished = self.waypoint_index >= self.mission_lengths
+        self.flying[finished] = False
+
+    def measure(self, now_ns: int):
+        """
+        연결된 드론들의 GPS를 잡음, 누락, 지연을 넣어서 보낼 목록에 추가
+        """
+        ids = np.array(sorted(self.clients), dtype=np.int64)
+        if not len(ids):
+            return
+
+        fixes = self.positions[ids] + \
+            self.rng.normal(0., self.sigma, size=(len(ids), 3))
+        kept = self.rng.random(len(ids)) >= self.dropout
+        self.dropped += int((~kept).sum())
+
+        for i, fix in zip(ids[kept], fixes[kept]):
+            self.sequences[i] += 1
+            heapq.heappush(
+                self.pending,
+                (now_ns + round(self.latency * 1e9), int(self.sequences[i]), int(i), fix))
+
+    def start(self):
+        selector = selectors.DefaultSelector()
+        for i in range(len(self)):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((self.host, self.base_port + i))
+            listener.listen(1)
+            listener.setblocking(False)
+            selector.register(listener, selectors.EVENT_READ, (i, None))
+            self.listeners.append(listener)
+
+        self.running = True
+        clock = self.clock
+        # 마감 시각 비교는 ns 정수로 (float 오차로 마감 시각에 도달하지 못하는 일이 없도록)
+        period_ns = round(self.gps_period * 1e9)
+        start_ns = None if self.start_time is None else round(self.start_time * 1e9)
+        self.last_step = clock.now_ns()
+        try:
+            while self.running:
+                now = clock.now_ns()
+                deadline = self.last_step + period_ns
+                if self.pending:
+                    deadline = min(deadline, self.pending[0][0])
+                if start_ns is not None:
+                    deadline = min(deadline, start_ns)
+
+                for key, _ in clock.select(selector, max(deadline - now, 0) / 1e9):
+                    i, client = key.data
+                    if client is None:
+                        self.accept(selector, key.fileobj, i)
+                    else:
+                        self.receive(selector, i, client)
+
+                now = clock.now_ns()
+                if start_ns is not None and now >= start_ns:
+                    self.takeoff(np.arange(len(self)))
+                    start_ns = None
+
+                if now - self.last_step >= period_ns:
+                    self.step_to(now)
+                    self.measure(now)
+
+                while self.pending and self.pending[0][0] <= now:
+                    _, sequence, i, fix = heapq.heappop(self.pending)
+                    if i in self.clients:
+                        self.send_gps(i, sequence, fix)
+
+                for i, client in list(self.clients.items()):
+                    self.flush(selector, i, client)
+        finally:
+            selector.close()
+            self.clean()
+            clock.leave()
+
+    def accept(self, selector: selectors.BaseSelector, listener: socket.socket, i: int):
+        sock, addr = listener.accept()
+        sock.setblocking(False)
+        log.info("Drone %d connected from %s", i, addr)
+
+        if i in self.clients:
+            self.disconnect(selector, i, self.clients[i])
+        client = Client(sock)
+        self.clients[i] = client
+        selector.register(sock, selectors.EVENT_READ, (i, client))
+
+    def step_to(self, now_ns: int):
+        self.step((now_ns - self.last_step) / 1e9)
+        self.last_step = now_ns
+
+    def takeoff(self, ids: np.ndarray):
+        """
+        착륙하지 않은 드론들이 (남은) 미션을 따라 움직이기 시작
+        지금까지는 이미 날던 드론들만 움직인 것으로 하고 출발
+        """
+        self.step_to(self.clock.now_ns())
+        ids = ids[~self.landed[ids]]
+        if len(ids):
+            log.info("Drones %s starting mission", ids.tolist())
+        self.flying[ids] = True
+
+    def receive(self, selector: selectors.BaseSelector, i: int, client: Client):
+        try:
+            data = client.socket.recv(4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+
+        if not data:
+            self.disconnect(selector, i, client)
+            return
+
+        client.incoming += data
+        with memoryview(client.incoming) as view:
+            messages, consumed = self.protocol.split(view)
+        del client.incoming[:consumed]
+
+        for message in messages:
+            try:
+                values = self.protocol.decode(message)
+            except ValueError as e:
+                log.warning("Drone %d: dropping malformed message: %s", i, e)
+                continue
+            for name, value in values:
+                if name == MISSION_START:
+                    self.takeoff(np.array([i]))
+                if name == EMERGENCY_LANDING or name == LAND:
+                    log.info("Drone %d landing", i)
+                    self.flying[i] = False
+                    self.landed[i] = True
+
+    def send_gps(self, i: int, sequence: int, fix: np.ndarray):
+        """
+        측정 순서대로 붙은 순번으로 보냄 (UDP에서 늦게 도착한 것은 받는 쪽에서 버림)
+        """
+        self.sent += 1
+        if self.feeds:
+            self.feeds[i].write(fix, self.clock.now_ns())
+            return
+
+        data = self.protocol.encode(self.protocol.encode_point(fix), GPS_POSITION)
+        if self.gps_socket is None:
+            self.clients[i].outgoing += data
+            return
+        try:
+            self.gps_socket.sendto(
+                self.protocol.encode_datagram(sequence, data),
+                (self.host, self.gps_base_port + i))
+        except OSError:
+            pass
+
+    def flush(self, selector: selectors.BaseSelector, i: int, client: Client):
+        if not client.outgoing:
+            return
+        try:
+            n = client.socket.send(client.outgoing)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self.disconnect(selector, i, client)
+            return
+        del client.outgoing[:n]
+
+    def disconnect(self, selector: selectors.BaseSelector, i: int, client: Client):
+        # 닫기 전에 등록 해제 (닫힌 소켓은 fd가 -1이라 해제할 수 없음), 이미 끊었으면 그냥 둠
+        if client.socket.fileno() >= 0:
+            try:
+                selector.unregister(client.socket)
+            except KeyError:
+                pass
+            client.socket.close()
+        if self.clients.get(i) is client:
+            del self.clients[i]
+
+    def clean(self):
+        self.running = False
+        for client in self.clients.values():
+            client.socket.close()
+        self.clients.clear()
+        for listener in self.listeners:
+            listener.close()
+        self.listeners.clear()
+        if self.gps_socket:
+            self.gps_socket.close()
+            self.gps_socket = None
+        for feed in self.feeds:
+            feed.close()
+        self.feeds = []
@@ -1,6 +1,7 @@
 import test_servers as ts
+from simulator import Simulator
 from drone.waypoint_manager import WaypointManager
-from drone.system import System
+from drone.system import System, Events
 from drone.connection import Connection
 from drone.drone_connection import DroneConnection
 from drone.window_manager import LocationWindowManager, TimeWindowManager
@@ -9,6 +10,11 @@ import numpy as np
 from common.protocol import Protocol
 
 import threading 
+from common.log import setup_logging
+import logging
+
+# 같은 로그는 0.5초에 한 번만 출력
+setup_logging(logging.DEBUG, interval=.5)
 
 IP = "127.0.0.1"
 SERVER_PORT = 9876
@@ -28,16 +34,16 @@ waypoints = np.array(
         [0., 0., 10.]
     ]
 )
-waypoints = t_protocol.encode_waypoints(waypoints)
+encoded_waypoints = t_protocol.encode_waypoints(waypoints)
 
 test_server = ts.TestServer(
     "Center",
     [
-        (WAYPOINTS, waypoints),
+        (WAYPOINTS, encoded_waypoints),
         (DESIRED_VELOCITY, 10.),
         (WINDOW_SIZE, 10.),
-        (LOW_OFFSET, 5.),
-        (HIGH_OFFSET, 5.),
+        (LOW_OFFSET, .5),
+        (HIGH_OFFSET, 1.5),
         (COMMON_ERROR, 1.),
         (CHECK_PERIOD, 1.),
         (WAYPOINT_RANGE, 5.),
@@ -48,13 +54,13 @@ test_server = ts.TestServer(
     SERVER_PORT,
     period=.2
 )
-drone = ts.DroneServer(
-    "Drone",
-    1,
-    0,
-    1,
+drone = Simulator(
+    [waypoints],
     IP,
-    DRONE_PORT
+    DRONE_PORT,
+    velocity=10.,
+    gps_period=1.,
+    sigma=1.
 )
 
 ts_thread = threading.Thread(target=test_server.start)
@@ -80,8 +86,20 @@ system = System(
     wmng,
     desired_cps=desired_cps
 )
+# 미션이 끝나면 (또는 비상 착륙으로 System이 멈추면) 모두 종료
+finished = threading.Event()
+system.event_manager.subscribe(Events.MissionFinished, finished.set)
+
 system_thread = threading.Thread(target=system.run)
 system_thread.start()
 
-
-
+while system.running and not finished.wait(.1):
+    pass
+system.running = False
+system_thread.join()
+if system.drone_connection.receiving:
+    system.stop()
+drone.running = False
+drone_thread.join()
+ts_thread.join()
+print("Mission finished" if finished.is_set() else "Mission aborted")
@@ -1,12 +1,21 @@
-from typing import Optional, List, Tuple, Any
-from server import Server
-from datetime import datetime
+from typing import Dict, Optional, List, Tuple, Any
+from server import Bundle, Client, Server
+from common.clock import Clock
 from common.headings import *
+import logging
 import threading
 import numpy as np
 
 
+log = logging.getLogger(__name__)
+
+
 class TestServer(Server):
+    """
+    연결한 클라이언트마다 data를 순서대로 period 간격으로 보냄
+    bundle=True 이면 data 전체를 하나의 bundle로 한 번에 보내고 ack를 기다림
+    clients 개의 클라이언트에게 다 보내면 종료
+    """
 
     def __init__(
         self,
@@ -15,38 +24,83 @@ class TestServer(Server):
         host: str,
         port: Optional[int] = 22,
         period: Optional[float] = 1.,
+        clock: Optional[Clock] = None,
+        clients: Optional[int] = 1,
+        bundle: Optional[bool] = False,
     ) -> None:
-        super().__init__(name, host, port=port)
+        super().__init__(name, host, port=port, clock=clock)
 
         self.period = period
         self.data = data
+        self.expected_clients = clients
+        self.served = 0
+
+        # 클라이언트 id -> (다음에 보낼 index, 보낼 시각)
+        self.progress: Dict[int, Tuple[int, float]] = {}
+        self.bundle = bundle
+        # 클라이언트 id -> ack를 기다리는 bundle
+        self.rollouts: Dict[int, Bundle] = {}
+
+    def on_connect(self, client: Client):
+        if self.bundle:
+            self.rollouts[client.id] = self.publish(self.data, [client.id])
+            return
+        self.progress[client.id] = (0, self.clock.now() + self.period)
+
+    def on_disconnect(self, client: Client):
+        self.progress.pop(client.id, None)
 
     def start(self):
         super().start()
-        conn, addr = self.socket.accept()
-        elapsed = 0.
 
-        with conn:
-            print(f"Connected from {addr}")
-            self.start_receiving(conn)
+        try:
+            while self.running and self.served < self.expected_clients:
+                self.serve_once(self.timeout())
+                self.send_due()
 
-            while self.data and conn:
-                start = datetime.now()
+                for client_id, bundle in list(self.rollouts.items()):
+                    if bundle.done:
+                        del self.rollouts[client_id]
+                        self.served += 1
+        finally:
+            self.clean()
+            self.clock.leave()
 
-                elapsed += (datetime.now() - start).total_seconds()
+    def timeout(self) -> float:
+        if not self.progress:
+            return self.period
+        next_time = min(t for _, t in self.progress.values())
+        return max(next_time - self.clock.now(), 0.)
 
-                if elapsed >= self.period:
-                    data = self.data.pop(0)
-                    print(f"Server sending : {data[0]}")
-                    byte_data = self.protocol.encode(data[1], data[0])
-                    conn.sendall(byte_data)
+    def send_due(self):
+        now = self.clock.now()
+        for client_id, (i, t) in list(self.progress.items()):
+            if now < t:
+                continue
 
-                    elapsed = 0.
+            name, value = self.data[i]
+            log.info("Server sending to %d : %s", client_id, name)
+            self.send(client_id, self.protocol.encode(value, name))
 
-            self.clean()
+            if i + 1 < len(self.data):
+                self.progress[client_id] = (i + 1, t + self.period)
+            else:
+                del self.progress[client_id]
+                self.served += 1
+
+
+class DroneState:
+
+    def __init__(self, next_gps: float) -> None:
+        self.takeoff_state: bool = False
+        self.position = np.zeros((3,))
+        self.next_gps = next_gps
 
 
 class DroneServer(Server):
+    """
+    연결한 드론(클라이언트)마다 gps_period 간격으로 잡음 섞인 GPS를 보냄
+    """
 
     def __init__(
         self,
@@ -55,64 +109,72 @@ class DroneServer(Server):
         mean: float,
         sigma: float,
         host: str,
-        port: Optional[int] = 22
+        port: Optional[int] = 22,
+        clock: Optional[Clock] = None,
     ) -> None:
-        super().__init__(name, host, port=port)
+        super().__init__(name, host, port=port, clock=clock)
 
         self.gps_period = gps_period
-        self.takeoff_state: bool = False
-        self.velocity: float = 0.
-        self.direction: np.ndarray = np.zeros((3,))
-
-        self.position = np.zeros((3,))
-
         self.mean = mean
         self.sigma = sigma
 
-    def start(self):
-        super().start()
-
-        conn, addr = self.socket.accept()
-        elapsed = 0.
-
-        with conn:
-            print(f"Connected from {addr}")
-            self.start_receiving(conn)
+        self.drones: Dict[int, DroneState] = {}
 
-            while conn:
-                start = datetime.now()
-                encoded = self.get()
-                if encoded:
-                    data = self.protocol.decode(encoded)
+    def on_connect(self, client: Client):
+        self.drones[client.id] = DroneState(self.clock.now() + self.gps_period)
 
-                    for name, value in data:
+    def on_disconnect(self, client: Client):
+        self.drones.pop(client.id, None)
 
-                        if name == TAKEOFF:
-                            self.takeoff_state = True
-                            print("Taking Off")
-
-                        if name == LAND:
-                            self.takeoff_state = False
-                            print("Landing")
+    def start(self):
+        super().start()
 
-                        if name == RUNNING_STATE:
-                            print(f"Running state: {value}")
+        try:
+            while self.running:
+                self.serve_once(self.timeout())
 
-                step_elapsed = (datetime.now() - start).total_seconds()
+                for client_id, drone in list(self.drones.items()):
+                    self.handle_commands(client_id, drone)
 
-                elapsed += step_elapsed
-                if elapsed >= self.gps_period:
-                    pos = self.randomize_gps(self.position)
+                now = self.clock.now()
+                for client_id, drone in list(self.drones.items()):
+                    if now < drone.next_gps:
+                        continue
+                    pos = self.randomize_gps(drone.position)
                     pos = self.protocol.encode_point(pos)
-                    byte_data = self.protocol.encode(pos, GPS_POSITION)
-                    
-                    if conn:
-                        conn.sendall(byte_data)
-
-                    elapsed = 0.
-                    
+                    self.send(client_id, self.protocol.encode(pos, GPS_POSITION))
+                    drone.next_gps = now + self.gps_period
+        finally:
             self.clean()
-            
+            self.clock.leave()
+
+    def timeout(self) -> float:
+        # 다음 GPS 전송까지 대기 (받은 명령은 그 사이 깨어나서 처리)
+        if not self.drones:
+            return self.gps_period
+        next_gps = min(drone.next_gps for drone in self.drones.values())
+        return max(next_gps - self.clock.now(), 0.)
+
+    def handle_commands(self, client_id: int, drone: DroneState):
+        while (encoded := self.get(client_id)):
+            try:
+                values = self.protocol.decode(encoded)
+            except ValueError as e:
+                log.warning("Drone %d: dropping malformed message: %s", client_id, e)
+                continue
+            for name, value in values:
+
+                if name == TAKEOFF:
+                    drone.takeoff_state = True
+                    log.info("Drone %d taking off", client_id)
+
+                if name == LAND:
+                    drone.takeoff_state = False
+                    log.info("Drone %d landing", client_id)
+
+                if name == RUNNING_STATE:
+                    log.debug("Drone %d running state: %s", client_id, value)
+
     def randomize_gps(self, gps: np.ndarray) -> np.ndarray:
         return gps + np.random.normal(loc=self.mean, scale=self.sigma, size=(3,))
 
@@ -121,6 +183,9 @@ if __name__ == "__main__":
     from common.headings import *
     import numpy as np
     from common.protocol import Protocol
+    from common.log import setup_logging
+
+    setup_logging(logging.DEBUG, interval=.5)
 
     IP = "127.0.0.1"
     DRONE = 9875
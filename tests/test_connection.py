@@ -0,0 +1,164 @@
+from common.protocol import Protocol
+from common.headings import (
+    GPS_POSITION, WINDOW_SIZE, EMERGENCY_LANDING, RUNNING_STATE, DESIRED_VELOCITY)
+from drone.connection import Connection
+from drone.drone_connection import DroneConnection
+from drone.system import System
+from drone.window_manager import LocationWindowManager, TimeWindowManager
+from drone.waypoint_manager import WaypointManager
+import numpy as np
+import logging
+import selectors
+import socket
+import threading
+import time
+
+IP = "127.0.0.1"
+
+
+def listener(port: int = 0, backlog: int = 8) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((IP, port))
+    sock.listen(backlog)
+    return sock
+
+
+def accept_later(sock: socket.socket, peers: list, count: int = 1):
+    def accept():
+        for _ in range(count):
+            try:
+                peers.append(sock.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+
+
+def wait_for(condition, timeout: float = 5.):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(.005)
+
+
+def finish_connect(connection: Connection) -> bool:
+    # threaded=False 연결은 생성할 때 시작만 함
+    with selectors.DefaultSelector() as selector:
+        selector.register(connection.connecting, selectors.EVENT_WRITE)
+        assert selector.select(1.)
+    return connection.finish_connect()
+
+
+def test_start_connect_refused():
+    server = listener()
+    port = server.getsockname()[1]
+    server.close()
+
+    # 기다리지 않고 연결을 시작만 함
+    connection = Connection(IP, port, threaded=False, backoff=.01)
+    if connection.connecting is not None:
+        assert not finish_connect(connection)
+    assert connection.failures == 1
+    assert connection.connecting is None
+    assert connection.socket is None
+    connection.clean()
+
+
+def test_event_driven_reconnect_does_not_block():
+    protocol = Protocol("binary")
+    server = listener(backlog=0)
+    drone = listener()
+    server_peers, drone_peers = [], []
+    accept_later(server, server_peers)
+    accept_later(drone, drone_peers)
+
+    connection = Connection(
+        IP, server.getsockname()[1], protocol=protocol, threaded=False,
+        backoff=.01, max_backoff=.05, connect_timeout=5.)
+    drone_connection = DroneConnection(
+        IP, drone.getsockname()[1], protocol=protocol, threaded=False)
+    wait_for(lambda: server_peers and drone_peers)
+    assert connection.socket is None and drone_connection.socket is None
+
+    # accept 큐를 채워서 재연결 SYN이 응답 없이 버려지게 함 (연결 중 상태로 남음)
+    fillers = []
+    for _ in range(4):
+        filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        filler.setblocking(False)
+        filler.connect_ex(server.getsockname())
+        fillers.append(filler)
+
+    system = System(
+        connection, drone_connection,
+        LocationWindowManager(), TimeWindowManager(), WaypointManager(),
+        protocol=protocol)
+    thread = threading.Thread(target=system.run_event_driven, daemon=True)
+    thread.start()
+
+    try:
+        # 생성할 때 시작한 연결은 루프에서 마침 (재연결로 세지 않음)
+        wait_for(lambda: connection.socket is not None and drone_connection.socket is not None)
+        assert connection.reconnects == 0
+
+        server_peers[0].close()
+        wait_for(lambda: connection.connecting is not None)
+
+        # 연결 중에도 드론 메시지는 바로 처리됨 (connect_timeout 동안 막히지 않음)
+        start = time.perf_counter()
+        drone_peers[0].sendall(protocol.encode(np.ones(3), GPS_POSITION))
+        wait_for(lambda: system.current_position is not None, timeout=1.)
+        assert time.perf_counter() - start < 1.
+
+        # accept 해서 큐가 비면 (SYN 재전송 뒤) 연결됨
+        accept_later(server, server_peers, count=6)
+        wait_for(lambda: connection.reconnects == 1)
+    finally:
+        system.running = False
+        thread.join(5.)
+        system.stop()
+        for sock in fillers + server_peers + drone_peers + [server, drone]:
+            sock.close()
+
+
+def test_outgoing_queue_while_disconnected(caplog):
+    protocol = Protocol("binary")
+    server = listener()
+    peers = []
+    accept_later(server, peers, count=2)
+    connection = Connection(
+        IP, server.getsockname()[1], protocol=protocol, threaded=False, max_outgoing=8)
+    assert finish_connect(connection)
+    wait_for(lambda: peers)
+
+    # 끊긴 상태에서 보냄
+    connection.socket.close()
+    with caplog.at_level(logging.DEBUG, logger="drone.connection"):
+        connection.send(protocol.encode(1, EMERGENCY_LANDING), immediate=True)
+    assert any(r.levelno >= logging.ERROR for r in caplog.records)
+
+    for i in range(20):
+        connection.send(protocol.encode(0, RUNNING_STATE), coalesce=True)
+        connection.send(protocol.encode(float(i), DESIRED_VELOCITY))
+        connection.flush()
+    assert len(connection.outgoing) == 8
+    assert connection.dropped > 0
+
+    # 재연결하면 비상 착륙, 남은 메시지, 최신 heartbeat 하나만 보냄
+    connection.use_socket(socket.create_connection(server.getsockname()))
+    wait_for(lambda: len(peers) == 2)
+    connection.flush()
+    connection.socket.shutdown(socket.SHUT_WR)
+    data = b""
+    while chunk := peers[1].recv(65536):
+        data += chunk
+    with memoryview(data) as view:
+        messages, _ = protocol.split(view)
+    received = [x for m in messages for x in protocol.decode(m)]
+
+    assert received[0] == (EMERGENCY_LANDING, 1)
+    assert received.count((RUNNING_STATE, 0)) == 1
+    assert received[-1] == (DESIRED_VELOCITY, 19.)
+    connection.clean()
+    for sock in peers + [server]:
+        sock.close()
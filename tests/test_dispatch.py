@@ -0,0 +1,99 @@
+from common.protocol import Protocol
+from common.headings import DESIRED_VELOCITY, WINDOW_SIZE, COMMON_ERROR, WAYPOINT_RANGE
+from drone.dispatch import DispatchTable
+from drone.event_manager import EventManager
+from drone.metrics import Metrics
+from drone.recorder import ReplayConnection
+from drone.system import System
+from drone.window_manager import LocationWindowManager, TimeWindowManager
+from drone.waypoint_manager import WaypointManager
+
+
+def make_table(metrics=None):
+    event_manager = EventManager(metrics)
+    calls = []
+    for event in ("param", "value", "none"):
+        event_manager.register(event)
+    event_manager.subscribe("param", lambda name, value: calls.append(("param", name, value)))
+    event_manager.subscribe("value", lambda value: calls.append(("value", value)))
+    event_manager.subscribe("none", lambda: calls.append(("none",)))
+
+    table = DispatchTable(event_manager)
+    table.route(["speed", "range"], "param", DispatchTable.NAME_VALUE)
+    table.route("gps", "value", DispatchTable.VALUE)
+    table.route("start", "none", DispatchTable.NONE)
+    # 이름 하나에 이벤트 여러 개, 등록한 순서대로
+    table.route("start", "value", DispatchTable.VALUE)
+    return table, calls
+
+
+def test_routes_by_name_and_argument_form():
+    table, calls = make_table()
+
+    assert table.dispatch("speed", 10.)
+    assert table.dispatch("range", 3.)
+    assert table.dispatch("gps", (1., 2., 3.))
+    assert table.dispatch("start", 1)
+    assert calls == [
+        ("param", "speed", 10.),
+        ("param", "range", 3.),
+        ("value", (1., 2., 3.)),
+        ("none",),
+        ("value", 1),
+    ]
+
+
+def test_unknown_name_is_not_dispatched():
+    table, calls = make_table()
+
+    assert "unknown" not in table
+    assert not table.dispatch("unknown", 1)
+    assert calls == []
+
+
+def test_recompiles_when_subscriptions_change():
+    table, calls = make_table()
+    table.compile()
+    table.event_manager.subscribe("value", lambda value: calls.append(("late", value)))
+    # 새 route도 다음 dispatch에서 반영
+    table.route("gps2", "value")
+
+    table.dispatch("gps", 1)
+    table.dispatch("gps2", 2)
+    assert calls == [("value", 1), ("late", 1), ("value", 2), ("late", 2)]
+
+
+def test_background_subscribers_and_metrics():
+    metrics = Metrics()
+    table, calls = make_table(metrics)
+    table.event_manager.subscribe(
+        "param", lambda name, value: calls.append(("background", name, value)), background=True)
+
+    table.dispatch("speed", 5.)
+    # workers=0이면 background 구독 함수도 바로 실행
+    assert calls == [("param", "speed", 5.), ("background", "speed", 5.)]
+    assert "event.param" in metrics.histograms
+
+
+def test_system_routes_parameters_to_their_managers():
+    system = System(
+        ReplayConnection(),
+        ReplayConnection(),
+        LocationWindowManager(),
+        TimeWindowManager(),
+        WaypointManager(),
+        protocol=Protocol("binary"),
+    )
+    system.receive_from_connection([
+        (DESIRED_VELOCITY, 7.), (WINDOW_SIZE, 4.), (COMMON_ERROR, 2.), (WAYPOINT_RANGE, 3.),
+        ("unknown", 1.),
+    ])
+    system.stop()
+
+    # DESIRED_VELOCITY는 세 매니저 모두에
+    assert system.location_manager.desired_velocity == 7.
+    assert system.time_manager.desired_velocity == 7.
+    assert system.waypoint_manager.desired_velocity == 7.
+    assert system.location_manager.window_size == 4.
+    assert system.time_manager.common_error == 2.
+    assert system.waypoint_manager.waypoint_range == 3.
@@ -0,0 +1,65 @@
+from common.clock import VirtualClock
+from common.headings import GPS_POSITION
+from common.inbox import Inbox
+from common.protocol import Protocol
+from drone.drone_connection import DatagramChannel
+import numpy as np
+import pytest
+import socket
+
+IP = "127.0.0.1"
+
+
+@pytest.fixture
+def channel():
+    clock = VirtualClock()
+    protocol = Protocol("binary")
+    channel = DatagramChannel(0, protocol, Inbox(protocol), IP, clock=clock)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    yield channel, sender, clock
+    sender.close()
+    channel.clean()
+
+
+def send(channel, sender, sequences):
+    protocol = channel.protocol
+    for sequence in sequences:
+        data = protocol.encode(protocol.encode_point(np.full(3, sequence)), GPS_POSITION)
+        sender.sendto(protocol.encode_datagram(sequence, data), channel.socket.getsockname())
+        channel.receive_once()
+
+
+def test_binds_to_loopback_by_default():
+    protocol = Protocol("binary")
+    channel = DatagramChannel(0, protocol, Inbox(protocol))
+    assert channel.socket.getsockname()[0] == IP
+    channel.clean()
+
+
+def test_late_and_duplicate_datagrams_are_dropped(channel):
+    channel, sender, _ = channel
+    send(channel, sender, [10, 12, 11, 12])
+    assert channel.received == 2
+    assert channel.dropped == 2
+    assert channel.last_sequence == 12
+
+
+def test_sender_restart_is_accepted(channel):
+    channel, sender, _ = channel
+    send(channel, sender, [1_000_000, 1_000_001, 1, 2])
+    assert channel.received == 4
+    assert channel.restarts == 1
+    assert channel.last_sequence == 2
+
+
+def test_recovers_from_spoofed_sequence_after_timeout(channel):
+    channel, sender, clock = channel
+    send(channel, sender, [5, 6])
+    # 가까운 큰 순번이 한 번 오면 그 뒤 정상 순번은 잠시 버려지지만
+    send(channel, sender, [50, 7, 8])
+    assert channel.dropped == 2
+    # stale_timeout이 지나면 다시 받음
+    clock.advance(channel.stale_timeout)
+    send(channel, sender, [9, 10])
+    assert channel.last_sequence == 10
+    assert channel.restarts == 1
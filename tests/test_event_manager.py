@@ -0,0 +1,42 @@
+from drone.event_manager import EventManager
+import logging
+
+
+def test_process_runs_critical_lane_first():
+    event_manager = EventManager()
+    event_manager.register("normal")
+    event_manager.register("critical", EventManager.CRITICAL)
+    order = []
+    event_manager.subscribe("normal", lambda: order.append("normal"))
+    event_manager.subscribe("critical", lambda: order.append("critical"))
+
+    event_manager.post("normal")
+    event_manager.post("critical")
+    assert event_manager.process() == 2
+    assert order == ["critical", "normal"]
+
+
+def test_background_failure_is_logged(caplog):
+    event_manager = EventManager(workers=1)
+    event_manager.register("event")
+
+    def fail():
+        raise RuntimeError("boom")
+
+    event_manager.subscribe("event", fail, background=True)
+    with caplog.at_level(logging.ERROR, logger="drone.event_manager"):
+        event_manager.publish("event")
+        event_manager.shutdown()
+    assert "boom" in caplog.text
+
+
+def test_shutdown_drops_posted_events():
+    event_manager = EventManager()
+    event_manager.register("event")
+    called = []
+    event_manager.subscribe("event", lambda: called.append(1))
+
+    event_manager.post("event")
+    event_manager.shutdown()
+    assert event_manager.process() == 0
+    assert not called
@@ -0,0 +1,62 @@
+from common.protocol import Protocol
+from common.headings import BUNDLE, BUNDLE_END, BUNDLE_ACK, DESIRED_VELOCITY
+from drone.connection import Connection
+from drone.drone_connection import DroneConnection
+from drone.fleet import Fleet
+from drone.recorder import ReplayConnection
+from server import Server
+import socket
+import threading
+import time
+
+IP = "127.0.0.1"
+
+
+def acks(fleet, index):
+    return [value for x in fleet.connections[index].sent for _, value in fleet.protocol.decode(x)]
+
+
+def test_repeated_bundle_is_acked_but_not_applied():
+    fleet = Fleet(protocol=Protocol("binary"))
+    fleet.add_drone(ReplayConnection(), ReplayConnection())
+
+    fleet.receive_from_connection(0, [(BUNDLE, 7), (DESIRED_VELOCITY, 3.), (BUNDLE_END, 7)])
+    fleet.location_manager.desired_velocity[0] = 4.
+    fleet.receive_from_connection(0, [(BUNDLE, 7), (DESIRED_VELOCITY, 3.), (BUNDLE_END, 7)])
+    # 시작 없이 끝만 온 bundle은 ack 하지 않음
+    fleet.receive_from_connection(0, [(BUNDLE_END, 9)])
+
+    assert fleet.location_manager.desired_velocity[0] == 4.
+    assert acks(fleet, 0) == [7, 7]
+
+
+def test_publish_is_acknowledged_by_fleet():
+    protocol = Protocol("binary")
+    server = Server("server", IP, 0, protocol=protocol, ack_timeout=.2, max_attempts=3)
+    server.start()
+    drone = socket.create_server((IP, 0))
+
+    fleet = Fleet(protocol=protocol)
+    for _ in range(2):
+        fleet.add_drone(
+            Connection(IP, server.socket.getsockname()[1], protocol=protocol, threaded=False),
+            DroneConnection(IP, drone.getsockname()[1], protocol=protocol, threaded=False),
+        )
+    thread = threading.Thread(target=fleet.run, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(server.clients) < 2 and time.monotonic() < deadline:
+            server.serve_once(.05)
+        assert len(server.clients) == 2
+
+        bundle = server.publish([(DESIRED_VELOCITY, 7.)])
+        assert server.wait_bundle(bundle, timeout=2)
+        assert bundle.acked == set(server.clients)
+        assert list(fleet.location_manager.desired_velocity) == [7., 7.]
+    finally:
+        fleet.running = False
+        thread.join(2)
+        fleet.stop()
+        server.clean()
+        drone.close()
@@ -0,0 +1,78 @@
+from common.headings import GPS_POSITION, DESIRED_VELOCITY, WINDOW_SIZE, MISSION_START
+from common.inbox import Inbox
+from common.protocol import Protocol
+import numpy as np
+
+protocol = Protocol("binary")
+
+
+def gps(x):
+    return protocol.encode(protocol.encode_point(np.full(3, float(x))), GPS_POSITION)
+
+
+def drain(inbox):
+    messages = []
+    while (message := inbox.get()) is not None:
+        messages.append(protocol.decode(message)[0])
+    return messages
+
+
+def test_latest_keeps_only_newest_gps():
+    inbox = Inbox(protocol)
+    for x in range(5):
+        inbox.put(gps(x))
+
+    assert len(inbox) == 1
+    assert inbox.coalesced == 4
+    name, value = drain(inbox)[0]
+    assert name == GPS_POSITION
+    assert list(protocol.decode_point(value)) == [4., 4., 4.]
+    assert inbox.get() is None
+
+
+def test_fifo_keeps_order_and_drops_oldest_when_full():
+    inbox = Inbox(protocol, capacity=3)
+    for x in range(5):
+        inbox.put(protocol.encode(float(x), DESIRED_VELOCITY))
+
+    assert inbox.dropped == 2
+    assert drain(inbox) == [(DESIRED_VELOCITY, 2.), (DESIRED_VELOCITY, 3.), (DESIRED_VELOCITY, 4.)]
+
+
+def test_policies_share_arrival_order():
+    inbox = Inbox(protocol)
+    inbox.put(protocol.encode(1., DESIRED_VELOCITY))
+    inbox.put(gps(1))
+    inbox.put(protocol.encode(2., WINDOW_SIZE))
+    # 덮어쓴 GPS는 마지막으로 받은 자리로
+    inbox.put(gps(2))
+    inbox.put(protocol.encode(1, MISSION_START))
+
+    names = [name for name, _ in drain(inbox)]
+    assert names == [DESIRED_VELOCITY, WINDOW_SIZE, GPS_POSITION, MISSION_START]
+
+
+def test_custom_policies():
+    # GPS도 FIFO, 파라미터는 LATEST
+    inbox = Inbox(protocol, policies={DESIRED_VELOCITY: Inbox.LATEST})
+    inbox.put(gps(1))
+    inbox.put(protocol.encode(1., DESIRED_VELOCITY))
+    inbox.put(gps(2))
+    inbox.put(protocol.encode(2., DESIRED_VELOCITY))
+
+    messages = drain(inbox)
+    assert [name for name, _ in messages] == [GPS_POSITION, GPS_POSITION, DESIRED_VELOCITY]
+    assert messages[-1] == (DESIRED_VELOCITY, 2.)
+    assert inbox.coalesced == 1
+
+
+def test_unknown_name_is_fifo():
+    text = Protocol("text")
+    inbox = Inbox(text)
+    # 값이 여러 개인 text 메시지는 이름을 알 수 없음
+    messages = [text.encode_multiple([(1., DESIRED_VELOCITY), (2., WINDOW_SIZE)]) for _ in range(2)]
+    for message in messages:
+        inbox.put(message)
+
+    assert len(inbox) == 2
+    assert [inbox.get(), inbox.get()] == messages
@@ -0,0 +1,53 @@
+from common.protocol import Protocol
+from common.headings import WAYPOINTS, DESIRED_VELOCITY, GPS_POSITION
+import numpy as np
+import pytest
+
+
+def receive_in_chunks(protocol, data, chunk_size):
+    buffer = bytearray()
+    messages = []
+    for i in range(0, len(data), chunk_size):
+        buffer += data[i:i + chunk_size]
+        with memoryview(buffer) as view:
+            split, consumed = protocol.split(view)
+        del buffer[:consumed]
+        messages += split
+    assert not buffer
+    return messages
+
+
+@pytest.mark.parametrize("codec", [Protocol.TEXT, Protocol.BINARY])
+def test_large_waypoints_split_across_chunks(codec):
+    protocol = Protocol(codec)
+    waypoints = np.random.default_rng(0).random((2000, 3)) * 1000
+    data = protocol.encode(protocol.encode_waypoints(waypoints), WAYPOINTS) + \
+        protocol.encode(3., DESIRED_VELOCITY)
+
+    messages = receive_in_chunks(protocol, data, 997)
+
+    assert [protocol.peek_name(m) for m in messages] == [WAYPOINTS, DESIRED_VELOCITY]
+    (_, value), = protocol.decode(messages[0])
+    assert np.allclose(protocol.decode_waypoints(value), waypoints, atol=1e-5)
+    assert protocol.decode(messages[1]) == [(DESIRED_VELOCITY, 3.)]
+
+
+def test_text_point_is_one_line():
+    protocol = Protocol()
+    encoded = protocol.encode(protocol.encode_point(np.arange(3.)), GPS_POSITION)
+    assert encoded.count(Protocol.END_TOKEN.encode()) == 1
+    assert encoded.endswith(Protocol.END_TOKEN.encode())
+
+
+@pytest.mark.parametrize("codec, message", [
+    (Protocol.TEXT, b"#desired_velocity"),
+    (Protocol.TEXT, b"#desired_velocity@1.0@complex"),
+    (Protocol.BINARY, b"\x02\x00\x00\x00\xff\x00"),
+    (Protocol.BINARY, b"\x03\x00\x00\x00\x00\x66\x00"),
+])
+def test_malformed_message(codec, message):
+    protocol = Protocol(codec)
+    # 수신 스레드에서 부르므로 예외 없음
+    protocol.peek_name(message)
+    with pytest.raises(ValueError):
+        protocol.decode(message)
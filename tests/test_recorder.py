@@ -0,0 +1,87 @@
+from common.clock import VirtualClock
+from common.protocol import Protocol
+from common.headings import *
+from drone.recorder import Recorder, Replay, ReplayConnection
+from drone.system import System
+from drone.window_manager import LocationWindowManager, TimeWindowManager
+from drone.waypoint_manager import WaypointManager
+import numpy as np
+
+WAYPOINTS_ = np.array([
+    [0., 0., 10.],
+    [20., 0., 10.],
+    [20., 20., 10.],
+    [0., 20., 10.],
+])
+
+
+def make_system(recorder_path=None):
+    clock = VirtualClock()
+    return System(
+        ReplayConnection(),
+        ReplayConnection(),
+        LocationWindowManager(),
+        TimeWindowManager(),
+        WaypointManager(),
+        protocol=Protocol("binary"),
+        recorder=Recorder(recorder_path, clock) if recorder_path else None,
+        clock=clock,
+    )
+
+
+def fly(system):
+    """
+    첫 모서리까지는 경로대로, 두 번째 구간에서 경로를 벗어나 비상 착륙
+    """
+    protocol = system.protocol
+
+    def server(value, name):
+        system.connection.put(protocol.encode(value, name))
+        system.poll()
+
+    def gps(position):
+        system.drone_connection.put(protocol.encode(
+            protocol.encode_point(np.array(position)), GPS_POSITION))
+        system.poll()
+
+    server(protocol.encode_waypoints(WAYPOINTS_), WAYPOINTS)
+    for value, name in [
+        (10., DESIRED_VELOCITY), (5., WINDOW_SIZE), (.5, LOW_OFFSET), (1.5, HIGH_OFFSET),
+        (1., COMMON_ERROR), (.5, CHECK_PERIOD), (3., WAYPOINT_RANGE), (1, MISSION_START),
+    ]:
+        server(value, name)
+
+    for step in range(1, 60):
+        system.clock.advance(.1)
+        t = step * .1
+        if t <= 2.:
+            gps([10. * t, 0., 10.])
+        else:
+            gps([20. + 3. * (t - 2.), 10. * (t - 2.), 10.])
+        if step == 20:
+            server(1, WAYPOINT_REACHED)
+        system.update(system.clock.now())
+        if not system.running:
+            break
+
+
+def test_replay_reproduces_recording(tmp_path):
+    path = str(tmp_path / "flight.log")
+    system = make_system(path)
+    fly(system)
+    system.recorder.close()
+    sent = list(system.drone_connection.sent)
+    system.stop()
+
+    names = [name for x in sent for name, _ in system.protocol.decode(x)]
+    assert RUNNING_STATE in names
+    assert EMERGENCY_LANDING in names
+
+    replays = []
+    for _ in range(2):
+        replay = Replay(path, make_system())
+        replays.append(replay.run())
+        assert replay.recorded == sent
+        assert replay.matches()
+        replay.system.stop()
+    assert replays[0] == replays[1] == sent
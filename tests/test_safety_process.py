@@ -0,0 +1,129 @@
+from common.protocol import Protocol
+from common.headings import *
+from drone.recorder import ReplayConnection
+from drone.system import System
+from drone.window_manager import LocationWindowManager, TimeWindowManager
+from drone.waypoint_manager import WaypointManager
+import numpy as np
+import pytest
+import socket
+import time
+
+WAYPOINTS_ = np.array([
+    [0., 0., 10.],
+    [20., 0., 10.],
+    [20., 20., 10.],
+])
+
+
+class DroneEnd(ReplayConnection):
+    """
+    안전 프로세스에 넘길 드론 소켓을 가진 가짜 드론 연결
+    """
+
+    def __init__(self, sock: socket.socket) -> None:
+        super().__init__()
+        self.socket = sock
+
+
+@pytest.fixture
+def system():
+    protocol = Protocol("binary")
+    drone, peer = socket.socketpair()
+    system = System(
+        ReplayConnection(),
+        DroneEnd(drone),
+        LocationWindowManager(),
+        TimeWindowManager(),
+        WaypointManager(),
+        protocol=protocol,
+        safety_process=True,
+        watchdog_timeout=.5,
+    )
+    system.peer = peer
+    yield system
+    if system.running:
+        system.stop()
+    drone.close()
+    peer.close()
+
+
+def start_mission(system):
+    protocol = system.protocol
+    for value, name in [
+        (protocol.encode_waypoints(WAYPOINTS_), WAYPOINTS),
+        (10., DESIRED_VELOCITY),
+        (5., WINDOW_SIZE),
+        (.5, LOW_OFFSET),
+        (1.5, HIGH_OFFSET),
+        (1., COMMON_ERROR),
+        # 테스트 중에 위치 검사가 돌지 않도록
+        (60., CHECK_PERIOD),
+        (3., WAYPOINT_RANGE),
+        (1, MISSION_START),
+    ]:
+        system.connection.put(protocol.encode(value, name))
+    system.drone_connection.put(protocol.encode(
+        protocol.encode_point(WAYPOINTS_[0]), GPS_POSITION))
+    system.poll()
+
+
+def read_drone(system, until, timeout=10.):
+    """
+    안전 프로세스가 드론 소켓으로 보낸 메시지를 until이 올 때까지 읽음
+    """
+    buffer = bytearray()
+    received = []
+    system.peer.settimeout(.1)
+    deadline = time.monotonic() + timeout
+    while until not in received and time.monotonic() < deadline:
+        try:
+            chunk = system.peer.recv(4096)
+        except socket.timeout:
+            continue
+        if not chunk:
+            break
+        buffer += chunk
+        messages, used = system.protocol.split(memoryview(buffer))
+        del buffer[:used]
+        received += [x for m in messages for x in system.protocol.decode(m)]
+    return received
+
+
+def wait_stopped(system, timeout=5.):
+    deadline = time.monotonic() + timeout
+    while system.running and time.monotonic() < deadline:
+        system.poll()
+        time.sleep(.01)
+
+
+def test_watchdog_lands_when_heartbeat_stops(system):
+    start_mission(system)
+    received = read_drone(system, (MISSION_START, 1))
+    assert (MISSION_START, 1) in received
+
+    # 부모가 update를 부르지 않으므로 PING이 끊김
+    received = read_drone(system, (EMERGENCY_LANDING, 1))
+    assert (EMERGENCY_LANDING, 1) in received
+
+    wait_stopped(system)
+    assert not system.running
+    assert system.safety.reason == "watchdog"
+    assert not system.safety.process.is_alive()
+    assert system.safety.process.exitcode == 0
+    # 자식이 이미 보냈으므로 부모는 다시 보내지 않음
+    assert system.drone_connection.sent == []
+
+
+def test_parent_lands_when_safety_process_dies(system):
+    start_mission(system)
+    assert (MISSION_START, 1) in read_drone(system, (MISSION_START, 1))
+
+    system.safety.process.kill()
+    system.safety.process.join(5)
+    wait_stopped(system)
+
+    assert not system.running
+    assert system.safety.reason is None
+    sent = [x for m in system.drone_connection.sent for x in system.protocol.decode(m)]
+    assert sent == [(EMERGENCY_LANDING, 1)]
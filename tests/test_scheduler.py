@@ -0,0 +1,63 @@
+from common.clock import VirtualClock
+from drone.metrics import Metrics
+from drone.scheduler import Scheduler
+
+
+def test_missed_deadlines_are_counted_not_replayed():
+    clock = VirtualClock()
+    metrics = Metrics()
+    scheduler = Scheduler(clock, metrics)
+    runs = []
+    task = scheduler.add("task", 1., runs.append)
+
+    # 마감 1초를 2.5초 늦게 실행, 2초와 3초 마감은 놓침
+    assert scheduler.run_due(3.5) == 1
+    assert runs == [3.5]
+    assert task.missed == 2
+    assert task.drift == 2.5
+    assert metrics.counters["schedule.task.missed"] == 2
+    # 다음 마감은 밀리지 않고 원래 격자 위 (4초)
+    assert scheduler.next_deadline() == 4.
+
+    assert scheduler.run_due(4.25) == 1
+    assert task.missed == 2
+    assert task.drift == .25
+    assert task.max_drift == 2.5
+    assert task.runs == 2
+
+
+def test_tasks_run_in_deadline_order():
+    scheduler = Scheduler(VirtualClock())
+    order = []
+    period = [1.]
+    scheduler.add("slow", lambda: period[0], lambda now: order.append(("slow", now)))
+    scheduler.add("fast", .5, lambda now: order.append(("fast", now)))
+    scheduler.add("same", 1., lambda now: order.append(("same", now)))
+
+    for now in (.5, 1.):
+        scheduler.run_due(now)
+    # 같은 마감이면 먼저 heap에 들어간 작업부터 (fast의 1초 마감은 .5초 실행 후에 들어감)
+    assert order == [("fast", .5), ("slow", 1.), ("same", 1.), ("fast", 1.)]
+
+    # 바뀐 주기는 이미 잡힌 마감(2초) 다음부터
+    period[0] = .25
+    order.clear()
+    for now in (1.5, 2., 2.25):
+        scheduler.run_due(now)
+    assert order == [("fast", 1.5), ("slow", 2.), ("same", 2.), ("fast", 2.), ("slow", 2.25)]
+    assert scheduler.timeout(2.25) == .25
+
+
+def test_removed_task_is_skipped():
+    scheduler = Scheduler(VirtualClock())
+    runs = []
+    task = scheduler.add("task", 1., runs.append)
+    scheduler.add("other", 1.5, lambda now: scheduler.remove(task), start=.5)
+
+    # other는 한 번만 (놓친 마감은 몰아서 실행하지 않음), 지운 task는 실행하지 않음
+    assert scheduler.run_due(3.) == 1
+    assert runs == []
+    assert scheduler.next_deadline() == 3.5
+    scheduler.clear()
+    assert scheduler.next_deadline() is None
+    assert scheduler.timeout(0.) is None
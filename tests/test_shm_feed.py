@@ -0,0 +1,149 @@
+from common.shm_feed import ShmWriter, ShmReader, MASK
+import numpy as np
+import multiprocessing
+import os
+import pytest
+import secrets
+import time
+
+
+@pytest.fixture
+def writer():
+    writer = ShmWriter(f"test_feed_{secrets.token_hex(4)}", slots=4)
+    yield writer
+    writer.close()
+
+
+@pytest.fixture
+def reader(writer):
+    reader = ShmReader(writer.shm.name)
+    yield reader
+    reader.close()
+
+
+def write_count(writer, i):
+    # 위치와 시각이 모두 i, 섞여서 읽히면 값이 달라짐
+    writer.write(np.full(3, float(i)), i)
+
+
+class Lapping:
+    """
+    읽는 쪽이 위치를 복사하는 순간 쓰는 쪽이 ring을 한 바퀴 돌아 같은 slot을 덮어씀
+    """
+
+    def __init__(self, positions, writer, laps) -> None:
+        self.positions = positions
+        self.writer = writer
+        self.laps = laps
+
+    def __getitem__(self, slot):
+        if self.laps:
+            self.laps -= 1
+            for _ in range(self.writer.slots):
+                write_count(self.writer, self.writer.count + 1)
+        return self.positions[slot]
+
+
+def test_torn_read_is_retried(writer, reader):
+    write_count(writer, 1)
+    reader.positions = Lapping(reader.positions, writer, laps=2)
+
+    count, timestamp, position = reader.read()
+
+    assert reader.retried == 2
+    assert count == writer.count == 9
+    assert timestamp == 9
+    assert list(position) == [9., 9., 9.]
+
+
+def test_slot_being_written_is_not_returned(writer, reader):
+    for i in range(1, 4):
+        write_count(writer, i)
+    # count가 가리키는 slot을 다음 바퀴가 쓰는 중 (순번 홀수)
+    writer.sequences[writer.count % writer.slots] += 1 + 2 * writer.slots
+
+    assert reader.read() is None
+    assert reader.retried == ShmReader.RETRIES
+
+
+def write_loop(writer, seconds):
+    # fork로 복사된 writer, 같은 공유 메모리에 씀 (close, unlink는 부모가)
+    deadline = time.monotonic() + seconds
+    i = writer.count
+    while time.monotonic() < deadline:
+        i += 1
+        write_count(writer, i)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork로 쓰는 프로세스를 시작")
+def test_concurrent_writer_never_tears(writer, reader):
+    process = multiprocessing.get_context("fork").Process(
+        target=write_loop, args=(writer, .5))
+    process.start()
+
+    reads = 0
+    while process.is_alive():
+        result = reader.read()
+        if result is None:
+            continue
+        count, timestamp, position = result
+        assert timestamp == count
+        assert (position == count).all()
+        reads += 1
+    process.join()
+
+    assert process.exitcode == 0
+    assert reads > 0
+    assert reader.read()[0] == writer.count > writer.slots
+
+
+def test_ring_wraparound(writer, reader):
+    for i in range(1, 3 * writer.slots + 2):
+        write_count(writer, i)
+        assert reader.poll()[0] == i
+    assert reader.poll() is None
+
+    for i in range(3 * writer.slots + 2, 5 * writer.slots):
+        write_count(writer, i)
+    # 그 사이 여러 번 썼으면 가장 최근 것만
+    assert reader.poll()[0] == 5 * writer.slots - 1
+
+
+def test_sequence_wraparound(writer, reader):
+    # 순번 2 * count가 2^64를 넘어감
+    start = (1 << 63) - 2
+    writer.header[1] = start
+    for i in range(1, 6):
+        writer.write(np.full(3, float(i)), i)
+        count, timestamp, position = reader.read()
+        assert count == start + i
+        assert timestamp == i
+        assert list(position) == [i, i, i]
+
+    assert writer.sequences[writer.count % writer.slots] == (2 * writer.count) & MASK
+    assert writer.sequences.min() < writer.count
+
+
+def test_closed_reader_raises(writer, reader):
+    write_count(writer, 1)
+    reader.close()
+    reader.close()
+
+    with pytest.raises(ValueError):
+        reader.read()
+    with pytest.raises(ValueError):
+        reader.poll()
+
+
+def test_unlinked_segment(writer, reader):
+    name = writer.shm.name
+    write_count(writer, 1)
+    writer.close()
+    writer.close()
+
+    # 이미 연 읽는 쪽은 마지막 위치를 계속 읽음
+    assert reader.read()[0] == 1
+    assert reader.poll()[0] == 1
+    assert reader.poll() is None
+    with pytest.raises(FileNotFoundError):
+        ShmReader(name)
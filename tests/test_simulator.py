@@ -0,0 +1,66 @@
+from common.clock import VirtualClock
+from simulator import Simulator
+import numpy as np
+import selectors
+import socket
+
+MISSION = np.array([[0., 0., 10.], [100., 0., 10.]])
+
+
+def test_waits_for_mission_start():
+    clock = VirtualClock()
+    simulator = Simulator([MISSION, MISSION], "127.0.0.1", 0, velocity=10., clock=clock)
+
+    # 연결만 하고 MISSION_START 전에는 움직이지 않음
+    clock.advance(1.)
+    simulator.step_to(clock.now_ns())
+    assert np.array_equal(simulator.positions, MISSION[[0, 0]])
+
+    simulator.takeoff(np.array([1]))
+    clock.advance(1.)
+    simulator.step_to(clock.now_ns())
+    assert np.allclose(simulator.positions, [[0., 0., 10.], [10., 0., 10.]])
+
+
+def test_landed_drone_does_not_take_off():
+    clock = VirtualClock()
+    simulator = Simulator([MISSION], "127.0.0.1", 0, clock=clock)
+    simulator.landed[0] = True
+
+    simulator.takeoff(np.arange(1))
+    assert not simulator.flying.any()
+
+
+def test_gps_sequence_per_drone():
+    clock = VirtualClock()
+    simulator = Simulator([MISSION] * 100, "127.0.0.1", 0, clock=clock)
+    # measure는 연결된 드론만 봄
+    simulator.clients = {i: None for i in range(100)}
+
+    simulator.measure(clock.now_ns())
+    simulator.measure(clock.now_ns())
+
+    for i in range(100):
+        sequences = [sequence for _, sequence, j, _ in simulator.pending if j == i]
+        # 드론마다 1, 2 (다른 드론 수만큼 건너뛰지 않음)
+        assert sorted(sequences) == [1, 2]
+
+
+def test_second_client_replaces_first():
+    simulator = Simulator([MISSION], "127.0.0.1", 0)
+    listener = socket.create_server(("127.0.0.1", 0))
+    first = socket.create_connection(listener.getsockname())
+    second = socket.create_connection(listener.getsockname())
+    with selectors.DefaultSelector() as selector:
+        simulator.accept(selector, listener, 0)
+        old = simulator.clients[0]
+        first.sendall(b"\x00" * 16)
+        simulator.accept(selector, listener, 0)
+
+        # 같은 select 결과에 남아 있던 이전 클라이언트의 읽기 이벤트
+        simulator.receive(selector, 0, old)
+        assert simulator.clients[0] is not old
+        assert selector.get_key(simulator.clients[0].socket)
+    for sock in (first, second, listener):
+        sock.close()
+    simulator.clean()
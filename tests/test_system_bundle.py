@@ -0,0 +1,66 @@
+from common.protocol import Protocol
+from common.headings import BUNDLE, BUNDLE_END, BUNDLE_ACK, DESIRED_VELOCITY
+from drone.recorder import ReplayConnection
+from drone.system import System
+from drone.window_manager import LocationWindowManager, TimeWindowManager
+from drone.waypoint_manager import WaypointManager
+import pytest
+
+
+@pytest.fixture
+def system():
+    protocol = Protocol("binary")
+    system = System(
+        ReplayConnection(),
+        ReplayConnection(),
+        LocationWindowManager(),
+        TimeWindowManager(),
+        WaypointManager(),
+        protocol=protocol,
+    )
+    yield system
+    system.stop()
+
+
+def receive(system, values):
+    for value, name in values:
+        system.connection.put(system.protocol.encode(value, name))
+    system.poll()
+
+
+def acks(system):
+    return [value for x in system.connection.sent for _, value in system.protocol.decode(x)]
+
+
+def test_repeated_bundle_start_without_end(system):
+    receive(system, [(7, BUNDLE), (3., DESIRED_VELOCITY), (7, BUNDLE_END)])
+    # 재전송된 bundle 7의 BUNDLE만 오고 끝은 잘림
+    receive(system, [(7, BUNDLE)])
+    receive(system, [(8, BUNDLE), (99., DESIRED_VELOCITY), (8, BUNDLE_END)])
+
+    assert system.waypoint_manager.desired_velocity == 99.
+    assert acks(system) == [7, 8]
+    assert system.skipped_bundle is None
+
+
+def test_bundle_end_without_start_is_not_acked(system):
+    receive(system, [(5., DESIRED_VELOCITY), (9, BUNDLE_END)])
+    assert acks(system) == []
+    assert 9 not in system.applied_bundles
+
+
+def test_repeated_bundle_is_acked_but_not_applied(system):
+    receive(system, [(7, BUNDLE), (3., DESIRED_VELOCITY), (7, BUNDLE_END)])
+    system.waypoint_manager.desired_velocity = 4.
+    receive(system, [(7, BUNDLE), (3., DESIRED_VELOCITY), (7, BUNDLE_END)])
+
+    assert system.waypoint_manager.desired_velocity == 4.
+    assert acks(system) == [7, 7]
+
+
+def test_malformed_message_is_dropped(system):
+    system.connection.put(b"\x03\x00\x00\x00\x00\x66\x00")
+    receive(system, [(7, BUNDLE), (3., DESIRED_VELOCITY), (7, BUNDLE_END)])
+
+    assert system.running
+    assert system.waypoint_manager.desired_velocity == 3.
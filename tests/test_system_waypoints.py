@@ -0,0 +1,114 @@
+from common.clock import VirtualClock
+from common.protocol import Protocol
+from common.headings import *
+from drone.recorder import ReplayConnection
+from drone.system import System
+from drone.window_manager import LocationWindowManager, TimeWindowManager
+from drone.waypoint_manager import WaypointManager
+import numpy as np
+import pytest
+
+CORNER = np.array([
+    [0., 0., 10.],
+    [20., 0., 10.],
+    [20., 20., 10.],
+    [0., 20., 10.],
+    [0., 0., 10.],
+])
+
+
+@pytest.fixture
+def system():
+    protocol = Protocol("binary")
+    clock = VirtualClock()
+    system = System(
+        ReplayConnection(),
+        ReplayConnection(),
+        LocationWindowManager(),
+        TimeWindowManager(),
+        WaypointManager(),
+        protocol=protocol,
+        clock=clock,
+    )
+    receive(system, [
+        (protocol.encode_waypoints(CORNER), WAYPOINTS),
+        (10., DESIRED_VELOCITY),
+        (5., WINDOW_SIZE),
+        (.5, LOW_OFFSET),
+        (1.5, HIGH_OFFSET),
+        (1., COMMON_ERROR),
+        (1., CHECK_PERIOD),
+        (3., WAYPOINT_RANGE),
+        (1, MISSION_START),
+    ])
+    yield system
+    system.stop()
+
+
+def receive(system, values):
+    for value, name in values:
+        system.connection.put(system.protocol.encode(value, name))
+    system.poll()
+
+
+def gps(system, position):
+    system.drone_connection.put(system.protocol.encode(
+        system.protocol.encode_point(np.array(position)), GPS_POSITION))
+    system.poll()
+
+
+def sent(system):
+    return [
+        (name, value)
+        for x in system.drone_connection.sent
+        for name, value in system.protocol.decode(x)
+    ]
+
+
+def advance(system, seconds):
+    system.clock.advance(seconds)
+    system.update(system.clock.now())
+
+
+def test_corner_is_not_counted_twice(system):
+    system.clock.advance(2.)
+    # 모서리를 돌면서 GPS가 먼저 다음 구간으로 resync
+    gps(system, [20.5, 1., 10.])
+    assert system.waypoint_manager.current_waypoint_index == 2
+    # 같은 모서리에 대한 서버의 WAYPOINT_REACHED
+    receive(system, [(1, WAYPOINT_REACHED)])
+    assert system.waypoint_manager.current_waypoint_index == 2
+
+    advance(system, .5)
+    gps(system, [20., 5., 10.])
+    advance(system, .5)
+    assert system.running
+    assert (EMERGENCY_LANDING, 1) not in sent(system)
+
+    # 다음 waypoint 도달은 그대로 셈
+    system.clock.advance(1.)
+    gps(system, [20., 19., 10.])
+    receive(system, [(1, WAYPOINT_REACHED)])
+    assert system.waypoint_manager.current_waypoint_index == 3
+    assert system.running
+
+
+def test_resync_checks_time_of_skipped_waypoint(system):
+    # 20m 구간을 10초 걸려 지나감 (desired_velocity 10 이면 2초)
+    system.clock.advance(10.)
+    gps(system, [20., 2., 10.])
+    assert (RUNNING_STATE, 2) in sent(system)
+    assert (EMERGENCY_LANDING, 1) in sent(system)
+    assert not system.running
+
+
+@pytest.mark.parametrize("velocity, emergency", [(10., True), (5., False)])
+def test_waypoint_time_follows_desired_velocity(system, velocity, emergency):
+    # 20m 구간을 6.5초에 도달, 5m/s면 윈도우 (1, 7), 10m/s면 (0, 4)
+    receive(system, [(velocity, DESIRED_VELOCITY)])
+    system.clock.advance(6.5)
+    gps(system, [19., 0., 10.])
+    receive(system, [(1, WAYPOINT_REACHED)])
+
+    assert system.waypoint_manager.current_waypoint_index == 2
+    assert ((EMERGENCY_LANDING, 1) in sent(system)) == emergency
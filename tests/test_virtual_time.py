@@ -0,0 +1,111 @@
+from common.protocol import Protocol
+from common.clock import VirtualClock
+from common.headings import *
+from drone.connection import Connection
+from drone.drone_connection import DroneConnection
+from drone.system import System, Events
+from drone.window_manager import LocationWindowManager, TimeWindowManager
+from drone.waypoint_manager import WaypointManager
+from simulator import Simulator
+import test_servers
+import numpy as np
+import socket
+import threading
+import time
+
+IP = "127.0.0.1"
+
+# test.py의 미션
+WAYPOINTS_ = np.array([
+    [0., 0., 10.],
+    [10., 10., 10.],
+    [30., 10., 10.],
+    [30., -10., 10.],
+    [10., -10., 10.],
+    [0., 0., 10.],
+])
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((IP, 0))
+        return s.getsockname()[1]
+
+
+def wait_running(*servers, timeout: float = 5.):
+    # 둘 다 listen 한 뒤 running이 됨
+    deadline = time.perf_counter() + timeout
+    while not all(server.running for server in servers):
+        assert time.perf_counter() < deadline
+        time.sleep(.01)
+
+
+def test_event_driven_mission_in_virtual_time():
+    # System, 테스트 서버, 시뮬레이터 세 스레드가 같은 가상 시계를 씀
+    clock = VirtualClock(participants=3)
+    protocol = Protocol("binary")
+    server_port = free_port()
+    drone_port = free_port()
+
+    simulator = Simulator(
+        [WAYPOINTS_], IP, drone_port,
+        velocity=10., gps_period=.1, protocol=protocol, clock=clock)
+    server = test_servers.TestServer(
+        "Center",
+        [
+            (WAYPOINTS, protocol.encode_waypoints(WAYPOINTS_)),
+            (DESIRED_VELOCITY, 10.),
+            (WINDOW_SIZE, 10.),
+            (LOW_OFFSET, .5),
+            (HIGH_OFFSET, 1.5),
+            (COMMON_ERROR, 1.),
+            (CHECK_PERIOD, 1.),
+            (WAYPOINT_RANGE, 5.),
+            (TAKEOFF, 1),
+            (MISSION_START, 1),
+        ],
+        IP, server_port, period=.01, clock=clock)
+    server.protocol = protocol
+
+    threads = [
+        threading.Thread(target=simulator.start, daemon=True),
+        threading.Thread(target=server.start, daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+    wait_running(simulator, server)
+
+    system = System(
+        Connection(IP, server_port, protocol=protocol, threaded=False, clock=clock),
+        DroneConnection(IP, drone_port, protocol=protocol, threaded=False, clock=clock),
+        LocationWindowManager(),
+        TimeWindowManager(),
+        WaypointManager(),
+        protocol=protocol,
+        clock=clock,
+    )
+
+    finished = []
+
+    def on_mission_finished():
+        finished.append(clock.now())
+        system.running = False
+
+    system.event_manager.subscribe(Events.MissionFinished, on_mission_finished)
+
+    def stop_later():
+        # 가상 시간이 멈추면 (실제 시간으로) 끝냄
+        deadline = time.perf_counter() + 20.
+        while system.running and time.perf_counter() < deadline and clock.now() < 60.:
+            time.sleep(.01)
+        system.running = False
+
+    threading.Thread(target=stop_later, daemon=True).start()
+    system.run_event_driven()
+    simulator.running = False
+    for thread in threads:
+        thread.join(5.)
+
+    # 비상 착륙 없이 끝까지 감 (80m 정도, 10m/s)
+    assert finished and 5. < finished[0] < 20.
+    assert not simulator.landed[0]
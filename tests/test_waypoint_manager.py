@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from drone.waypoint_manager import WaypointManager
+
+
+def make_manager(waypoints, waypoint_range=5., desired_velocity=10.):
+    manager = WaypointManager(waypoint_range)
+    manager.desired_velocity = desired_velocity
+    manager.set_mission(np.asarray(waypoints, dtype=float))
+    manager.start_mission()
+    return manager
+
+
+# test.py의 미션 (시작 지점으로 돌아옴)
+LOOP = [
+    [0., 0., 10.],
+    [10., 10., 10.],
+    [30., 10., 10.],
+    [30., -10., 10.],
+    [10., -10., 10.],
+    [0., 0., 10.],
+]
+
+# 구간 0과 구간 2가 (5, 5)에서 교차
+FIGURE_EIGHT = [
+    [0., 0., 0.],
+    [10., 10., 0.],
+    [10., 0., 0.],
+    [0., 10., 0.],
+    [0., 0., 0.],
+]
+
+
+def test_resync_loop_does_not_jump_to_return_leg():
+    manager = make_manager(LOOP)
+    assert not manager.resync(np.array([.5, -.6, 10.]), elapsed=.1)
+    assert manager.current_waypoint_index == 1
+
+
+def test_resync_crossing_does_not_jump_ahead():
+    manager = make_manager(FIGURE_EIGHT, waypoint_range=1.)
+    # 구간 2 위에 있고 구간 0에서는 벗어났지만 0.5초 동안 갈 수 없는 거리
+    assert not manager.resync(np.array([6., 4., 0.]), elapsed=.5)
+    assert manager.current_waypoint_index == 1
+    # 교차점은 현재 구간 우선
+    assert not manager.resync(np.array([5., 5., 0.]), elapsed=10.)
+    assert manager.current_waypoint_index == 1
+
+
+def test_resync_missed_waypoint():
+    manager = make_manager(LOOP)
+    # waypoint 1 도달을 놓치고 구간 1 위에 있음
+    assert manager.resync(np.array([20., 10., 10.]), elapsed=2.5)
+    assert manager.current_waypoint_index == 2
+
+
+def test_resync_limited_lookahead():
+    manager = make_manager(LOOP)
+    # 구간 3 (현재 구간 + 3) 위
+    assert not manager.resync(np.array([20., -10., 10.]), elapsed=100.)
+    assert manager.current_waypoint_index == 1
+
+
+def test_final_waypoint_reached():
+    manager = make_manager(LOOP)
+    manager.current_waypoint_index = len(LOOP) - 1
+    assert not manager.final_reached(np.array([10., -10., 10.]))
+    assert manager.final_reached(np.array([1., 1., 10.]))
+    manager.to_next_waypoint()
+    assert manager.mission_finished()
+    assert not manager.final_reached(np.array([0., 0., 10.]))
+
+
+def brute_force_nearest(waypoints, point):
+    a, ab = waypoints[:-1], np.diff(waypoints, axis=0)
+    length_sq = np.sum(ab * ab, axis=-1)
+    t = np.divide(
+        np.sum((point - a) * ab, axis=-1), length_sq,
+        out=np.zeros_like(length_sq), where=length_sq > 0)
+    d = np.linalg.norm(point - (a + ab * np.clip(t, 0., 1.)[:, None]), axis=-1)
+    return int(np.argmin(d)), d
+
+
+def test_segment_index_matches_brute_force():
+    rng = np.random.default_rng(0)
+    # 측량 미션처럼 길고 촘촘한 미션, 같은 점이 반복되는 구간 포함
+    waypoints = np.cumsum(rng.normal(size=(2000, 3)) * [5., 5., .5], axis=0)
+    waypoints[100] = waypoints[99]
+    manager = make_manager(waypoints)
+
+    points = np.concatenate([
+        waypoints[rng.integers(0, len(waypoints), 200)] + rng.normal(size=(200, 3)),
+        rng.uniform(waypoints.min(axis=0) - 50, waypoints.max(axis=0) + 50, (200, 3)),
+    ])
+    for point in points:
+        segment, distance = manager.nearest_segment(point)
+        expected, d = brute_force_nearest(waypoints, point)
+        assert distance == pytest.approx(d[expected])
+        # 거리가 같으면 index가 작은 구간
+        assert segment == expected or d[segment] == pytest.approx(d[expected])
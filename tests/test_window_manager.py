@@ -0,0 +1,80 @@
+from drone.window_manager import (
+    LocationWindowManager, TimeWindowManager,
+    batch_location_in_range, batch_time_in_range)
+from drone.waypoint_manager import WaypointManager
+import numpy as np
+
+
+def test_batch_checks_match_scalar_checks():
+    rng = np.random.default_rng(0)
+    n = 200
+    positions = rng.normal(size=(n, 3)) * 10
+    starts = rng.normal(size=(n, 3)) * 10
+    directions = rng.normal(size=(n, 3))
+    directions /= np.linalg.norm(directions, axis=-1, keepdims=True)
+    elapsed = rng.uniform(0, 3, n)
+    velocity = rng.uniform(1, 10, n)
+    window_size = rng.uniform(5, 20, n)
+    low_offset = rng.uniform(.3, 1, n)
+    high_offset = rng.uniform(1, 2, n)
+    common_error = rng.uniform(0, 1, n)
+
+    location = batch_location_in_range(
+        elapsed, positions, starts, directions, velocity, window_size)
+    time = batch_time_in_range(
+        positions, starts, elapsed, velocity, low_offset, high_offset, common_error)
+
+    for i in range(n):
+        location_manager = LocationWindowManager(velocity[i], window_size[i], 1.)
+        time_manager = TimeWindowManager(
+            velocity[i], low_offset[i], high_offset[i], common_error[i])
+        assert location[i] == location_manager.in_range(
+            elapsed[i], positions[i], starts[i], directions[i])
+        assert time[i] == time_manager.in_range(positions[i], starts[i], elapsed[i])
+    assert location.any() and not location.all()
+    assert time.any() and not time.all()
+
+
+def fly(waypoints, speed, period):
+    """
+    waypoints를 speed로 따라가는 (T,) 시각, (T, 3) 위치
+    """
+    diff = np.diff(waypoints, axis=0)
+    cumulative = np.concatenate([[0.], np.cumsum(np.linalg.norm(diff, axis=-1))])
+    timestamps = np.arange(0., cumulative[-1] / speed, period)
+    travelled = timestamps * speed
+    segment = np.clip(np.searchsorted(cumulative, travelled, side="right") - 1, 0, len(diff) - 1)
+    t = (travelled - cumulative[segment]) / (cumulative[segment + 1] - cumulative[segment])
+    return timestamps, waypoints[segment] + diff[segment] * t[:, None]
+
+
+def test_location_trace_matches_scalar_checks_on_delayed_flight():
+    waypoints = np.array([
+        [0., 0., 10.],
+        [40., 0., 10.],
+        [40., 40., 10.],
+        [0., 40., 10.],
+    ])
+    waypoint_manager = WaypointManager(1.)
+    waypoint_manager.set_mission(waypoints)
+    location_manager = LocationWindowManager(10., 5., 1.)
+    # desired_velocity 10 보다 느리게 날아서 구간마다 조금씩 늦음
+    timestamps, positions = fly(waypoints, 9.5, .05)
+    reached = waypoint_manager.reached_indices(positions)
+
+    in_range, margin = location_manager.in_range_trace(
+        timestamps, positions, waypoints, reached)
+
+    segment = 0
+    for i in range(len(timestamps)):
+        # 실제 루프처럼 waypoint에 도달하면 그 구간의 경과 시간을 다시 셈
+        while segment + 1 < len(waypoints) - 1 and reached[segment + 1] == i:
+            segment += 1
+        start = reached[segment]
+        assert in_range[i] == location_manager.in_range(
+            timestamps[i] - timestamps[start],
+            positions[i],
+            waypoints[segment],
+            waypoint_manager.segment_vectors[segment])
+    # 늦어진 것이 쌓이지 않음
+    assert in_range.all()